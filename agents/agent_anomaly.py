@@ -5,9 +5,6 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Union, Optional
 import os
 from PIL import Image
-import cv2
-import librosa
-import speech_recognition as sr
 
 # Configure logging
 def setup_logging():
@@ -92,14 +89,18 @@ class MultiModalDataConnector:
         """Process audio file to extract features"""
         try:
             logger.info(f"Processing audio file: {file_path}")
+            # librosa and speech_recognition are only needed for audio records; import them here
+            # so the agent starts without loading them
+            import librosa
+            import speech_recognition as sr
             
             # Load audio file
-            y, sr = librosa.load(file_path)
+            y, sample_rate = librosa.load(file_path)
             
             # Extract features
-            duration = librosa.get_duration(y=y, sr=sr)
-            mfcc = librosa.feature.mfcc(y=y, sr=sr)
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+            duration = librosa.get_duration(y=y, sr=sample_rate)
+            mfcc = librosa.feature.mfcc(y=y, sr=sample_rate)
+            chroma = librosa.feature.chroma_stft(y=y, sr=sample_rate)
             
             # Speech recognition
             r = sr.Recognizer()
@@ -132,6 +133,7 @@ class MultiModalDataConnector:
         """Process video file to extract key frames and features"""
         try:
             logger.info(f"Processing video file: {file_path}")
+            import cv2
             cap = cv2.VideoCapture(file_path)
             fps = cap.get(cv2.CAP_PROP_FPS)
             frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -1,4 +1,6 @@
 from rag import *
+from media_http import media_response
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import uvicorn
 import requests
@@ -9,9 +11,16 @@ from lectures_data import lectures_data
 from test_data import test_data
 from db import user_collection ,pdf_collection , image_collection ,subject_collection,lecture_collection,test_collection 
 from datetime import datetime, timezone
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 load_dotenv() 
 app = FastAPI()
+# OCR results are reused from image_collection for near-duplicate photos
+ocr_cache.attach(image_collection)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +30,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warm_ocr_pool():
+    # Load the OCR models before the first request instead of during it
+    get_pool().start()
+    media_retention.start()
+
 # ==== Subject API Models and Routes ====
 class Subject(BaseModel):
     id: int
@@ -156,29 +171,46 @@ async def send_response():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process response: {str(e)}")
 
+def start_audio(answer: str, progressive: bool, tts_backend: Optional[str]) -> dict:
+    """Start synthesizing a summary in the background and return the response's audio fields."""
+    if progressive:
+        filename = start_progressive_tts(tts_cache, answer, backend=tts_backend)
+    else:
+        filename = submit_tts_job(tts_cache, answer, backend=tts_backend)["filename"]
+    job_id = os.path.splitext(filename)[0]
+    return {
+        "audio_file": f"/api/stream/{filename}",
+        "audio_job_id": job_id,
+        "audio_status_url": f"/api/audio-status/{job_id}",
+    }
+
 @app.post("/process-pdf", response_model=PDFResponse)
-async def process_pdf(file: UploadFile = File(...)):
+async def process_pdf(file: UploadFile = File(...), progressive: bool = TTS_PROGRESSIVE,
+                      tts_backend: Optional[str] = None):
+    if tts_backend and tts_backend not in TTS_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown TTS backend: {tts_backend}")
     temp_pdf_path = ""
     try:
         if not file.filename.lower().endswith(".pdf"):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-        temp_pdf_path = os.path.join(TEMP_DIR, f"temp_pdf_{time.strftime('%Y%m%d_%H%M%S')}.pdf")
+        # Requests now run concurrently; the uuid keeps same-second uploads apart
+        temp_pdf_path = os.path.join(TEMP_DIR, f"temp_pdf_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.pdf")
         with open(temp_pdf_path, "wb") as temp_file:
             shutil.copyfileobj(file.file, temp_file)
 
-        structured_data = parse_pdf(temp_pdf_path)
+        # OCR fallback and LLM calls block; off the event loop, requests share the OCR pool concurrently
+        structured_data = await run_in_threadpool(parse_pdf, temp_pdf_path)
         if not structured_data["body"]:
             raise HTTPException(status_code=400, detail="Failed to parse PDF content")
 
         query = "give me detail summary of this pdf"
         groq_api_key = os.getenv("GROQ_API_KEY")
-        agent = build_qa_agent([structured_data["body"]], groq_api_key=groq_api_key)
-        result = agent.invoke({"query": query})
+        agent = await run_in_threadpool(build_qa_agent, [structured_data["body"]], groq_api_key=groq_api_key)
+        result = await run_in_threadpool(agent.invoke, {"query": query})
         answer = result["result"]
 
-        audio_file = text_to_speech(answer, file_prefix="output_pdf")
-        audio_url = f"/static/{os.path.basename(audio_file)}" if audio_file else "No audio generated"
+        audio = start_audio(answer, progressive, tts_backend)
 
         # Store to MongoDB
         pdf_doc = {
@@ -187,7 +219,7 @@ async def process_pdf(file: UploadFile = File(...)):
             "sections": [{"heading": s["heading"], "content": s["content"]} for s in structured_data["sections"]],
             "query": query,
             "answer": answer,
-            "audio_file": audio_url,
+            "audio_file": audio["audio_file"],
             "timestamp": datetime.now(timezone.utc)
         }
         pdf_collection.insert_one(pdf_doc)
@@ -198,10 +230,12 @@ async def process_pdf(file: UploadFile = File(...)):
             sections=[Section(heading=s["heading"], content=s["content"]) for s in structured_data["sections"]],
             query=query,
             answer=answer,
-            audio_file=audio_url
+            **audio
         )
         return pdf_response
 
+    except OCRQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing PDF: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -212,7 +246,10 @@ async def process_pdf(file: UploadFile = File(...)):
 
 
 @app.post("/process-img", response_model=ImageResponse)
-async def process_image(file: UploadFile = File(...)):
+async def process_image(file: UploadFile = File(...), lang: Optional[str] = None,
+                        progressive: bool = TTS_PROGRESSIVE, tts_backend: Optional[str] = None):
+    if tts_backend and tts_backend not in TTS_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown TTS backend: {tts_backend}")
     temp_image_path = ""
     try:
         if not file.filename.lower().endswith((".jpg", ".jpeg", ".png")):
@@ -220,14 +257,19 @@ async def process_image(file: UploadFile = File(...)):
 
         temp_image_path = os.path.join(
             TEMP_DIR,
-            f"temp_image_{time.strftime('%Y%m%d_%H%M%S')}{os.path.splitext(file.filename)[1]}"
+            f"temp_image_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{os.path.splitext(file.filename)[1]}"
         )
 
         with open(temp_image_path, "wb") as temp_file:
             shutil.copyfileobj(file.file, temp_file)
 
-        ocr_text = extract_text_easyocr(temp_image_path).strip()
+        languages = lang.split("+") if lang else None
+        # Blocking OCR (including the admission wait) runs off the event loop
+        ocr_text, fingerprint = await run_in_threadpool(extract_text_ocr, temp_image_path, languages=languages)
+        ocr_text = ocr_text.strip()
         logger.info(f"OCR raw output: {repr(ocr_text)}")
+        # Only real OCR text is offered to later near-duplicates, not the placeholder below
+        indexed = bool(ocr_text)
 
         if not ocr_text:
             ocr_text = "No readable text found in the image."
@@ -236,12 +278,11 @@ async def process_image(file: UploadFile = File(...)):
         else:
             query = "give me detail summary of this image"
             groq_api_key = os.getenv("GROQ_API_KEY")
-            agent = build_qa_agent([ocr_text], groq_api_key=groq_api_key)
-            result = agent.invoke({"query": query})
+            agent = await run_in_threadpool(build_qa_agent, [ocr_text], groq_api_key=groq_api_key)
+            result = await run_in_threadpool(agent.invoke, {"query": query})
             answer = result["result"]
 
-        audio_file = text_to_speech(answer, file_prefix="output_image")
-        audio_url = f"/static/{os.path.basename(audio_file)}" if audio_file else "No audio generated"
+        audio = start_audio(answer, progressive, tts_backend)
 
         # Store to MongoDB
         image_doc = {
@@ -249,20 +290,25 @@ async def process_image(file: UploadFile = File(...)):
             "ocr_text": ocr_text,
             "query": query,
             "answer": answer,
-            "audio_file": audio_url,
-            "timestamp": datetime.now(timezone.utc)
+            "audio_file": audio["audio_file"],
+            "timestamp": datetime.now(timezone.utc),
+            **(fingerprint.to_doc() if indexed else {}),
         }
-        image_collection.insert_one(image_doc)
+        inserted = image_collection.insert_one(image_doc)
+        if indexed:
+            ocr_cache.add(fingerprint, inserted.inserted_id)
 
         global image_response
         image_response = ImageResponse(
             ocr_text=ocr_text,
             query=query,
             answer=answer,
-            audio_file=audio_url
+            **audio
         )
         return image_response
 
+    except OCRQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing image: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -271,6 +317,161 @@ async def process_image(file: UploadFile = File(...)):
         if temp_image_path and os.path.exists(temp_image_path):
             os.remove(temp_image_path)
 
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "4"))
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", "50"))
+# Reads of spooled batch images; their futures are tracked so files are only removed once unread
+_batch_read_executor = ThreadPoolExecutor(max_workers=OCR_BATCH_SIZE, thread_name_prefix="ocr-batch-read")
+
+def spool_uploads(files: List[UploadFile], prefix: str) -> List[str]:
+    """Copy uploads to TEMP_DIR (blocking file I/O); nothing is left behind if one fails."""
+    paths = []
+    try:
+        for i, file in enumerate(files):
+            path = os.path.join(TEMP_DIR, f"{prefix}_{i}{os.path.splitext(file.filename)[1]}")
+            paths.append(path)
+            with open(path, "wb") as temp_file:
+                shutil.copyfileobj(file.file, temp_file)
+    except BaseException:
+        remove_files(paths)
+        raise
+    return paths
+
+def remove_files(paths: List[str], pending=()):
+    """Remove ``paths`` once the ``pending`` futures reading them have finished."""
+    wait(pending)
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+@app.post("/process-img/batch")
+async def process_image_batch(files: List[UploadFile] = File(...), mode: str = "combined",
+                              lang: Optional[str] = None):
+    """OCR many images in one request and stream NDJSON events as results finish.
+
+    mode=combined sends one LLM request for all images; mode=per_image summarizes each image.
+    """
+    if mode not in ("combined", "per_image"):
+        raise HTTPException(status_code=400, detail="mode must be 'combined' or 'per_image'")
+    if len(files) > OCR_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {OCR_BATCH_MAX_FILES} files per batch")
+    for file in files:
+        if not file.filename.lower().endswith((".jpg", ".jpeg", ".png")):
+            raise HTTPException(status_code=400, detail=f"Only JPG, JPEG, or PNG files are allowed: {file.filename}")
+
+    # Uploads are spooled to disk up front (off the event loop); they are closed once this handler returns
+    batch_id = uuid.uuid4().hex
+    temp_paths = await run_in_threadpool(spool_uploads, files, f"temp_batch_{batch_id}")
+    filenames = [file.filename for file in files]
+    languages = lang.split("+") if lang else None
+
+    def event(payload: dict) -> bytes:
+        return (json.dumps(payload) + "\n").encode("utf-8")
+
+    def summarize(texts: List[str]) -> dict:
+        query = "give me detail summary of these images" if len(texts) > 1 else "give me detail summary of this image"
+        answer = summarize_texts(texts, query)
+        return {"query": query, "answer": answer, **start_audio(answer, False, None)}
+
+    async def run_batch():
+        loop = asyncio.get_running_loop()
+        pool = get_pool(languages)
+        ocr_texts = [""] * len(temp_paths)
+        fingerprints = [None] * len(temp_paths)
+        summaries = {}
+
+        cache_key = ocr_cache_key(pool, OCR_PREPROCESS)
+
+        def prepare(path: str):
+            # Near-duplicates of photos already in image_collection reuse their text and skip OCR
+            image = load_image(path)
+            fingerprint = image_fingerprint(image, cache_key)
+            cached = ocr_cache.lookup(fingerprint)
+            tiled = False
+            if cached is None:
+                image, tiled = prepare_for_ocr(image, OCR_PREPROCESS)
+            return image, fingerprint, cached, tiled
+
+        reads = []
+
+        def read(i: int):
+            future = _batch_read_executor.submit(prepare, temp_paths[i])
+            reads.append(future)
+            return asyncio.wrap_future(future)
+
+        async def ocr_chunk(indices: List[int]):
+            prepared = await asyncio.gather(*[read(i) for i in indices])
+            texts = [cached for _, _, cached, _ in prepared]
+            # Oversized images are split into tiles across the pool instead of joining the batch call
+            for n, (image, _, cached, tiled) in enumerate(prepared):
+                if cached is None and tiled:
+                    texts[n] = await loop.run_in_executor(None, ocr_tiled, pool, image)
+            misses = [n for n, text in enumerate(texts) if text is None]
+            if misses:
+                # submit_batch may wait up to OCR_QUEUE_TIMEOUT for admission; keep that off the loop
+                future = await loop.run_in_executor(None, pool.submit_batch, [prepared[n][0] for n in misses])
+                for n, text in zip(misses, await asyncio.wrap_future(future)):
+                    texts[n] = text
+            for i, (_, fingerprint, _, _) in zip(indices, prepared):
+                fingerprints[i] = fingerprint
+            return indices, texts
+
+        async def summarize_one(i: int):
+            return i, await loop.run_in_executor(None, summarize, [ocr_texts[i]])
+
+        chunk_tasks, summary_tasks = [], []
+        try:
+            chunks = [list(range(start, min(start + OCR_BATCH_SIZE, len(temp_paths))))
+                      for start in range(0, len(temp_paths), OCR_BATCH_SIZE)]
+
+            chunk_tasks = [asyncio.ensure_future(ocr_chunk(indices)) for indices in chunks]
+            for finished in asyncio.as_completed(chunk_tasks):
+                indices, texts = await finished
+                for i, text in zip(indices, texts):
+                    ocr_texts[i] = text.strip()
+                    yield event({"type": "ocr", "index": i, "filename": filenames[i], "ocr_text": ocr_texts[i]})
+                    if mode == "per_image" and ocr_texts[i]:
+                        summary_tasks.append(asyncio.ensure_future(summarize_one(i)))
+
+            if mode == "per_image":
+                for finished in asyncio.as_completed(summary_tasks):
+                    i, summary = await finished
+                    summaries[i] = summary
+                    yield event({"type": "summary", "index": i, "filename": filenames[i], **summary})
+            else:
+                texts = [f"Image {i + 1} ({filenames[i]}):\n{text}" for i, text in enumerate(ocr_texts) if text]
+                if texts:
+                    summaries[None] = await loop.run_in_executor(None, summarize, texts)
+                    yield event({"type": "summary", "index": None, **summaries[None]})
+
+            inserted = image_collection.insert_many([{
+                "filename": filenames[i],
+                "batch_id": batch_id,
+                "ocr_text": ocr_texts[i] or "No readable text found in the image.",
+                **summaries.get(i if mode == "per_image" else None,
+                                {"query": "N/A", "answer": "", "audio_file": "No audio generated"}),
+                "timestamp": datetime.now(timezone.utc),
+                **(fingerprints[i].to_doc() if ocr_texts[i] else {}),
+            } for i in range(len(filenames))])
+            for i, doc_id in enumerate(inserted.inserted_ids):
+                if ocr_texts[i]:
+                    ocr_cache.add(fingerprints[i], doc_id)
+            yield event({"type": "done", "batch_id": batch_id, "count": len(filenames)})
+        except OCRQueueFull as e:
+            yield event({"type": "error", "status": 503, "detail": str(e)})
+        except Exception as e:
+            logger.error(f"Error processing image batch: {e}")
+            yield event({"type": "error", "status": 500, "detail": str(e)})
+        finally:
+            # On a client disconnect the work still queued is dropped; reads of the spooled files
+            # that have not started are cancelled, and the files go once the running ones finish
+            for task in chunk_tasks + summary_tasks:
+                task.cancel()
+            for future in reads:
+                future.cancel()
+            loop.run_in_executor(None, remove_files, temp_paths, [f for f in reads if not f.done()])
+
+    return StreamingResponse(run_batch(), media_type="application/x-ndjson")
+
 @app.get("/summarize-pdf", response_model=PDFResponse)
 async def summarize_pdf():
     if pdf_response is None:
@@ -283,31 +484,70 @@ async def summarize_image():
         raise HTTPException(status_code=404, detail="No image has been processed yet.")
     return image_response
 
+@app.get("/api/ocr-stats")
+async def get_ocr_stats():
+    return {"pools": ocr_stats(), "cache": ocr_cache.stats()}
+
+@app.get("/api/tts-cache-stats")
+async def get_tts_cache_stats():
+    return tts_cache.stats()
+
+@app.get("/api/tts-stream-stats")
+async def get_tts_stream_stats():
+    return stream_stats()
+
+@app.get("/api/audio-status/{job_id}")
+async def audio_status(job_id: str):
+    filename = f"{job_id}.mp3"
+    job = get_tts_job(job_id)
+    error = None
+    if job is not None:
+        status, error = job["status"], job["error"]
+    elif os.path.exists(os.path.join(TEMP_DIR, filename)):
+        status = "done"
+    elif get_progressive_job(filename) is not None:
+        status = "streaming"
+    else:
+        raise HTTPException(status_code=404, detail="Audio job not found")
+    return {
+        "job_id": job_id,
+        "status": status,
+        # Progressive jobs can be played while they are still being synthesized
+        "playable": status in ("done", "streaming"),
+        "audio_url": f"/api/stream/{filename}",
+        "error": error,
+    }
+
+@app.get("/api/storage-usage")
+async def storage_usage():
+    return media_retention.usage()
+
+@app.get("/api/tts-job-stats")
+async def get_tts_job_stats():
+    return tts_job_stats()
+
 @app.get("/api/stream/{filename}")
-async def stream_audio(filename: str):
+async def stream_audio(filename: str, request: Request):
     audio_path = os.path.join(TEMP_DIR, filename)
 
+    job = get_progressive_job(filename)
+    if job is not None and not os.path.exists(audio_path):
+        # Still synthesizing: send each sentence as soon as it is ready (chunked transfer)
+        return StreamingResponse(job.iter_audio(), media_type="audio/mpeg")
+
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail="Audio file not found")
 
-    return FileResponse(
-        path=audio_path,
-        media_type="audio/mpeg",
-        filename=filename
-    )
+    return media_response(request, audio_path, media_type="audio/mpeg", filename=filename)
     
 @app.get("/api/audio/{filename}")
-async def download_audio(filename: str):
+async def download_audio(filename: str, request: Request):
     audio_path = os.path.join(TEMP_DIR, filename)
 
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail="Audio file not found")
 
-    return FileResponse(
-        path=audio_path,
-        media_type="audio/mpeg",
-        filename=filename
-    )
+    return media_response(request, audio_path, media_type="audio/mpeg", filename=filename)
 
 if __name__ == "__main__":
     try:
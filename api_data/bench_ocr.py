@@ -0,0 +1,170 @@
+"""Benchmark OCR preprocessing and OCR backends on a local fixture set.
+
+The fixture directory holds images (jpg/jpeg/png) next to ground-truth text
+files with the same stem, e.g. ``worksheet1.jpg`` + ``worksheet1.txt``.
+Fixtures for a specific language mix may live in a subdirectory named after
+it (``ocr_fixtures/en``, ``ocr_fixtures/en+hi``).
+
+    python bench_ocr.py preprocess --fixtures ocr_fixtures --repeat 2
+    python bench_ocr.py backends --fixtures ocr_fixtures --langs en en+hi
+
+The backends run writes OCR_BENCHMARK_FILE, which OCR_BACKEND=auto reads to
+pick the fastest backend meeting OCR_MIN_ACCURACY (and easyocr's accuracy) for
+each language mix, once at least OCR_BENCHMARK_MIN_FIXTURES fixtures were used.
+"""
+import os
+import json
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+from ocr import OCR_BACKENDS, OCR_BENCHMARK_FILE, OCR_LANGUAGES, OCR_MIN_ACCURACY, benchmark_choice, lang_key
+from ocr_preprocess import DEFAULT_OPTIONS, preprocess_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+VARIANTS = {
+    "raw": None,
+    "default": DEFAULT_OPTIONS,
+    "threshold": DEFAULT_OPTIONS.copy(update={"threshold": True}),
+    "no-downscale": DEFAULT_OPTIONS.copy(update={"downscale": False}),
+    "gray-only": DEFAULT_OPTIONS.copy(update={"downscale": False, "threshold": False}),
+    "deskew": DEFAULT_OPTIONS.copy(update={"deskew": True}),
+}
+
+
+def load_fixtures(directory: str) -> List[Tuple[str, str]]:
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        truth_path = os.path.join(directory, stem + ".txt")
+        if ext.lower() in IMAGE_EXTENSIONS and os.path.exists(truth_path):
+            with open(truth_path, encoding="utf-8") as f:
+                fixtures.append((os.path.join(directory, name), f.read()))
+    return fixtures
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(predicted: str, truth: str) -> float:
+    predicted, truth = normalize(predicted), normalize(truth)
+    if not truth:
+        return 1.0 if not predicted else 0.0
+    return max(0.0, 1.0 - edit_distance(predicted, truth) / len(truth))
+
+
+def run_variant(reader, fixtures, options, repeat: int) -> Dict[str, float]:
+    prep_s = ocr_s = accuracy = 0.0
+    for _ in range(repeat):
+        for path, truth in fixtures:
+            started = time.perf_counter()
+            image = preprocess_image(path, options) if options is not None else path
+            prepared = time.perf_counter()
+            text = reader.read(image)
+            prep_s += prepared - started
+            ocr_s += time.perf_counter() - prepared
+            accuracy += char_accuracy(text, truth)
+    runs = repeat * len(fixtures)
+    return {
+        "preprocess_ms": prep_s / runs * 1000,
+        "ocr_ms": ocr_s / runs * 1000,
+        "total_ms": (prep_s + ocr_s) / runs * 1000,
+        "char_accuracy": accuracy / runs,
+    }
+
+
+def bench_preprocess(args):
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"No image/.txt fixture pairs found in {args.fixtures}")
+
+    reader = OCR_BACKENDS[args.backend](OCR_LANGUAGES)
+    reader.read(fixtures[0][0])  # warm-up, not measured
+
+    results = {name: run_variant(reader, fixtures, VARIANTS[name], args.repeat) for name in args.variants}
+    baseline = results.get("raw")
+    print(f"{len(fixtures)} fixture(s), {args.repeat} repeat(s), backend {args.backend}")
+    print(f"{'variant':<14}{'prep ms':>10}{'ocr ms':>10}{'total ms':>10}{'saved':>9}{'accuracy':>10}")
+    for name, r in results.items():
+        saved = f"{(1 - r['total_ms'] / baseline['total_ms']) * 100:.0f}%" if baseline else "-"
+        print(f"{name:<14}{r['preprocess_ms']:>10.0f}{r['ocr_ms']:>10.0f}{r['total_ms']:>10.0f}"
+              f"{saved:>9}{r['char_accuracy'] * 100:>9.1f}%")
+
+
+def bench_backends(args):
+    options = None if args.no_preprocess else DEFAULT_OPTIONS
+    report = {}
+    for langs in args.langs:
+        languages = sorted(langs.split("+"))
+        key = lang_key(languages)
+        directory = os.path.join(args.fixtures, key)
+        fixtures = load_fixtures(directory if os.path.isdir(directory) else args.fixtures)
+        if not fixtures:
+            print(f"[{key}] no fixtures, skipped")
+            continue
+        report[key] = {}
+        for name in args.backends:
+            try:
+                reader = OCR_BACKENDS[name](languages)
+                reader.read(fixtures[0][0])  # warm-up, not measured
+            except Exception as e:
+                print(f"[{key}] {name}: unavailable ({e})")
+                continue
+            r = run_variant(reader, fixtures, options, args.repeat)
+            report[key][name] = {
+                "images_per_s": 1000 / r["total_ms"] if r["total_ms"] else 0.0,
+                "latency_ms": r["total_ms"],
+                "char_accuracy": r["char_accuracy"],
+                "fixtures": len(fixtures),
+            }
+
+    print(f"{'langs':<8}{'backend':<12}{'img/s':>8}{'ms/img':>9}{'accuracy':>10}")
+    for key, backends in report.items():
+        for name, r in sorted(backends.items(), key=lambda item: -item[1]["images_per_s"]):
+            print(f"{key:<8}{name:<12}{r['images_per_s']:>8.2f}{r['latency_ms']:>9.0f}{r['char_accuracy'] * 100:>9.1f}%")
+        choice = benchmark_choice(backends) or "none (falls back to default)"
+        print(f"{key:<8}auto -> {choice} (accuracy bar {OCR_MIN_ACCURACY:.0%}, not below easyocr)")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    preprocess = subparsers.add_parser("preprocess", help="compare preprocessing variants")
+    preprocess.add_argument("--fixtures", default="ocr_fixtures")
+    preprocess.add_argument("--repeat", type=int, default=1)
+    preprocess.add_argument("--backend", default="easyocr", choices=list(OCR_BACKENDS))
+    preprocess.add_argument("--variants", nargs="*", default=list(VARIANTS), choices=list(VARIANTS))
+    preprocess.set_defaults(func=bench_preprocess)
+
+    backends = subparsers.add_parser("backends", help="compare OCR backends per language mix")
+    backends.add_argument("--fixtures", default="ocr_fixtures")
+    backends.add_argument("--repeat", type=int, default=1)
+    backends.add_argument("--backends", nargs="*", default=list(OCR_BACKENDS), choices=list(OCR_BACKENDS))
+    backends.add_argument("--langs", nargs="*", default=["en", lang_key(OCR_LANGUAGES)])
+    backends.add_argument("--no-preprocess", action="store_true")
+    backends.add_argument("--output", default=OCR_BENCHMARK_FILE)
+    backends.set_defaults(func=bench_backends)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 from rag import *
+from media_http import media_response
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import uvicorn
 import requests
@@ -9,12 +11,13 @@ from lectures_data import lectures_data
 from test_data import test_data
 from db import user_collection, pdf_collection, image_collection
 from datetime import datetime, timezone
-from fastapi import HTTPException, FastAPI, File, UploadFile, Form
+from fastapi import HTTPException, FastAPI, File, UploadFile, Form, Request
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import shutil
 import time
+import uuid
 import logging
 from typing import Optional, List
 
@@ -23,6 +26,12 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 app = FastAPI()
+# OCR results are reused from image_collection for near-duplicate photos
+ocr_cache.attach(image_collection)
+
+@app.on_event("startup")
+def start_media_retention():
+    media_retention.start()
 
 app.add_middleware(
     CORSMiddleware,
@@ -271,17 +280,19 @@ async def process_pdf(file: UploadFile = File(...), llm: str = Form(..., regex="
         if not file.filename.lower().endswith(".pdf"):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-        temp_pdf_path = os.path.join(TEMP_DIR, f"temp_pdf_{time.strftime('%Y%m%d_%H%M%S')}.pdf")
+        # Requests now run concurrently; the uuid keeps same-second uploads apart
+        temp_pdf_path = os.path.join(TEMP_DIR, f"temp_pdf_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.pdf")
         with open(temp_pdf_path, "wb") as temp_file:
             shutil.copyfileobj(file.file, temp_file)
 
-        structured_data = parse_pdf(temp_pdf_path)
+        # OCR fallback and LLM calls block; off the event loop, requests share the OCR pool concurrently
+        structured_data = await run_in_threadpool(parse_pdf, temp_pdf_path)
         if not structured_data["body"]:
             raise HTTPException(status_code=400, detail="Failed to parse PDF content")
 
         query = "give me detail summary of this pdf"
         # Use call_llm instead of build_qa_agent for consistency
-        answer = call_llm(f"Summarize the following content: {structured_data['body']}", llm)
+        answer = await run_in_threadpool(call_llm, f"Summarize the following content: {structured_data['body']}", llm)
 
         audio_file = text_to_speech(answer, file_prefix="output_pdf")
         audio_url = f"/static/{os.path.basename(audio_file)}" if audio_file else "No audio generated"
@@ -327,14 +338,18 @@ async def process_image(file: UploadFile = File(...), llm: str = Form(..., regex
 
         temp_image_path = os.path.join(
             TEMP_DIR,
-            f"temp_image_{time.strftime('%Y%m%d_%H%M%S')}{os.path.splitext(file.filename)[1]}"
+            f"temp_image_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{os.path.splitext(file.filename)[1]}"
         )
 
         with open(temp_image_path, "wb") as temp_file:
             shutil.copyfileobj(file.file, temp_file)
 
-        ocr_text = extract_text_easyocr(temp_image_path).strip()
+        # Blocking OCR (including the admission wait) runs off the event loop
+        ocr_text, fingerprint = await run_in_threadpool(extract_text_ocr, temp_image_path)
+        ocr_text = ocr_text.strip()
         logger.info(f"OCR raw output: {repr(ocr_text)}")
+        # Only real OCR text is offered to later near-duplicates, not the placeholder below
+        indexed = bool(ocr_text)
 
         if not ocr_text:
             ocr_text = "No readable text found in the image."
@@ -342,7 +357,7 @@ async def process_image(file: UploadFile = File(...), llm: str = Form(..., regex
             query = "N/A"
         else:
             query = "give me detail summary of this image"
-            answer = call_llm(f"Summarize the following text extracted from an image: {ocr_text}", llm)
+            answer = await run_in_threadpool(call_llm, f"Summarize the following text extracted from an image: {ocr_text}", llm)
 
         audio_file = text_to_speech(answer, file_prefix="output_image")
         audio_url = f"/static/{os.path.basename(audio_file)}" if audio_file else "No audio generated"
@@ -354,9 +369,12 @@ async def process_image(file: UploadFile = File(...), llm: str = Form(..., regex
             "answer": answer,
             "audio_file": audio_url,
             "llm": llm,  # Store selected LLM
-            "timestamp": datetime.now(timezone.utc)
+            "timestamp": datetime.now(timezone.utc),
+            **(fingerprint.to_doc() if indexed else {}),
         }
-        image_collection.insert_one(image_doc)
+        inserted = image_collection.insert_one(image_doc)
+        if indexed:
+            ocr_cache.add(fingerprint, inserted.inserted_id)
 
         global image_response
         image_response = ImageResponse(
@@ -391,30 +409,22 @@ async def summarize_image():
 
 # Audio Streaming and Download Routes
 @app.get("/api/stream/{filename}")
-async def stream_audio(filename: str):
+async def stream_audio(filename: str, request: Request):
     audio_path = os.path.join(TEMP_DIR, filename)
 
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail="Audio file not found")
 
-    return FileResponse(
-        path=audio_path,
-        media_type="audio/mpeg",
-        filename=filename
-    )
+    return media_response(request, audio_path, media_type="audio/mpeg", filename=filename)
 
 @app.get("/api/audio/{filename}")
-async def download_audio(filename: str):
+async def download_audio(filename: str, request: Request):
     audio_path = os.path.join(TEMP_DIR, filename)
 
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail="Audio file not found")
 
-    return FileResponse(
-        path=audio_path,
-        media_type="audio/mpeg",
-        filename=filename
-    )
+    return media_response(request, audio_path, media_type="audio/mpeg", filename=filename)
 
 if __name__ == "__main__":
     try:
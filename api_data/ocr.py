@@ -0,0 +1,371 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OCR_LANGUAGES = ['en', 'hi']
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", str(min(2, os.cpu_count() or 1))))
+# Requests allowed to wait for a free reader before new ones are turned away
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", "32"))
+OCR_QUEUE_TIMEOUT = float(os.getenv("OCR_QUEUE_TIMEOUT", "30"))
+# Backend per language mix ("en=tesseract,en+hi=easyocr") or "auto" to pick from the benchmark
+# file. easyocr serves every mix by default: no fixture results back routing anything elsewhere
+OCR_BACKEND = os.getenv("OCR_BACKEND", "easyocr")
+OCR_BENCHMARK_FILE = os.getenv("OCR_BENCHMARK_FILE", "ocr_benchmark.json")
+OCR_MIN_ACCURACY = float(os.getenv("OCR_MIN_ACCURACY", "0.85"))
+# "auto" ignores benchmark results measured on fewer fixtures than this
+OCR_BENCHMARK_MIN_FIXTURES = int(os.getenv("OCR_BENCHMARK_MIN_FIXTURES", "20"))
+DEFAULT_BACKEND = "easyocr"
+# Images share a batched easyocr call when white padding to the group's size adds at most this
+# share of any member's area; more padding costs the detector more than the shared call saves
+OCR_BATCH_MAX_PADDING = float(os.getenv("OCR_BATCH_MAX_PADDING", "0.5"))
+
+ImageInput = Union[str, bytes, np.ndarray]
+# (x1, y1, x2, y2), text, confidence
+OCRBox = Tuple[Tuple[float, float, float, float], str, float]
+
+
+class OCRQueueFull(RuntimeError):
+    pass
+
+
+def lang_key(languages: Sequence[str]) -> str:
+    return "+".join(sorted(languages))
+
+
+def _bounding_box(points) -> Tuple[float, float, float, float]:
+    xs = [float(p[0]) for p in points]
+    ys = [float(p[1]) for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# ==== Backends ====
+class OCRBackend:
+    """One loaded OCR engine. Instances are not shared between threads."""
+
+    name = ""
+
+    def __init__(self, languages: List[str]):
+        self.languages = languages
+
+    def read_boxes(self, image: ImageInput) -> List[OCRBox]:
+        raise NotImplementedError
+
+    def read(self, image: ImageInput) -> str:
+        return " ".join(text for _, text, _ in self.read_boxes(image))
+
+    def read_batch(self, images: Sequence[ImageInput]) -> List[str]:
+        return [self.read(image) for image in images]
+
+
+OCR_BACKENDS: Dict[str, Type[OCRBackend]] = {}
+
+
+def register_backend(cls: Type[OCRBackend]) -> Type[OCRBackend]:
+    OCR_BACKENDS[cls.name] = cls
+    return cls
+
+
+def batch_groups(images: Sequence[np.ndarray], max_padding: float = OCR_BATCH_MAX_PADDING) -> List[List[int]]:
+    """Group image indices so each group can be padded to one size within ``max_padding``."""
+    groups: List[Tuple[List[int], int, int]] = []  # indices, height, width
+    area = lambda i: images[i].shape[0] * images[i].shape[1]
+    for i in sorted(range(len(images)), key=area, reverse=True):
+        height, width = images[i].shape[:2]
+        for n, (indices, group_height, group_width) in enumerate(groups):
+            padded = max(group_height, height) * max(group_width, width)
+            if (images[indices[0]].shape[2:] == images[i].shape[2:]
+                    and all(padded <= (1 + max_padding) * area(j) for j in indices + [i])):
+                groups[n] = (indices + [i], max(group_height, height), max(group_width, width))
+                break
+        else:
+            groups.append(([i], height, width))
+    return [indices for indices, _, _ in groups]
+
+
+def pad_to(image: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Extend ``image`` with white (paper) below and to the right; existing text keeps its position."""
+    padding = [(0, height - image.shape[0]), (0, width - image.shape[1])] + [(0, 0)] * (image.ndim - 2)
+    return np.pad(image, padding, constant_values=255)
+
+
+@register_backend
+class EasyOCRBackend(OCRBackend):
+    name = "easyocr"
+
+    def __init__(self, languages: List[str]):
+        super().__init__(languages)
+        import easyocr
+        self.reader = easyocr.Reader(languages, gpu=False)
+
+    def read(self, image: ImageInput) -> str:
+        return " ".join(self.reader.readtext(image, detail=0))
+
+    def read_boxes(self, image: ImageInput) -> List[OCRBox]:
+        return [(_bounding_box(points), text, float(conf))
+                for points, text, conf in self.reader.readtext(image, detail=1)]
+
+    def read_batch(self, images: Sequence[ImageInput]) -> List[str]:
+        if not all(isinstance(image, np.ndarray) for image in images):
+            return super().read_batch(images)
+        # readtext_batched stacks its input, so images are padded to a common size per group;
+        # after the text-height downscale photos rarely share a shape exactly
+        results = [""] * len(images)
+        for indices in batch_groups(images):
+            if len(indices) == 1:
+                results[indices[0]] = self.read(images[indices[0]])
+                continue
+            height = max(images[i].shape[0] for i in indices)
+            width = max(images[i].shape[1] for i in indices)
+            batch = self.reader.readtext_batched([pad_to(images[i], height, width) for i in indices], detail=0)
+            for i, texts in zip(indices, batch):
+                results[i] = " ".join(texts)
+        return results
+
+
+@register_backend
+class PaddleOCRBackend(OCRBackend):
+    name = "paddleocr"
+
+    def __init__(self, languages: List[str]):
+        super().__init__(languages)
+        from paddleocr import PaddleOCR
+        # PaddleOCR loads one recognition model per instance, so en+hi gets the Devanagari one;
+        # how it does on the English part of mixed pages is unmeasured (bench_ocr.py backends)
+        self.engine = PaddleOCR(use_angle_cls=True, lang="hi" if "hi" in languages else "en", show_log=False)
+
+    def read_boxes(self, image: ImageInput) -> List[OCRBox]:
+        if isinstance(image, bytes):
+            import cv2
+            image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        result = self.engine.ocr(image, cls=True)
+        lines = (result[0] or []) if result else []
+        return [(_bounding_box(points), text, float(conf)) for points, (text, conf) in lines]
+
+
+@register_backend
+class TesseractBackend(OCRBackend):
+    name = "tesseract"
+    LANGUAGE_CODES = {"en": "eng", "hi": "hin"}
+
+    def __init__(self, languages: List[str]):
+        super().__init__(languages)
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.lang = "+".join(self.LANGUAGE_CODES.get(l, l) for l in languages)
+
+    def _load(self, image: ImageInput):
+        if isinstance(image, np.ndarray):
+            return image
+        import io
+        from PIL import Image
+        with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as img:
+            img.load()
+            return img.copy()
+
+    def read(self, image: ImageInput) -> str:
+        return " ".join(self.pytesseract.image_to_string(self._load(image), lang=self.lang).split())
+
+    def read_boxes(self, image: ImageInput) -> List[OCRBox]:
+        data = self.pytesseract.image_to_data(self._load(image), lang=self.lang,
+                                              output_type=self.pytesseract.Output.DICT)
+        boxes = []
+        for i, text in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if text.strip() and conf >= 0:
+                x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+                boxes.append(((x, y, x + w, y + h), text, conf / 100))
+        return boxes
+
+
+# ==== Backend selection ====
+def _parse_backend_config(value: str) -> Dict[str, str]:
+    if "=" not in value:
+        return {"*": value.strip()}
+    config = {}
+    for item in value.split(","):
+        if "=" in item:
+            langs, backend = item.split("=", 1)
+            config[lang_key(langs.strip().split("+"))] = backend.strip()
+    return config
+
+
+def benchmark_choice(results: Dict[str, Dict]) -> Optional[str]:
+    """Fastest backend in one language mix's benchmark results that is trustworthy enough to use.
+
+    A backend qualifies when it was measured on at least OCR_BENCHMARK_MIN_FIXTURES
+    fixtures, met OCR_MIN_ACCURACY and, if easyocr was measured too, was no less
+    accurate than easyocr. None keeps the default.
+    """
+    baseline = results.get(DEFAULT_BACKEND, {}).get("char_accuracy", 0.0)
+    qualified = [(r["images_per_s"], name) for name, r in results.items()
+                 if name in OCR_BACKENDS and r.get("fixtures", 0) >= OCR_BENCHMARK_MIN_FIXTURES
+                 and r.get("char_accuracy", 0) >= max(OCR_MIN_ACCURACY, baseline)]
+    return max(qualified)[1] if qualified else None
+
+
+def _benchmark_choice(key: str) -> Optional[str]:
+    try:
+        with open(OCR_BENCHMARK_FILE, encoding="utf-8") as f:
+            results = json.load(f).get(key, {})
+    except (OSError, ValueError):
+        return None
+    return benchmark_choice(results)
+
+
+def select_backend(languages: Sequence[str]) -> str:
+    key = lang_key(languages)
+    config = _parse_backend_config(OCR_BACKEND)
+    backend = config.get(key, config.get("*", DEFAULT_BACKEND))
+    if backend == "auto":
+        backend = _benchmark_choice(key) or DEFAULT_BACKEND
+    if backend not in OCR_BACKENDS:
+        logger.warning(f"Unknown OCR backend '{backend}' for {key}, using {DEFAULT_BACKEND}")
+        backend = DEFAULT_BACKEND
+    return backend
+
+
+# ==== Reader pool ====
+class OCRReaderPool:
+    """Fixed set of pre-loaded OCR engines shared by all requests.
+
+    Each worker thread checks an engine out, so an engine is never used by two
+    threads at once and the models are loaded only once.
+    """
+
+    def __init__(self, backend: str, size: int, languages: List[str], max_queue: int):
+        self.backend = backend
+        self.size = max(1, size)
+        self.languages = languages
+        self._readers: "queue.Queue[OCRBackend]" = queue.Queue()
+        self._admission = threading.BoundedSemaphore(self.size + max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix=f"ocr-{backend}")
+        self._lock = threading.Lock()
+        self._started = False
+        self._waiting = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latencies_ms = deque(maxlen=500)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        try:
+            import torch
+            # Split the cores between readers instead of letting each one grab all of them
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.size))
+        except ImportError:
+            pass
+        for i in range(self.size):
+            started = time.perf_counter()
+            self._readers.put(OCR_BACKENDS[self.backend](self.languages))
+            logger.info(f"Loaded {self.backend} reader {i + 1}/{self.size} in {time.perf_counter() - started:.1f}s")
+
+    def submit(self, image: ImageInput, timeout: float = OCR_QUEUE_TIMEOUT) -> Future:
+        return self._submit(lambda reader: reader.read(image), timeout)
+
+    def submit_batch(self, images: Sequence[ImageInput], timeout: float = OCR_QUEUE_TIMEOUT) -> Future:
+        """OCR a group of images with a single engine call where the backend supports it."""
+        return self._submit(lambda reader: reader.read_batch(images), timeout)
+
+    def submit_boxes(self, image: ImageInput, timeout: float = OCR_QUEUE_TIMEOUT) -> Future:
+        return self._submit(lambda reader: reader.read_boxes(image), timeout)
+
+    def readtext(self, image: ImageInput) -> str:
+        return self.submit(image).result()
+
+    def _submit(self, work: Callable[[OCRBackend], object], timeout: float) -> Future:
+        if not self._started:
+            self.start()
+        if not self._admission.acquire(timeout=timeout):
+            with self._lock:
+                self._rejected += 1
+            raise OCRQueueFull(f"OCR queue is full ({self._waiting} waiting)")
+        with self._lock:
+            self._waiting += 1
+        future = self._executor.submit(self._run, work, time.perf_counter())
+        future.add_done_callback(lambda _: self._admission.release())
+        return future
+
+    def _run(self, work: Callable[[OCRBackend], object], enqueued: float):
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+        reader = self._readers.get()
+        try:
+            return work(reader)
+        finally:
+            self._readers.put(reader)
+            elapsed_ms = (time.perf_counter() - enqueued) * 1000
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._latencies_ms.append(elapsed_ms)
+            logger.info(f"OCR request ({self.backend}) finished in {elapsed_ms:.0f} ms (queue depth {self._waiting})")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+            stats = {
+                "backend": self.backend,
+                "languages": self.languages,
+                "pool_size": self.size,
+                "queue_depth": self._waiting,
+                "active": self._active,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+            if latencies:
+                stats["latency_ms"] = {
+                    "last": round(self._latencies_ms[-1], 1),
+                    "avg": round(sum(latencies) / len(latencies), 1),
+                    "p50": round(latencies[len(latencies) // 2], 1),
+                    "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                }
+        return stats
+
+
+_pools: Dict[Tuple[str, str], OCRReaderPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(languages: Optional[Sequence[str]] = None) -> OCRReaderPool:
+    languages = sorted(languages or OCR_LANGUAGES)
+    backend = select_backend(languages)
+    key = (backend, lang_key(languages))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = OCRReaderPool(backend, OCR_POOL_SIZE, languages, OCR_MAX_QUEUE)
+        return _pools[key]
+
+
+def ocr_stats() -> Dict:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {f"{pool.backend}:{lang_key(pool.languages)}": pool.stats() for pool in pools}
+
+
+def ocr_image(image: ImageInput, languages: Optional[Sequence[str]] = None) -> str:
+    return get_pool(languages).readtext(image)
+
+
+def submit_ocr(image: ImageInput, languages: Optional[Sequence[str]] = None) -> Future:
+    return get_pool(languages).submit(image)
+
+
+def ocr_images_parallel(images: Sequence[ImageInput], languages: Optional[Sequence[str]] = None) -> List[str]:
+    """OCR several images concurrently; results are returned in input order."""
+    futures = [submit_ocr(image, languages) for image in images]
+    return [future.result() for future in futures]
@@ -0,0 +1,237 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Max Hamming distance (out of 64 bits) between pHashes for two images to be compared further
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "4"))
+# Worksheets printed from one template share a pHash; the 256-bit dHash sees the filled-in
+# detail the 8x8 pHash averages away, and must also be this close for the text to be reused
+OCR_CACHE_MAX_DETAIL_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DETAIL_DISTANCE", "24"))
+# Max relative difference in aspect ratio (crops of the same page are not the same page)
+OCR_CACHE_MAX_ASPECT_DIFF = float(os.getenv("OCR_CACHE_MAX_ASPECT_DIFF", "0.03"))
+# Most recent image_collection documents kept in the in-memory index
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "5000"))
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """64-bit DCT pHash; robust to rescaling, recompression and small lighting changes."""
+    import cv2
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def difference_hash(image: np.ndarray, size: int = 16) -> int:
+    """``size``*``size``-bit dHash: whether each cell of a (size+1) x size thumbnail is brighter than its right neighbour."""
+    import cv2
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+@dataclass
+class OCRFingerprint:
+    """What identifies an OCR result: the engine that produced it and the image it came from."""
+
+    engine: str
+    phash: int
+    dhash: int
+    aspect: float
+
+    def to_doc(self) -> Dict:
+        """Fields stored on the image_collection document (hex: Mongo integers are signed 64-bit)."""
+        return {"ocr_engine": self.engine, "ocr_phash": f"{self.phash:016x}",
+                "ocr_dhash": f"{self.dhash:064x}", "ocr_aspect": self.aspect}
+
+    @classmethod
+    def from_doc(cls, doc: Dict) -> "OCRFingerprint":
+        return cls(doc["ocr_engine"], int(doc["ocr_phash"], 16), int(doc["ocr_dhash"], 16), float(doc["ocr_aspect"]))
+
+
+def image_fingerprint(image: np.ndarray, engine: str) -> OCRFingerprint:
+    height, width = image.shape[:2]
+    return OCRFingerprint(engine, perceptual_hash(image), difference_hash(image), width / height)
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming-radius search."""
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, {distance: child}]
+
+    def add(self, value: int):
+        if self.root is None:
+            self.root = [value, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """All (distance, hash) pairs within ``radius`` of ``value``."""
+        if self.root is None:
+            return []
+        found, stack = [], [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append((distance, node_value))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class PerceptualOCRCache:
+    """Index of the OCR text already stored in image_collection, searched by perceptual hash.
+
+    Endpoints store an ``OCRFingerprint`` on every image document that has OCR
+    text and register it with ``add``; a re-photographed page then finds that
+    document through a BK-tree over pHashes and reuses its ``ocr_text``. A pHash
+    match alone is not enough: the detail dHash and the aspect ratio must agree
+    too, so pages filled in on the same template are not mistaken for each other.
+    Entries are partitioned by engine (backend, languages, preprocessing)
+    because the same image OCR'd differently is a different result.
+    """
+
+    def __init__(self, max_distance: int, max_detail_distance: int, max_aspect_diff: float, max_entries: int):
+        self.max_distance = max_distance
+        self.max_detail_distance = max_detail_distance
+        self.max_aspect_diff = max_aspect_diff
+        self.max_entries = max_entries
+        self.collection = None
+        self._loaded = False
+        # (engine, pHash) -> [(document id, fingerprint)], least recently used first
+        self._entries: "OrderedDict[Tuple[str, int], List[Tuple[object, OCRFingerprint]]]" = OrderedDict()
+        self._trees: Dict[str, BKTree] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def attach(self, collection):
+        """Use ``collection`` (image_collection) as the store; it is indexed on the first lookup."""
+        with self._lock:
+            self.collection = collection
+            self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        try:
+            docs = list(self.collection.find({"ocr_phash": {"$exists": True}},
+                                             {"ocr_engine": 1, "ocr_phash": 1, "ocr_dhash": 1, "ocr_aspect": 1})
+                        .sort("timestamp", -1).limit(self.max_entries))
+        except Exception as e:
+            logger.warning(f"Could not index image_collection for the OCR cache: {e}")
+            return
+        for doc in reversed(docs):
+            try:
+                self._insert(doc["_id"], OCRFingerprint.from_doc(doc))
+            except (KeyError, TypeError, ValueError):
+                continue
+        logger.info(f"Indexed {len(docs)} image_collection documents for the OCR cache")
+
+    def _insert(self, doc_id, fingerprint: OCRFingerprint):
+        slot = (fingerprint.engine, fingerprint.phash)
+        self._entries.setdefault(slot, []).append((doc_id, fingerprint))
+        self._entries.move_to_end(slot)
+        self._trees.setdefault(fingerprint.engine, BKTree()).add(fingerprint.phash)
+
+    def _trim(self):
+        """Drop the least recently used tenth once over capacity; BK-trees are rebuilt since they can't delete."""
+        if len(self._entries) <= self.max_entries:
+            return
+        for _ in range(len(self._entries) - int(self.max_entries * 0.9)):
+            self._entries.popitem(last=False)
+        self._trees = {}
+        for engine, image_hash in self._entries:
+            self._trees.setdefault(engine, BKTree()).add(image_hash)
+
+    def matches(self, fingerprint: OCRFingerprint, candidate: OCRFingerprint) -> bool:
+        return (hamming(fingerprint.phash, candidate.phash) <= self.max_distance
+                and hamming(fingerprint.dhash, candidate.dhash) <= self.max_detail_distance
+                and abs(fingerprint.aspect - candidate.aspect) <= self.max_aspect_diff * candidate.aspect)
+
+    def _candidates(self, fingerprint: OCRFingerprint) -> List[Tuple[int, Tuple[str, int], object]]:
+        tree = self._trees.get(fingerprint.engine)
+        found, near = [], 0
+        for _, image_hash in tree.search(fingerprint.phash, self.max_distance) if tree else []:
+            slot = (fingerprint.engine, image_hash)
+            for doc_id, candidate in self._entries.get(slot, []):
+                near += 1
+                if self.matches(fingerprint, candidate):
+                    distance = hamming(fingerprint.phash, candidate.phash) + hamming(fingerprint.dhash, candidate.dhash)
+                    found.append((distance, slot, doc_id))
+        if near and not found:
+            # Same pHash neighbourhood, different page (e.g. one template, other answers)
+            self.rejected += 1
+        return sorted(found, key=lambda item: item[0])
+
+    def lookup(self, fingerprint: OCRFingerprint) -> Optional[str]:
+        """OCR text of the closest stored image matching ``fingerprint``, or None."""
+        with self._lock:
+            if self.collection is None:
+                return None
+            if not self._loaded:
+                self._load()
+            candidates = self._candidates(fingerprint)
+        for _, slot, doc_id in candidates:
+            doc = self.collection.find_one({"_id": doc_id}, {"ocr_text": 1})
+            if doc and doc.get("ocr_text"):
+                with self._lock:
+                    self.hits += 1
+                    if slot in self._entries:
+                        self._entries.move_to_end(slot)
+                return doc["ocr_text"]
+            with self._lock:
+                # Deleted from image_collection since it was indexed
+                if slot in self._entries:
+                    self._entries[slot] = [entry for entry in self._entries[slot] if entry[0] != doc_id]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def add(self, fingerprint: OCRFingerprint, doc_id):
+        """Index an image_collection document that was stored with ``fingerprint.to_doc()``."""
+        with self._lock:
+            self._insert(doc_id, fingerprint)
+            self._trim()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(len(docs) for docs in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "max_distance": self.max_distance,
+                "max_detail_distance": self.max_detail_distance,
+            }
+
+
+ocr_cache = PerceptualOCRCache(OCR_CACHE_MAX_DISTANCE, OCR_CACHE_MAX_DETAIL_DISTANCE,
+                               OCR_CACHE_MAX_ASPECT_DIFF, OCR_CACHE_MAX_ENTRIES)
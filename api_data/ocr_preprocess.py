@@ -0,0 +1,122 @@
+import io
+import os
+import logging
+from typing import Optional, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+class PreprocessOptions(BaseModel):
+    exif_rotate: bool = _env_flag("OCR_EXIF_ROTATE", "1")
+    downscale: bool = _env_flag("OCR_DOWNSCALE", "1")
+    # Median glyph height (px) the image is scaled towards; never upscaled
+    target_text_height: int = int(os.getenv("OCR_TARGET_TEXT_HEIGHT", "28"))
+    max_side: int = int(os.getenv("OCR_MAX_SIDE", "2560"))
+    grayscale: bool = _env_flag("OCR_GRAYSCALE", "1")
+    # Adaptive binarization; off by default: it often hurts deep-learning recognizers like
+    # easyocr, and no fixture benchmark (bench_ocr.py preprocess) has shown it helping yet
+    threshold: bool = _env_flag("OCR_THRESHOLD", "0")
+    threshold_block_size: int = int(os.getenv("OCR_THRESHOLD_BLOCK_SIZE", "31"))
+    threshold_c: int = int(os.getenv("OCR_THRESHOLD_C", "15"))
+    deskew: bool = _env_flag("OCR_DESKEW", "0")
+    max_skew_degrees: float = float(os.getenv("OCR_MAX_SKEW_DEGREES", "10"))
+
+
+DEFAULT_OPTIONS = PreprocessOptions()
+
+
+def load_image(image: Union[str, bytes], exif_rotate: bool = True) -> np.ndarray:
+    """Decode an image to an RGB array, applying the EXIF orientation tag if asked."""
+    source = io.BytesIO(image) if isinstance(image, bytes) else image
+    with Image.open(source) as img:
+        if exif_rotate:
+            img = ImageOps.exif_transpose(img)
+        return np.asarray(img.convert("RGB"))
+
+
+def _binarize(gray: np.ndarray, block_size: int, c: int) -> np.ndarray:
+    import cv2
+    block_size = max(3, block_size | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, block_size, c)
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Median height of glyph-sized connected components, in pixels of ``gray``."""
+    import cv2
+    scale = min(1.0, 1600 / max(gray.shape[:2]))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    ink = cv2.bitwise_not(_binarize(small, 31, 15))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    glyphs = (heights >= 4) & (heights <= small.shape[0] * 0.15) & (widths <= heights * 6) & (areas >= 10)
+    if glyphs.sum() < 10:
+        return None
+    return float(np.median(heights[glyphs])) / scale
+
+
+def downscale(image: np.ndarray, target_text_height: int, max_side: int) -> np.ndarray:
+    import cv2
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    text_height = estimate_text_height(gray)
+    factor = target_text_height / text_height if text_height else 1.0
+    factor = min(factor, max_side / max(image.shape[:2]), 1.0)
+    if factor >= 0.95:
+        return image
+    logger.debug(f"Downscaling {image.shape[1]}x{image.shape[0]} by {factor:.2f} (text height {text_height})")
+    return cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+
+def estimate_skew(gray: np.ndarray, max_degrees: float) -> float:
+    """Angle (degrees) that maximises the variance of the row ink profile."""
+    import cv2
+    scale = min(1.0, 800 / max(gray.shape[:2]))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    ink = cv2.bitwise_not(_binarize(small, 31, 15))
+    h, w = ink.shape
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_degrees, max_degrees + 0.01, 0.5):
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        rotated = cv2.warpAffine(ink, matrix, (w, h), flags=cv2.INTER_NEAREST)
+        score = float(np.var(rotated.sum(axis=1, dtype=np.float64)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def rotate(image: np.ndarray, angle: float) -> np.ndarray:
+    import cv2
+    h, w = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess_image(image: Union[str, bytes, np.ndarray],
+                     options: PreprocessOptions = DEFAULT_OPTIONS) -> np.ndarray:
+    """Run the configured preprocessing steps and return an array ready for OCR."""
+    import cv2
+    if not isinstance(image, np.ndarray):
+        image = load_image(image, exif_rotate=options.exif_rotate)
+    if options.grayscale and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if options.downscale:
+        image = downscale(image, options.target_text_height, options.max_side)
+    if options.deskew:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        angle = estimate_skew(gray, options.max_skew_degrees)
+        if abs(angle) >= 0.5:
+            image = rotate(image, angle)
+    if options.threshold:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        image = _binarize(gray, options.threshold_block_size, options.threshold_c)
+    return image
@@ -0,0 +1,106 @@
+import os
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+from ocr import OCRBox, OCRReaderPool
+from ocr_preprocess import DEFAULT_OPTIONS, PreprocessOptions, preprocess_image
+
+logger = logging.getLogger(__name__)
+
+# Source images at or above this many pixels are OCR'd tile by tile
+OCR_TILE_MIN_PIXELS = int(float(os.getenv("OCR_TILE_MIN_PIXELS", "12e6")))
+OCR_TILE_SIZE = int(os.getenv("OCR_TILE_SIZE", "1600"))
+# Should exceed the widest word/line fragment so every box is whole in at least one tile
+OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", "200"))
+# Boxes overlapping an already kept box by more than this share of the smaller one are duplicates
+OCR_TILE_DEDUP_OVERLAP = float(os.getenv("OCR_TILE_DEDUP_OVERLAP", "0.5"))
+
+Box = Tuple[float, float, float, float]
+
+
+def needs_tiling(image: np.ndarray) -> bool:
+    return image.shape[0] * image.shape[1] >= OCR_TILE_MIN_PIXELS
+
+
+def prepare_for_ocr(image: np.ndarray, preprocess: bool,
+                    options: PreprocessOptions = DEFAULT_OPTIONS) -> Tuple[np.ndarray, bool]:
+    """Preprocess ``image`` and return it with whether it should be OCR'd as tiles.
+
+    The decision is made on the source resolution. Tiled images keep their
+    full size instead of being capped at OCR_MAX_SIDE, which would otherwise
+    bring every image below OCR_TILE_MIN_PIXELS; the text-height based
+    downscale still applies to them.
+    """
+    tiled = needs_tiling(image)
+    if not preprocess:
+        return image, tiled
+    if tiled:
+        options = options.copy(update={"max_side": max(image.shape[:2])})
+    return preprocess_image(image, options), tiled
+
+
+def tile_grid(height: int, width: int, tile_size: int, overlap: int) -> List[Box]:
+    step = max(1, tile_size - overlap)
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        return positions + [length - tile_size]
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def _area(box: Box) -> float:
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+
+
+def _overlap_of_smaller(a: Box, b: Box) -> float:
+    inter = _area((max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])))
+    smaller = min(_area(a), _area(b))
+    return inter / smaller if smaller else 0.0
+
+
+def deduplicate(boxes: List[OCRBox], threshold: float = OCR_TILE_DEDUP_OVERLAP) -> List[OCRBox]:
+    """Keep one box per overlap region, preferring the larger (uncut) one, then the more confident."""
+    kept: List[OCRBox] = []
+    for candidate in sorted(boxes, key=lambda b: (_area(b[0]), b[2]), reverse=True):
+        if all(_overlap_of_smaller(candidate[0], other[0]) <= threshold for other in kept):
+            kept.append(candidate)
+    return kept
+
+
+def reading_order(boxes: List[OCRBox]) -> str:
+    """Group boxes into lines by vertical centre, then read each line left to right."""
+    if not boxes:
+        return ""
+    median_height = float(np.median([b[0][3] - b[0][1] for b in boxes])) or 1.0
+    lines: List[List[OCRBox]] = []
+    for box in sorted(boxes, key=lambda b: (b[0][1] + b[0][3]) / 2):
+        centre = (box[0][1] + box[0][3]) / 2
+        if lines:
+            line = lines[-1]
+            line_centre = sum((b[0][1] + b[0][3]) / 2 for b in line) / len(line)
+            if abs(centre - line_centre) <= median_height / 2:
+                line.append(box)
+                continue
+        lines.append([box])
+    return "\n".join(" ".join(b[1] for b in sorted(line, key=lambda b: b[0][0])) for line in lines)
+
+
+def ocr_tiled(pool: OCRReaderPool, image: np.ndarray,
+              tile_size: int = OCR_TILE_SIZE, overlap: int = OCR_TILE_OVERLAP) -> str:
+    """OCR a large image as overlapping tiles spread over the reader pool."""
+    height, width = image.shape[:2]
+    tiles = tile_grid(height, width, tile_size, overlap)
+    logger.info(f"Tiling {width}x{height} image into {len(tiles)} tiles of {tile_size}px (overlap {overlap}px)")
+    futures = [(x0, y0, pool.submit_boxes(np.ascontiguousarray(image[y0:y1, x0:x1])))
+               for x0, y0, x1, y1 in tiles]
+    boxes: List[OCRBox] = []
+    for x0, y0, future in futures:
+        for (bx0, by0, bx1, by1), text, conf in future.result():
+            boxes.append(((bx0 + x0, by0 + y0, bx1 + x0, by1 + y0), text, conf))
+    return reading_order(deduplicate(boxes))
@@ -7,29 +7,33 @@ import logging
 from fastapi.responses import FileResponse
 import os
 import fitz  # PyMuPDF
-import easyocr
-from paddleocr import PaddleOCR, draw_ocr
 import re
 import time
 import socket
-import cv2
 from dotenv import load_dotenv
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain_core.documents import Document
-import pytesseract
-from PIL import Image
-from langchain_huggingface import HuggingFaceEmbeddings
-from gtts import gTTS
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import shutil
 import logging
-from langchain.llms.base import LLM
 from typing import Optional, List
+import sys
+import numpy as np
+from functools import lru_cache
+from ocr import get_pool, lang_key, ocr_stats, submit_ocr, OCRQueueFull
+from ocr_preprocess import load_image
+from ocr_cache import OCRFingerprint, image_fingerprint, ocr_cache
+from ocr_tiling import ocr_tiled, prepare_for_ocr
+
+# Shared helpers (TTS cache, ...) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts_cache import TTSCache
+from tts_backends import TTS_BACKEND, TTS_BACKENDS, synthesize
+from tts_stream import get_progressive_job, start_progressive_tts, stream_stats
+from tts_jobs import get_tts_job, submit_tts_job, tts_job_stats
+from media_retention import MediaRetention, policy_from_env
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +44,30 @@ TEMP_DIR = "temp"
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR)
 
+# Summaries are stored once under a content-hash name in TEMP_DIR so /api/stream can serve them
+tts_cache = TTSCache(TEMP_DIR)
+
+# Expire uploads and summary audio in TEMP_DIR
+media_retention = MediaRetention([
+    policy_from_env("temp", TEMP_DIR, ttl_hours=24, max_mb=2048, patterns=["*.mp3", "*.part", "temp_*"]),
+])
+media_retention.add_pin_check(tts_cache.in_use)
+media_retention.add_pin_check(lambda path: get_progressive_job(os.path.basename(path)) is not None)
+
+# Stream summaries sentence by sentence from /api/stream instead of waiting for the whole file
+TTS_PROGRESSIVE = os.getenv("TTS_PROGRESSIVE", "0").lower() in ("1", "true", "yes", "on")
+
+# Pages whose text layer is shorter than this are treated as scanned and OCR'd
+PDF_OCR_MIN_CHARS = int(os.getenv("PDF_OCR_MIN_CHARS", "20"))
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "200"))
+# Rotate/downscale/grayscale uploaded photos before OCR (see ocr_preprocess.py)
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1").lower() in ("1", "true", "yes", "on")
+
+# OCR engines (easyocr, PaddleOCR, tesseract) are imported by api_data/ocr.py when a reader pool is
+# first built, and langchain / FAISS / HuggingFace below when the first QA agent is built, so
+# importing this module (and starting the API) does not load any of them.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
 # Pydantic models for response structure
 class Section(BaseModel):
     heading: str
@@ -51,55 +79,84 @@ class PDFResponse(BaseModel):
     query: str
     answer: str
     audio_file: str
+    audio_job_id: Optional[str] = None
+    audio_status_url: Optional[str] = None
 
 class ImageResponse(BaseModel):
     ocr_text: str
     query: str
     answer: str
     audio_file: str
+    audio_job_id: Optional[str] = None
+    audio_status_url: Optional[str] = None
 
 pdf_response: PDFResponse | None = None
 image_response: ImageResponse| None = None
 
-class SimpleGroqLLM(LLM):
-    groq_api_key: str
-    model: str = "llama3-8b-8192"
+@lru_cache(maxsize=None)
+def simple_groq_llm_class():
+    """Define the Groq LLM wrapper on first use; subclassing LLM needs langchain imported."""
+    from langchain.llms.base import LLM
 
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-        }
+    class SimpleGroqLLM(LLM):
+        groq_api_key: str
+        model: str = "llama3-8b-8192"
+
+        def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+            headers = {
+                "Authorization": f"Bearer {self.groq_api_key}",
+                "Content-Type": "application/json"
+            }
+            payload = {
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+            }
+
+            response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
+
+            try:
+                result = response.json()
+                if "choices" in result:
+                    return result["choices"][0]["message"]["content"]
+                else:
+                    raise ValueError(f"Unexpected response format from Groq API: {result}")
+            except Exception as e:
+                logger.error(f"Groq API call failed: {e}")
+                raise RuntimeError("Failed to generate response from Groq API.")
+
+        @property
+        def _llm_type(self) -> str:
+            return "groq-llm"
+
+    return SimpleGroqLLM
+
+def render_page_image(page, dpi: int) -> np.ndarray:
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
 
-        response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
-        
-        try:
-            result = response.json()
-            if "choices" in result:
-                return result["choices"][0]["message"]["content"]
-            else:
-                raise ValueError(f"Unexpected response format from Groq API: {result}")
-        except Exception as e:
-            logger.error(f"Groq API call failed: {e}")
-            raise RuntimeError("Failed to generate response from Groq API.")
-    
-    @property
-    def _llm_type(self) -> str:
-        return "groq-llm"
-    
 def parse_pdf(file_path: str) -> Dict:
     try:
         doc = fitz.open(file_path)
-        raw_text = ""
+        page_texts = []
+        scanned_pages = []
         for page_num in range(len(doc)):
             page = doc.load_page(page_num)
             text = page.get_text()
-            raw_text += text + "\n"
+            page_texts.append(text)
+            if len(text.strip()) < PDF_OCR_MIN_CHARS:
+                scanned_pages.append(page_num)
+
+        if scanned_pages:
+            # Rendering stays on this thread (PyMuPDF documents are not thread-safe);
+            # each page is handed to the OCR workers as soon as it is rendered.
+            logger.info(f"OCR fallback for {len(scanned_pages)} scanned page(s) at {PDF_OCR_DPI} DPI")
+            futures = [(n, submit_ocr(render_page_image(doc.load_page(n), PDF_OCR_DPI))) for n in scanned_pages]
+            for page_num, future in futures:
+                ocr_text = future.result()
+                if len(ocr_text.strip()) > len(page_texts[page_num].strip()):
+                    page_texts[page_num] = ocr_text
         doc.close()
+        raw_text = "".join(text + "\n" for text in page_texts)
         lines = raw_text.strip().split('\n')
         title = next((line.strip() for line in lines if line.strip()), "")
         section_pattern = re.compile(r'^(?:\d+\.?)+\s+.+', re.MULTILINE)
@@ -116,35 +173,48 @@ def parse_pdf(file_path: str) -> Dict:
             "body": raw_text.strip(),
             "sections": sections
         }
+    except OCRQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Error parsing PDF: {e}")
         return {"title": "", "body": "", "sections": []}
 
-def extract_text_easyocr(image_path: str) -> str:
-    reader = easyocr.Reader(['en' , 'hi'], gpu=False)
-    result = reader.readtext(image_path, detail=0)
-    print("OCR result list:", result)
-    return " ".join(result)
-
-#def extract_text_tesseract(image_path: str) -> str:
-#    try:
-#        # Use 'with' to automatically close the file
-#        with Image.open(image_path) as img:
-#            # Use Tesseract to extract text
-#           extracted_text = pytesseract.image_to_string(img, lang='eng+hin')
-#
-#        print("OCR result:", extracted_text)
-#        return extracted_text.strip()
-#    
-#    except Exception as e:
-#        print(f"Error during OCR: {e}")
-#        raise e
-
-def build_qa_agent(texts: List[str], groq_api_key: str) -> RetrievalQA:
-    llm = SimpleGroqLLM(groq_api_key=groq_api_key, model="llama3-8b-8192")
+def ocr_cache_key(pool, preprocess: bool) -> str:
+    return f"{pool.backend}:{lang_key(pool.languages)}:{int(preprocess)}"
+
+def extract_text_ocr(image_path: str, preprocess: bool = OCR_PREPROCESS,
+                     languages: Optional[List[str]] = None) -> Tuple[str, OCRFingerprint]:
+    """OCR an image, reusing the text of a near-duplicate already in image_collection.
+
+    Callers store ``fingerprint.to_doc()`` on the image document along with the
+    text and register it with ``ocr_cache.add`` so later copies can reuse it.
+    """
+    pool = get_pool(languages)
+    image = load_image(image_path)
+    fingerprint = image_fingerprint(image, ocr_cache_key(pool, preprocess))
+    cached = ocr_cache.lookup(fingerprint)
+    if cached is not None:
+        logger.info(f"OCR cache hit for {image_path} (pHash {fingerprint.phash:016x})")
+        return cached, fingerprint
+    image, tiled = prepare_for_ocr(image, preprocess)
+    result = ocr_tiled(pool, image) if tiled else pool.readtext(image)
+    logger.debug(f"OCR result for {image_path}: {result!r}")
+    return result, fingerprint
+
+@lru_cache(maxsize=1)
+def get_embeddings():
+    # Loading the sentence-transformers model takes seconds; do it once, on the first query
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+def build_qa_agent(texts: List[str], groq_api_key: str) -> "RetrievalQA":
+    from langchain.chains import RetrievalQA
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    llm = simple_groq_llm_class()(groq_api_key=groq_api_key, model="llama3-8b-8192")
     documents = [Document(page_content=t) for t in texts if t.strip()]
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    db = FAISS.from_documents(documents, embeddings)
+    db = FAISS.from_documents(documents, get_embeddings())
     
     qa = RetrievalQA.from_chain_type(
         llm=llm,
@@ -153,17 +223,18 @@ def build_qa_agent(texts: List[str], groq_api_key: str) -> RetrievalQA:
     )
     return qa
 
-def text_to_speech(text: str, file_prefix: str = "output") -> str:
+def summarize_texts(texts: List[str], query: str) -> str:
+    agent = build_qa_agent(texts, groq_api_key=os.getenv("GROQ_API_KEY"))
+    return agent.invoke({"query": query})["result"]
+
+def text_to_speech(text: str, file_prefix: str = "output", lang: str = "en", backend: Optional[str] = None) -> str:
+    backend = backend or TTS_BACKEND
     try:
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        output_file = os.path.join(TEMP_DIR, f"{file_prefix}_{timestamp}.mp3")
-        logger.info(f"Generating audio with Google TTS to {output_file}")
-        tts = gTTS(text=text, lang="en")
-        tts.save(output_file)
-        if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
-            logger.error(f"Audio file {output_file} was not created or is empty")
-            return ""
-        return output_file
+        def synthesize_to(output_file: str):
+            logger.info(f"Generating {file_prefix} audio with {backend} to {output_file}")
+            synthesize(text, output_file, backend=backend, lang=lang)
+
+        return tts_cache.get_or_create(text, synthesize_to, lang=lang, backend=backend)
     except Exception as e:
         logger.error(f"Error in text-to-speech: {e}")
         return ""
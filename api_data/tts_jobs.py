@@ -0,0 +1,77 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from tts_backends import TTS_BACKEND, synthesize
+
+logger = logging.getLogger(__name__)
+
+TTS_JOB_WORKERS = int(os.getenv("TTS_JOB_WORKERS", "2"))
+# Finished jobs remembered for /api/audio-status; older ones fall back to the file check
+TTS_JOB_HISTORY = int(os.getenv("TTS_JOB_HISTORY", "1000"))
+
+_executor = ThreadPoolExecutor(max_workers=TTS_JOB_WORKERS, thread_name_prefix="tts-job")
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def submit_tts_job(tts_cache, text: str, lang: str = "en", backend: Optional[str] = None) -> Dict:
+    """Queue synthesis of ``text`` in the background and return its job record.
+
+    The job id is the TTS cache key, so identical summaries share one job and
+    an already cached text comes back as a finished job straight away.
+    """
+    backend = backend or TTS_BACKEND
+    key = tts_cache.key(text, lang, backend=backend)
+    filename = os.path.basename(tts_cache.path_for(key))
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None and job["status"] != "failed":
+            return dict(job)
+        job = {"job_id": key, "filename": filename, "status": "queued", "error": None,
+               "created": time.time(), "finished": None}
+        # A miss here is counted by get_or_create in run(), not twice
+        if tts_cache.get(key, count_miss=False):
+            job.update(status="done", finished=time.time())
+        _jobs[key] = job
+        while len(_jobs) > TTS_JOB_HISTORY:
+            _jobs.popitem(last=False)
+        if job["status"] == "done":
+            return dict(job)
+
+    def run():
+        _update(key, status="running")
+        try:
+            tts_cache.get_or_create(text, lambda path: synthesize(text, path, backend=backend, lang=lang),
+                                    lang=lang, backend=backend)
+            _update(key, status="done", finished=time.time())
+        except Exception as e:
+            logger.error(f"TTS job {key[:12]} failed: {e}")
+            _update(key, status="failed", error=str(e), finished=time.time())
+
+    _executor.submit(run)
+    return dict(job)
+
+
+def _update(key: str, **fields):
+    with _lock:
+        if key in _jobs:
+            _jobs[key].update(fields)
+
+
+def get_tts_job(job_id: str) -> Optional[Dict]:
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def tts_job_stats() -> Dict:
+    with _lock:
+        counts: Dict[str, int] = {}
+        for job in _jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return {"workers": TTS_JOB_WORKERS, "jobs": counts}
@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from tts_backends import TTS_BACKEND, synthesize
+from audio_catalog import strip_mp3_headers
+
+logger = logging.getLogger(__name__)
+
+TTS_STREAM_WORKERS = int(os.getenv("TTS_STREAM_WORKERS", "4"))
+# Sentences shorter than this are merged with the next one to avoid tiny gTTS round trips
+TTS_MIN_SENTENCE_CHARS = int(os.getenv("TTS_MIN_SENTENCE_CHARS", "40"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+_synth_executor = ThreadPoolExecutor(max_workers=TTS_STREAM_WORKERS, thread_name_prefix="tts-sentence")
+# Joining the sentence files happens off the synthesis pool so it can never starve it
+_assemble_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts-assemble")
+
+
+def split_sentences(text: str, min_chars: int = TTS_MIN_SENTENCE_CHARS) -> List[str]:
+    sentences = []
+    pending = ""
+    for part in _SENTENCE_END.split(text.strip()):
+        pending = f"{pending} {part}".strip() if pending else part.strip()
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+class ProgressiveTTSJob:
+    """Synthesizes one text sentence by sentence so playback can start on the first one.
+
+    The job id is the TTS cache key of the full text; once every sentence is
+    ready the joined audio is stored in the cache under that key, after which
+    it is served like any other cached file. The sentence files stay pinned in
+    the cache until the join and every stream reading them have finished.
+    """
+
+    def __init__(self, tts_cache, text: str, lang: str = "en", backend: str = TTS_BACKEND):
+        self.cache = tts_cache
+        self.key = tts_cache.key(text, lang, backend=backend)
+        self.filename = os.path.basename(tts_cache.path_for(self.key))
+        self.lang = lang
+        self.backend = backend
+        # Text with no sentences (empty or whitespace) goes through one ordinary synthesis call,
+        # so the cache's empty-output check fails the job instead of a 0-byte file being stored
+        self.sentences = split_sentences(text) or [text]
+        self.sentence_keys = [tts_cache.key(s, lang, backend=backend) for s in self.sentences]
+        for key in self.sentence_keys:
+            tts_cache.pin(key)
+        # _assemble plus every stream in progress; the pins go when the last one finishes
+        self._readers = 1
+        self._readers_lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.first_audio_s: Optional[float] = None
+        self.futures: List[Future] = [_synth_executor.submit(self._synthesize, s, k)
+                                      for s, k in zip(self.sentences, self.sentence_keys)]
+        self.done: Future = _assemble_executor.submit(self._assemble)
+
+    def _synthesize(self, sentence: str, key: str) -> str:
+        return self.cache.get_or_create_key(
+            key, lambda path: synthesize(sentence, path, backend=self.backend, lang=self.lang))
+
+    def _acquire(self) -> bool:
+        with self._readers_lock:
+            if self._readers == 0:
+                return False
+            self._readers += 1
+            return True
+
+    def _release(self):
+        with self._readers_lock:
+            self._readers -= 1
+            last = self._readers == 0
+        if last:
+            for key in self.sentence_keys:
+                self.cache.unpin(key)
+
+    def _assemble(self) -> str:
+        try:
+            paths = [future.result() for future in self.futures]
+            partial = f"{self.cache.path_for(self.key)}.{uuid.uuid4().hex}.part"
+            with open(partial, "wb") as out:
+                for path in paths:
+                    with open(path, "rb") as f:
+                        out.write(strip_mp3_headers(f.read()))
+            if os.path.getsize(partial) == 0:
+                os.remove(partial)
+                raise RuntimeError(f"No output was produced for key {self.key[:12]}")
+            path = self.cache.put(self.key, partial)
+        finally:
+            self._release()
+        logger.info(f"Progressive TTS {self.key[:12]} complete in {time.perf_counter() - self.started:.1f}s")
+        return path
+
+    def _first_byte_sent(self):
+        with self._readers_lock:
+            if self.first_audio_s is not None:
+                return
+            self.first_audio_s = time.perf_counter() - self.started
+        _record_first_audio(self.first_audio_s)
+        logger.info(f"Progressive TTS {self.key[:12]}: first audio sent after {self.first_audio_s * 1000:.0f} ms")
+
+    def iter_audio(self) -> Iterator[bytes]:
+        """Yield MP3 bytes in sentence order, each sentence as soon as it is synthesized.
+
+        The bytes are those ``_assemble`` stores, so a client that streamed the
+        audio and one that fetches the finished file get the same stream.
+        """
+        if not self._acquire():
+            # Joined and unpinned while this request was on its way: serve the stored file
+            with open(self.done.result(), "rb") as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                    yield chunk
+            return
+        try:
+            for future in self.futures:
+                with open(future.result(), "rb") as f:
+                    data = strip_mp3_headers(f.read())
+                for start in range(0, len(data), STREAM_CHUNK_SIZE):
+                    if self.first_audio_s is None:
+                        self._first_byte_sent()
+                    yield data[start:start + STREAM_CHUNK_SIZE]
+        finally:
+            self._release()
+
+
+_jobs: Dict[str, ProgressiveTTSJob] = {}
+# Re-entrant: done callbacks may fire inline while start_progressive_tts holds it
+_jobs_lock = threading.RLock()
+_first_audio_ms = deque(maxlen=200)
+
+
+def _record_first_audio(seconds: float):
+    with _jobs_lock:
+        _first_audio_ms.append(seconds * 1000)
+
+
+def start_progressive_tts(tts_cache, text: str, lang: str = "en", backend: Optional[str] = None) -> str:
+    """Start (or join) progressive synthesis of ``text`` and return the audio filename to stream."""
+    backend = backend or TTS_BACKEND
+    key = tts_cache.key(text, lang, backend=backend)
+    if tts_cache.get(key):
+        return os.path.basename(tts_cache.path_for(key))
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None:
+            job = _jobs[key] = ProgressiveTTSJob(tts_cache, text, lang, backend)
+            job.done.add_done_callback(lambda _: _forget(key))
+    return job.filename
+
+
+def _forget(key: str):
+    with _jobs_lock:
+        _jobs.pop(key, None)
+
+
+def get_progressive_job(filename: str) -> Optional[ProgressiveTTSJob]:
+    with _jobs_lock:
+        return _jobs.get(os.path.splitext(filename)[0])
+
+
+def stream_stats() -> Dict:
+    with _jobs_lock:
+        samples = sorted(_first_audio_ms)
+        stats = {"active_jobs": len(_jobs), "workers": TTS_STREAM_WORKERS}
+    if samples:
+        stats["time_to_first_audio_ms"] = {
+            "last": round(_first_audio_ms[-1], 1),
+            "avg": round(sum(samples) / len(samples), 1),
+            "p50": round(samples[len(samples) // 2], 1),
+            "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+        }
+    return stats
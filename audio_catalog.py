@@ -0,0 +1,328 @@
+import os
+import time
+import json
+import wave
+import base64
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".mp3", ".wav")
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "100"))
+CATALOG_MAX_PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audio (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    duration REAL,
+    text_hash TEXT,
+    backend TEXT,
+    lang TEXT,
+    created REAL NOT NULL,
+    last_generated REAL
+);
+CREATE INDEX IF NOT EXISTS audio_created ON audio (created DESC, filename DESC);
+CREATE INDEX IF NOT EXISTS audio_text_hash ON audio (text_hash);
+"""
+
+# Catalogs created before last_generated existed; run before its index is created
+_MIGRATIONS = [
+    ("last_generated", "ALTER TABLE audio ADD COLUMN last_generated REAL",
+     "UPDATE audio SET last_generated = created WHERE last_generated IS NULL"),
+]
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS audio_last_generated ON audio (last_generated DESC, filename DESC);
+"""
+
+# MPEG audio bitrates (kbps) and sample rates, indexed by header fields
+_MP3_BITRATES = {
+    (3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 Layer III
+    (2, 1): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],  # MPEG-2/2.5 Layer III
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _id3v2_size(data: bytes) -> int:
+    if data[:3] == b"ID3" and len(data) >= 10:
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]) + footer
+    return 0
+
+
+def _mp3_frame(data: bytes, offset: int) -> Optional[Tuple[int, int, int, int]]:
+    """(offset, version, bitrate index, sample rate index) of the first Layer III frame header at or after ``offset``."""
+    while offset + 4 <= len(data):
+        if data[offset] == 0xFF and data[offset + 1] & 0xE0 == 0xE0:
+            version = (data[offset + 1] >> 3) & 0x3
+            layer = (data[offset + 1] >> 1) & 0x3
+            bitrate_index = data[offset + 2] >> 4
+            rate_index = (data[offset + 2] >> 2) & 0x3
+            if version != 1 and layer == 1 and 0 < bitrate_index < 15 and rate_index < 3:
+                return offset, version, bitrate_index, rate_index
+        offset += 1
+    return None
+
+
+def _xing_offset(data: bytes, offset: int, version: int) -> int:
+    mono = (data[offset + 3] >> 6) == 3
+    side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    return offset + 4 + side_info
+
+
+def mp3_duration(path: str) -> Optional[float]:
+    """Duration in seconds from the first frame header (Xing/Info frame count, else CBR estimate)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        data = f.read(64 * 1024)
+    tag_size = _id3v2_size(data)
+    if tag_size:
+        with open(path, "rb") as f:
+            f.seek(tag_size)
+            data = f.read(64 * 1024)
+        size -= tag_size
+    frame = _mp3_frame(data, 0)
+    if frame is None:
+        return None
+    offset, version, bitrate_index, rate_index = frame
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    samples_per_frame = 1152 if version == 3 else 576
+    xing = _xing_offset(data, offset, version)
+    if data[xing:xing + 4] in (b"Xing", b"Info") and data[xing + 7] & 0x1:
+        frames = int.from_bytes(data[xing + 8:xing + 12], "big")
+        return frames * samples_per_frame / sample_rate
+    bitrate = _MP3_BITRATES[(3 if version == 3 else 2, 1)][bitrate_index] * 1000
+    return (size - offset) * 8 / bitrate
+
+
+def strip_mp3_headers(data: bytes) -> bytes:
+    """The audio frames of an MP3 file, without ID3v2/ID3v1 tags or a Xing/Info/VBRI header frame.
+
+    Joining MP3 files byte by byte leaves each file's tag and header frame in the
+    middle of the stream, and the first header's frame count then covers only the
+    first file. Joined stripped files form one stream players measure frame by frame.
+    """
+    start = _id3v2_size(data)
+    end = len(data) - 128 if len(data) - start >= 128 and data[-128:-125] == b"TAG" else len(data)
+    frame = _mp3_frame(data[:end], start)
+    if frame is None:
+        return data[start:end]
+    offset, version, bitrate_index, rate_index = frame
+    xing = _xing_offset(data, offset, version)
+    if data[xing:xing + 4] in (b"Xing", b"Info") or data[offset + 36:offset + 40] == b"VBRI":
+        bitrate = _MP3_BITRATES[(3 if version == 3 else 2, 1)][bitrate_index] * 1000
+        padding = (data[offset + 2] >> 1) & 0x1
+        offset += (144 if version == 3 else 72) * bitrate // _MP3_SAMPLE_RATES[version][rate_index] + padding
+    return data[offset:end]
+
+
+def audio_duration(path: str) -> Optional[float]:
+    try:
+        if path.endswith(".wav"):
+            with wave.open(path, "rb") as w:
+                return w.getnframes() / float(w.getframerate())
+        if path.endswith(".mp3"):
+            return mp3_duration(path)
+    except (OSError, EOFError, wave.Error, IndexError, KeyError) as e:
+        logger.warning(f"Could not read duration of {path}: {e}")
+    return None
+
+
+def _extension_pattern(extension: str) -> str:
+    """LIKE pattern for names ending in ``.extension``, with its wildcards escaped (``ESCAPE '\\'``)."""
+    escaped = extension.lstrip(".").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%.{escaped}"
+
+
+def _encode_cursor(created: float, filename: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created, filename]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created, filename = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(created), str(filename)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class AudioCatalog:
+    """SQLite index of the audio files in one directory.
+
+    Writers call ``add`` after saving a file; ``sync`` reconciles the index with
+    the directory (files written by other services, files removed by retention).
+    Listing is newest first with keyset pagination, so page cost does not grow
+    with the number of files.
+    """
+
+    def __init__(self, directory: str, db_path: Optional[str] = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path or os.path.join(directory, "catalog.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            # WAL lets the TTS and avatar services write the same catalog concurrently
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(audio)")}
+            for column, *statements in _MIGRATIONS:
+                if column not in columns:
+                    for statement in statements:
+                        self._conn.execute(statement)
+            self._conn.executescript(_INDEXES)
+
+    def add(self, path: str, text: Optional[str] = None, backend: Optional[str] = None,
+            lang: Optional[str] = None, generated_at: Optional[float] = None) -> Dict:
+        """Register ``path``; ``generated_at`` (default: now) is when it was last produced or served
+        by the generator, which a cache hit updates even though the file is not rewritten."""
+        filename = os.path.basename(path)
+        stat = os.stat(path)
+        row = {
+            "filename": filename,
+            "size": stat.st_size,
+            "duration": audio_duration(path),
+            "text_hash": text_hash(text) if text is not None else None,
+            "backend": backend,
+            "lang": lang,
+            "created": stat.st_mtime,
+            "last_generated": time.time() if generated_at is None else generated_at,
+        }
+        with self._lock, self._conn:
+            # A cache hit re-adds an existing file: keep its created time, fill in what we now know
+            # and mark it as the most recently generated
+            self._conn.execute(
+                """INSERT INTO audio (filename, size, duration, text_hash, backend, lang, created, last_generated)
+                   VALUES (:filename, :size, :duration, :text_hash, :backend, :lang, :created, :last_generated)
+                   ON CONFLICT(filename) DO UPDATE SET
+                       size = excluded.size,
+                       last_generated = MAX(COALESCE(audio.last_generated, 0), excluded.last_generated),
+                       duration = COALESCE(excluded.duration, audio.duration),
+                       text_hash = COALESCE(excluded.text_hash, audio.text_hash),
+                       backend = COALESCE(excluded.backend, audio.backend),
+                       lang = COALESCE(excluded.lang, audio.lang)""",
+                row)
+        return row
+
+    def remove(self, filenames: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM audio WHERE filename = ?", [(f,) for f in filenames])
+
+    def sync(self) -> Dict:
+        """Index files missing from the catalog and drop rows whose file is gone."""
+        started = time.perf_counter()
+        on_disk = {entry.name for entry in os.scandir(self.directory)
+                   if entry.is_file() and entry.name.endswith(AUDIO_EXTENSIONS)}
+        with self._lock:
+            indexed = {row[0] for row in self._conn.execute("SELECT filename FROM audio")}
+        stale = list(indexed - on_disk)
+        if stale:
+            self.remove(stale)
+        added = 0
+        for filename in on_disk - indexed:
+            try:
+                path = os.path.join(self.directory, filename)
+                # Found on disk, not generated now: it only counts as new as its file
+                self.add(path, generated_at=os.path.getmtime(path))
+                added += 1
+            except FileNotFoundError:
+                pass
+        logger.info(f"Audio catalog sync: {added} added, {len(stale)} removed "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return {"added": added, "removed": len(stale)}
+
+    def list(self, limit: int = CATALOG_PAGE_SIZE, cursor: Optional[str] = None,
+             extension: Optional[str] = None, backend: Optional[str] = None, lang: Optional[str] = None,
+             text_hash: Optional[str] = None, created_after: Optional[float] = None,
+             created_before: Optional[float] = None, min_duration: Optional[float] = None,
+             max_duration: Optional[float] = None) -> Dict:
+        """Return one page of entries, newest first, and the cursor for the next page."""
+        limit = max(1, min(limit, CATALOG_MAX_PAGE_SIZE))
+        where, params = [], []
+        if cursor:
+            created, filename = _decode_cursor(cursor)
+            where.append("(created < ? OR (created = ? AND filename < ?))")
+            params += [created, created, filename]
+        if extension:
+            where.append("filename LIKE ? ESCAPE '\\'")
+            params.append(_extension_pattern(extension))
+        for column, value in (("backend", backend), ("lang", lang), ("text_hash", text_hash)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        for clause, value in (("created > ?", created_after), ("created < ?", created_before),
+                              ("duration >= ?", min_duration), ("duration <= ?", max_duration)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        sql = "SELECT * FROM audio"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC, filename DESC LIMIT ?"
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params + [limit + 1])]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1] if rows else None
+        # Files removed behind the catalog's back (retention, manual cleanup) are dropped lazily
+        missing = [r["filename"] for r in rows if not os.path.exists(os.path.join(self.directory, r["filename"]))]
+        if missing:
+            self.remove(missing)
+            rows = [r for r in rows if r["filename"] not in missing]
+        return {
+            "items": rows,
+            "next_cursor": _encode_cursor(last["created"], last["filename"]) if has_more and last else None,
+        }
+
+    def latest(self, extension: Optional[str] = None) -> Optional[Dict]:
+        """Most recently generated entry whose file still exists; a cache hit counts as generated."""
+        sql = "SELECT * FROM audio"
+        params: List = []
+        if extension:
+            sql += " WHERE filename LIKE ? ESCAPE '\\'"
+            params.append(_extension_pattern(extension))
+        sql += " ORDER BY last_generated DESC, filename DESC LIMIT 10"
+        while True:
+            with self._lock:
+                rows = [dict(row) for row in self._conn.execute(sql, params)]
+            if not rows:
+                return None
+            found = next((row for row in rows if os.path.exists(os.path.join(self.directory, row["filename"]))), None)
+            # Files removed behind the catalog's back are dropped, as in list()
+            missing = [row["filename"] for row in rows[:rows.index(found) if found else len(rows)]]
+            if missing:
+                self.remove(missing)
+            if found:
+                return found
+
+    def get(self, filename: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM audio WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def resolve(self, audio_id: str) -> Optional[Dict]:
+        """Entry for an audio ID: the ``filename`` returned by /api/generate, with or without extension."""
+        if not audio_id or os.path.basename(audio_id) != audio_id:
+            return None
+        candidates = [audio_id] if audio_id.endswith(AUDIO_EXTENSIONS) else [audio_id + ext for ext in AUDIO_EXTENSIONS]
+        for filename in candidates:
+            entry = self.get(filename)
+            if entry is None:
+                continue
+            if os.path.exists(os.path.join(self.directory, filename)):
+                return entry
+            self.remove([filename])
+        return None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM audio").fetchone()[0]
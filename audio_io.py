@@ -0,0 +1,28 @@
+import wave
+import subprocess
+from typing import Tuple
+
+import numpy as np
+
+# Wav2Lip's mel frontend (Wav2Lip/hparams.py) runs at 16 kHz mono
+AUDIO_SAMPLE_RATE = 16000
+
+
+def decode_audio(path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> Tuple[np.ndarray, int]:
+    """Decode any ffmpeg-readable file to mono float32 PCM in [-1, 1] without a temp file."""
+    process = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", path, "-f", "s16le", "-acodec", "pcm_s16le",
+         "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+        capture_output=True, check=True)
+    samples = np.frombuffer(process.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+    return samples, sample_rate
+
+
+def write_wav(samples: np.ndarray, sample_rate: int, path: str):
+    """Write mono float PCM as 16-bit WAV, for tools that only take a file."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
@@ -1,4 +1,5 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import requests
 import os
 
@@ -15,8 +16,9 @@ st.markdown("Enter text below and generate a lip-synced video using AI avatars."
 # ========================
 # Backend Configuration
 # ========================
-API_URL = "http://192.168.1.105:8001/api/generate-and-sync"  # Update if hosted remotely
-TIMEOUT = 300  # seconds
+API_BASE = "http://192.168.1.105:8001"  # Update if hosted remotely
+REQUEST_TIMEOUT = 30  # seconds per HTTP call; the render itself runs as a background job
+POLL_INTERVAL = 1.0  # seconds between job status checks
 
 # ========================
 # Video Display Helper
@@ -27,24 +29,86 @@ def display_video(video_path):
         st.video(video_bytes)
         return video_bytes
 
+def error_detail(response):
+    try:
+        return response.json().get("detail", "Unknown error")
+    except:
+        return response.text
+
+def hls_player(playlist_url):
+    # hls.js plays the event playlist while later segments are still rendering; Safari plays HLS natively
+    components.html(f"""
+        <video id="avatar" controls autoplay playsinline style="width:100%"></video>
+        <script src="https://cdn.jsdelivr.net/npm/hls.js@1"></script>
+        <script>
+          var video = document.getElementById("avatar");
+          var src = "{playlist_url}";
+          if (video.canPlayType("application/vnd.apple.mpegurl")) {{
+            video.src = src;
+          }} else if (Hls.isSupported()) {{
+            var hls = new Hls({{manifestLoadingMaxRetry: 30, manifestLoadingRetryDelay: 1000}});
+            hls.loadSource(src);
+            hls.attachMedia(video);
+          }}
+        </script>
+    """, height=420)
+
+def wait_for_job(job, status_box, progress_bar, on_running=None):
+    while job["status"] not in ("done", "failed"):
+        if on_running and job["status"] == "running":
+            on_running(job)
+            on_running = None
+        if job["status"] == "queued":
+            status_box.info(f"Queued (position {job['queue_position']}), about {job['eta_seconds']:.0f}s left")
+        else:
+            eta = f", about {job['eta_seconds']:.0f}s left" if job.get("eta_seconds") is not None else ""
+            status_box.info(f"Stage: {job['stage']}{eta}")
+        progress_bar.progress(min(int(job["progress"] * 100), 100))
+        time.sleep(POLL_INTERVAL)
+        response = requests.get(API_BASE + job["status_url"], timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        job = response.json()
+    if on_running and job["status"] == "done":
+        on_running(job)
+    progress_bar.progress(100 if job["status"] == "done" else int(job["progress"] * 100))
+    status_box.empty()
+    return job
+
 # ========================
 # Main App
 # ========================
 def main():
     text_input = st.text_area("Enter text to synthesize", height=150, max_chars=3000)
+    stream = st.checkbox("Start playback while rendering", value=True)
 
     if st.button("Generate Lip-Synced Video"):
         if not text_input.strip():
             st.warning("Please enter some text.")
             return
 
-        with st.spinner("Processing... This might take a minute or two."):
-            try:
-                response = requests.post(
-                    API_URL,
-                    data={"text": text_input.strip()},
-                    timeout=TIMEOUT
-                )
+        status_box = st.empty()
+        progress_bar = st.progress(0)
+        try:
+            response = requests.post(
+                API_BASE + "/api/lipsync-jobs",
+                data={"text": text_input.strip(), "stream": stream},
+                timeout=REQUEST_TIMEOUT
+            )
+            if response.status_code != 202:
+                st.error(f"Server error: {error_detail(response)}")
+                return
+
+            job = response.json()
+            player = None
+            if job.get("playlist_url"):
+                player = lambda running_job: hls_player(API_BASE + running_job["playlist_url"])
+            job = wait_for_job(job, status_box, progress_bar, on_running=player)
+            if job["status"] == "failed":
+                st.error(f"Server error: {job['error']}")
+                return
+
+            with st.spinner("Downloading video..."):
+                response = requests.get(API_BASE + job["result_url"], timeout=REQUEST_TIMEOUT)
 
                 if response.status_code == 200:
                     # Save video
@@ -53,7 +117,11 @@ def main():
                         f.write(response.content)
 
                     st.success("Video generated successfully!")
-                    video_bytes = display_video(video_filename)
+                    if player is None:
+                        video_bytes = display_video(video_filename)
+                    else:
+                        with open(video_filename, "rb") as f:
+                            video_bytes = f.read()
 
                     # Download button
                     if video_bytes:
@@ -65,14 +133,10 @@ def main():
                         )
 
                 else:
-                    try:
-                        error_msg = response.json().get("detail", "Unknown error")
-                    except:
-                        error_msg = response.text
-                    st.error(f"Server error: {error_msg}")
-
-            except requests.exceptions.RequestException as e:
-                st.error(f"Connection error: {str(e)}")
+                    st.error(f"Server error: {error_detail(response)}")
+
+        except requests.exceptions.RequestException as e:
+            st.error(f"Connection error: {str(e)}")
 
 if __name__ == "__main__":
     main()
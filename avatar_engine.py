@@ -1,35 +1,87 @@
 
-from fastapi import FastAPI, Form, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
-from gtts import gTTS
+from fastapi import FastAPI, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import uuid
 import subprocess
+import shutil
 import os
 from pathlib import Path
 import numpy as np
-import librosa
+import json
 import traceback
-from keras.models import load_model
+from tts_cache import TTSCache
+from tts_backends import TTS_BACKEND, TTS_BACKENDS, synthesize
+from media_retention import MediaRetention, policy_from_env
+from audio_catalog import AudioCatalog
+from audio_io import decode_audio
+from wav2lip_worker import WAV2LIP_HLS_SEGMENT_SECONDS, get_wav2lip_pool
+from lipsync_jobs import LipSyncJobQueue, LipSyncQueueFull
+from media_http import media_response
+from hls_output import (PLAYLIST_MEDIA_TYPE, SEGMENT_MEDIA_TYPE, end_playlist, publish_complete, publish_pending,
+                        target_duration_for)
+from lipsync_cache import LipSyncCache
+from audio_io import AUDIO_SAMPLE_RATE
+from pydantic import BaseModel
+from typing import List, Optional
+import re
+import threading
+import time
 
 app = FastAPI()
 
+# The Streamlit page's HLS player fetches the playlist and segments from the browser
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["*"],
+)
+
 # Directories
 TTS_OUTPUT_DIR = "tts/tts_outputs"
 RESULTS_DIR = "results"
+HLS_DIR = os.path.join(RESULTS_DIR, "hls")
+HLS_FILE_NAME = re.compile(r"^(index\.m3u8|seg_\d{3}\.ts)$")
 AVATAR_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "avatars"))
 GENDER_MODEL_PATH = "gender-recognition-by-voice/results/model.h5"
-WAV2LIP_PATH = "Wav2Lip"
-WAV2LIP_CHECKPOINT = "checkpoints/wav2lip_gan.pth"
 
 os.makedirs(TTS_OUTPUT_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+# Greetings and repeated lines are synthesized once and reused by content hash
+tts_cache = TTSCache(TTS_OUTPUT_DIR)
+# Shared with tts.py's /api/list-audio-files; speech generated here is listed there too
+audio_catalog = AudioCatalog(TTS_OUTPUT_DIR)
+
+media_retention = MediaRetention([
+    policy_from_env("tts_outputs", TTS_OUTPUT_DIR, ttl_hours=24 * 7, max_mb=1024, patterns=["*.mp3", "*.wav", "*.part"]),
+    policy_from_env("results", RESULTS_DIR, ttl_hours=48, max_mb=4096),
+    policy_from_env("hls", HLS_DIR, ttl_hours=6, max_mb=2048, directories=True),
+])
+media_retention.add_pin_check(tts_cache.in_use)
+
+# Renders are queued and run at most LIPSYNC_MAX_CONCURRENT at a time
+lipsync_jobs = LipSyncJobQueue()
+# Finished videos by hash(audio, avatar, checkpoint); repeated lines are served without rendering
+lipsync_cache = LipSyncCache()
+# JSON list of {"text": ..., "avatars": [file names]} rendered ahead of time when the queue is idle
+LIPSYNC_PREWARM_FILE = os.getenv("LIPSYNC_PREWARM_FILE", "lipsync_prewarm.json")
+LIPSYNC_PREWARM_IDLE_SECONDS = float(os.getenv("LIPSYNC_PREWARM_IDLE_SECONDS", "10"))
+@app.on_event("startup")
+def start_media_retention():
+    media_retention.start()
+
 # Debug: Print AVATAR_DIR to verify
 print(f"Avatar directory: {AVATAR_DIR}")
 
-# Load gender model once
+# Gender detection uses the keras model when it is installed; keras is only imported then.
+# gender_model.pkl / gender_scaler.pkl were fit on synthetic features (every one of the 40 has
+# mean ~0.55, scale ~0.25) and cannot classify real voices, so they are not used.
 gender_model = None
 if os.path.exists(GENDER_MODEL_PATH):
+    from keras.models import load_model
     gender_model = load_model(GENDER_MODEL_PATH)
 else:
     print(f"⚠️ Gender model not found at {GENDER_MODEL_PATH}")
@@ -51,20 +103,14 @@ for gender, paths in AVATARS.items():
         if not os.path.isfile(path):
             print(f"⚠️ Missing avatar file: {path}")
 
-def extract_features(file_path: str) -> np.ndarray:
+def extract_features(samples: np.ndarray) -> np.ndarray:
     try:
-        from scipy.io import wavfile
-        sample_rate, X = wavfile.read(file_path)
-
-        if X.ndim > 1:
-            X = X[:, 0]
-
-        X = X.astype(np.float32)
+        X = samples.astype(np.float32)
         X = X / np.max(np.abs(X), axis=0)
 
-        fft_spectrum = np.fft.fft(X)
-        magnitude = np.abs(fft_spectrum[:len(fft_spectrum)//2])
-        mel = np.log1p(magnitude[:128])  # 128 features like melspectrogram
+        # Only the lowest 128 bins are used; rfft skips the mirrored half of the spectrum
+        magnitude = np.abs(np.fft.rfft(X)[:min(128, len(X) // 2)])
+        mel = np.log1p(magnitude)  # 128 features like melspectrogram
 
         if mel.size < 128:
             mel = np.pad(mel, (0, 128 - mel.size), mode='constant')
@@ -74,11 +120,11 @@ def extract_features(file_path: str) -> np.ndarray:
         print("Feature extraction error (no numba):", traceback.format_exc())
         return np.array([])
 
-def predict_gender(audio_path: str) -> str:
+def predict_gender(samples: np.ndarray) -> str:
     if gender_model is None:
         return "default"
 
-    features = extract_features(audio_path)
+    features = extract_features(samples)
     if features.size != 128:
         features = np.pad(features, (0, 128 - features.shape[0]), mode='constant')
 
@@ -86,67 +132,256 @@ def predict_gender(audio_path: str) -> str:
     prediction = gender_model.predict(features, verbose=0)[0]
     return "male" if prediction >= 0.5 else "female"
 
+def avatar_files() -> List[str]:
+    paths = {path for paths in AVATARS.values() for path in ([paths] if isinstance(paths, str) else paths)}
+    return sorted(path for path in paths if os.path.isfile(path))
+
 def select_avatar(gender: str) -> str:
     import random
-    avatar_path = random.choice(AVATARS.get(gender, [AVATARS["default"]]))
+    choices = AVATARS.get(gender, AVATARS["default"])
+    # "default" maps to a single path rather than a list
+    avatar_path = random.choice([choices] if isinstance(choices, str) else choices)
     if not os.path.isfile(avatar_path):
         raise FileNotFoundError(f"Avatar file not found: {avatar_path}")
     print(f"Selected avatar path: {avatar_path}")
     return avatar_path
 
-def convert_mp3_to_wav(mp3_path: str, wav_path: str):
-    subprocess.run(["ffmpeg", "-y", "-i", mp3_path, wav_path], check=True)
-
-def run_wav2lip(audio_path: str, image_path: str, output_path: str):
+def run_wav2lip(samples: np.ndarray, image_path: str, output_path: str, progress=None, hls_dir=None) -> dict:
     print(f"[DEBUG] Avatar image path: {os.path.abspath(image_path)}")
-    subprocess.run([
-        "python", "inference.py",
-        "--checkpoint_path", WAV2LIP_CHECKPOINT,
-        "--face", os.path.abspath(image_path),
-        "--audio", os.path.abspath(audio_path),
-        "--outfile", os.path.abspath(output_path)
-    ], cwd=WAV2LIP_PATH, check=True)
+    # Rendered by a resident worker that already holds the model (or taken from the result cache)
+    timings = lipsync_cache.render(get_wav2lip_pool(), image_path, samples, output_path, progress, hls_dir=hls_dir)
+    if hls_dir and timings.get("cached"):
+        publish_complete(hls_dir, output_path, len(samples) / AUDIO_SAMPLE_RATE)
+    print(f"[DEBUG] Wav2Lip timings: {timings}")
+    return timings
 
-@app.post("/api/generate-and-sync")
-async def generate_and_sync(text: str = Form(...)):
+def hls_session_dir(session_id: str) -> str:
+    return os.path.join(HLS_DIR, session_id)
+
+def streamed_pipeline(text: str, backend: str, session_id: str, progress) -> dict:
+    try:
+        return lipsync_pipeline(text, backend, session_id, progress, stream=True)
+    except Exception:
+        # Players polling the pending playlist stop instead of waiting for segments forever
+        end_playlist(hls_session_dir(session_id))
+        raise
+
+def lipsync_pipeline(text: str, backend: str, session_id: str, progress, stream: bool = False,
+                     avatar_path: Optional[str] = None) -> dict:
+    # Generate TTS (or reuse the cached audio for this text)
+    progress("tts", 0.0)
+    mp3_path = tts_cache.get_or_create(
+        text, lambda path: synthesize(text, path, backend=backend, lang='en'), lang='en', backend=backend)
+    audio_catalog.add(mp3_path, text=text, backend=backend, lang='en')
+
+    # Decode once; the same PCM feeds gender detection and Wav2Lip
+    progress("decode", 0.1)
+    samples, sample_rate = decode_audio(mp3_path)
+
+    # Predict gender, unless the avatar was chosen by the caller (pre-warming)
+    progress("gender", 0.15)
+    gender = None
+    if avatar_path is None:
+        gender = predict_gender(samples)
+        avatar_path = select_avatar(gender)
+
+    # Lip Sync straight from the decoded PCM; the render reports 0-1 of its own work
+    progress("lipsync", 0.2)
+    output_video = os.path.join(RESULTS_DIR, f"{session_id}.mp4")
+    timings = run_wav2lip(samples, avatar_path, output_video,
+                          lambda stage, fraction: progress(stage, 0.2 + 0.8 * fraction),
+                          hls_dir=hls_session_dir(session_id) if stream else None)
+    return {"filename": os.path.basename(output_video), "gender": gender, "avatar": os.path.basename(avatar_path),
+            "cached": bool(timings.get("cached")), "timings": timings}
+
+def submit_lipsync(text: str, backend: str, stream: bool = False) -> dict:
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
+    if backend not in TTS_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown TTS backend: {backend}")
 
     if len(text) > 500:
         text = text[:500]
 
     session_id = str(uuid.uuid4())
-    mp3_filename = f"{session_id}.mp3"
-    mp3_path = os.path.join(TTS_OUTPUT_DIR, mp3_filename)
-
+    if not stream:
+        try:
+            return lipsync_jobs.submit(lambda progress: lipsync_pipeline(text, backend, session_id, progress))
+        except LipSyncQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    # Streamed jobs publish an HLS playlist that players can open while later segments render;
+    # it exists (empty) from now on, so a player opened while the job is queued waits for segments
+    publish_pending(hls_session_dir(session_id), target_duration_for(WAV2LIP_HLS_SEGMENT_SECONDS))
     try:
-        # Generate TTS
-        tts = gTTS(text=text, lang='en', slow=False)
-        tts.save(mp3_path)
+        return lipsync_jobs.submit(lambda progress: streamed_pipeline(text, backend, session_id, progress),
+                                   playlist_url=f"/api/lipsync-hls/{session_id}/index.m3u8")
+    except LipSyncQueueFull as e:
+        shutil.rmtree(hls_session_dir(session_id), ignore_errors=True)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
 
-        # Convert to WAV
-        wav_path = os.path.join(TTS_OUTPUT_DIR, f"{session_id}.wav")
-        convert_mp3_to_wav(mp3_path, wav_path)
+def job_links(job: dict) -> dict:
+    job_id = job["job_id"]
+    return {
+        **job,
+        "status_url": f"/api/lipsync-jobs/{job_id}",
+        "events_url": f"/api/lipsync-jobs/{job_id}/events",
+        "result_url": f"/api/lipsync-jobs/{job_id}/result",
+    }
 
-        # Predict gender
-        gender = predict_gender(wav_path)
-        avatar_path = select_avatar(gender)
+@app.on_event("startup")
+def start_wav2lip_workers():
+    # Load the checkpoint and face detector now rather than on the first request
+    pool = get_wav2lip_pool()
+    pool.start()
+    # Detect each avatar's face once; requests then reuse the cached boxes and crops
+    for path in avatar_files():
+        pool.register_avatar(path).add_done_callback(
+            lambda f, path=path: print(f"Registered avatar {path}: {f.exception() or f.result()}"))
 
-        # Lip Sync
-        output_video = os.path.join(RESULTS_DIR, f"{session_id}.mp4")
-        run_wav2lip(wav_path, avatar_path, output_video)
+@app.on_event("startup")
+def start_prewarm():
+    if os.path.exists(LIPSYNC_PREWARM_FILE):
+        with open(LIPSYNC_PREWARM_FILE) as f:
+            phrases = [PrewarmPhrase(**entry) for entry in json.load(f)]
+        print(f"Queued {queue_prewarm(phrases)} lip-sync pre-warm render(s) from {LIPSYNC_PREWARM_FILE}")
+    threading.Thread(target=prewarm_loop, name="lipsync-prewarm", daemon=True).start()
 
-        return FileResponse(
-            path=output_video,
-            filename=f"lipsync_{session_id}.mp4",
-            media_type="video/mp4"
-        )
+@app.post("/api/lipsync-jobs", status_code=202)
+def create_lipsync_job(text: str = Form(...), backend: str = Form(TTS_BACKEND), stream: bool = Form(False)):
+    return job_links(submit_lipsync(text, backend, stream))
 
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"FFmpeg/Wav2Lip failed: {e.stderr}")
-    except Exception as e:
-        print("Unexpected error:", traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+@app.get("/api/lipsync-jobs/{job_id}")
+def get_lipsync_job(job_id: str):
+    job = lipsync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lip-sync job not found")
+    return job_links(job)
+
+@app.get("/api/lipsync-jobs/{job_id}/events")
+async def lipsync_job_events(job_id: str):
+    job = lipsync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lip-sync job not found")
+
+    async def events():
+        current = job
+        # Server-sent events: one message per stage/progress change until the job ends
+        while True:
+            yield f"data: {json.dumps(job_links(current))}\n\n"
+            if current["status"] in ("done", "failed"):
+                return
+            current = await run_in_threadpool(lipsync_jobs.wait_for_change, job_id, current["version"])
+            if current is None:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/lipsync-jobs/{job_id}/result")
+def get_lipsync_result(job_id: str, request: Request):
+    job = lipsync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lip-sync job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Lip-sync failed: {job['error']}")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Lip-sync job is {job['status']}")
+    video_path = os.path.join(RESULTS_DIR, job["result"]["filename"])
+    if not os.path.exists(video_path):
+        raise HTTPException(status_code=410, detail="Lip-sync video has expired")
+    return media_response(request, video_path, media_type="video/mp4", filename=f"lipsync_{job_id}.mp4")
+
+@app.get("/api/lipsync-hls/{session_id}/{name}")
+def get_lipsync_hls(session_id: str, name: str, request: Request):
+    if not HLS_FILE_NAME.match(name) or not re.match(r"^[0-9a-f-]{36}$", session_id):
+        raise HTTPException(status_code=404, detail="Not found")
+    path = os.path.join(HLS_DIR, session_id, name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    if name.endswith(".m3u8"):
+        # The playlist grows while the job renders; players must re-fetch it
+        return FileResponse(path, media_type=PLAYLIST_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+    return media_response(request, path, media_type=SEGMENT_MEDIA_TYPE, immutable=True)
+
+@app.get("/api/lipsync-job-stats")
+def lipsync_job_stats():
+    return {**lipsync_jobs.stats(), "prewarm_pending": len(prewarm_pending), "cache": lipsync_cache.stats()}
+
+class PrewarmPhrase(BaseModel):
+    text: str
+    avatars: Optional[List[str]] = None  # avatar file names; all avatars when omitted
+
+prewarm_pending: List[tuple] = []
+prewarm_lock = threading.Lock()
+
+def queue_prewarm(phrases: List[PrewarmPhrase]) -> int:
+    known = {os.path.basename(p): p for p in avatar_files()}
+    items = []
+    for phrase in phrases:
+        for name in phrase.avatars or sorted(known):
+            if name not in known:
+                raise HTTPException(status_code=400, detail=f"Unknown avatar: {name}")
+            items.append((phrase.text[:500], known[name]))
+    with prewarm_lock:
+        prewarm_pending.extend(items)
+    return len(items)
+
+def prewarm_loop():
+    # Render queued phrases one at a time, only while no client job is waiting or running
+    while True:
+        time.sleep(LIPSYNC_PREWARM_IDLE_SECONDS)
+        stats = lipsync_jobs.stats()
+        if stats["running"] or stats["queued"]:
+            continue
+        with prewarm_lock:
+            if not prewarm_pending:
+                continue
+            text, avatar_path = prewarm_pending.pop(0)
+        session_id = str(uuid.uuid4())
+        job = lipsync_jobs.submit(
+            lambda progress: lipsync_pipeline(text, TTS_BACKEND, session_id, progress, avatar_path=avatar_path),
+            prewarm=True)
+        while job is not None and job["status"] not in ("done", "failed"):
+            job = lipsync_jobs.wait_for_change(job["job_id"], job["version"])
+        if job is not None and job["status"] == "done":
+            # Only the cache entry is wanted; the per-session copy would just wait for retention
+            session_video = os.path.join(RESULTS_DIR, job["result"]["filename"])
+            if os.path.exists(session_video):
+                os.remove(session_video)
+
+@app.post("/api/lipsync-prewarm", status_code=202)
+def lipsync_prewarm(phrases: List[PrewarmPhrase]):
+    return {"queued": queue_prewarm(phrases)}
+
+@app.post("/api/generate-and-sync")
+async def generate_and_sync(text: str = Form(...), backend: str = Form(TTS_BACKEND)):
+    # Blocking variant kept for existing clients: queues like any other job and waits for it
+    job = submit_lipsync(text, backend)
+    job_id = job["job_id"]
+    while job["status"] not in ("done", "failed"):
+        job = await run_in_threadpool(lipsync_jobs.wait_for_change, job_id, job["version"])
+        if job is None:
+            # Trimmed from the queue's history before this request saw it finish
+            raise HTTPException(status_code=410, detail=f"Lip-sync job {job_id} is no longer tracked")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {job['error']}")
+
+    return FileResponse(
+        path=os.path.join(RESULTS_DIR, job["result"]["filename"]),
+        filename=f"lipsync_{job['job_id']}.mp4",
+        media_type="video/mp4"
+    )
+
+@app.get("/api/tts-cache-stats")
+def tts_cache_stats():
+    return tts_cache.stats()
+
+@app.get("/api/storage-usage")
+def storage_usage():
+    return media_retention.usage()
+
+@app.get("/api/wav2lip-stats")
+def wav2lip_stats():
+    return get_wav2lip_pool().stats()
 
 @app.get("/")
 def root():
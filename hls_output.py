@@ -0,0 +1,155 @@
+import os
+import math
+import subprocess
+from typing import List, Tuple
+
+import numpy as np
+
+from audio_io import AUDIO_SAMPLE_RATE
+
+PLAYLIST_NAME = "index.m3u8"
+PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+SEGMENT_MEDIA_TYPE = "video/mp2t"
+
+
+def segment_name(index: int) -> str:
+    return f"seg_{index:03d}.ts"
+
+
+# The native ffmpeg AAC encoder delays its output by one frame (encoder priming)
+AAC_FRAME_SAMPLES = 1024
+AAC_PRIMING_SAMPLES = 1024
+
+
+def target_duration_for(segment_seconds: float) -> int:
+    """EXT-X-TARGETDURATION for segments planned at ``segment_seconds``.
+
+    split_at_silence moves each cut by up to a quarter segment, so a segment can
+    be half again as long as planned; the second of slack covers the audio tail
+    of the last segment. Fixed up front because it may not change during an event.
+    """
+    return math.ceil(segment_seconds * 1.5) + 1
+
+
+def adts_frames(data: bytes) -> List[bytes]:
+    """Split an ADTS AAC stream into its frames (1024 samples each)."""
+    frames, offset = [], 0
+    while offset + 7 <= len(data):
+        if data[offset] != 0xFF or data[offset + 1] & 0xF0 != 0xF0:
+            raise ValueError(f"Bad ADTS sync word at byte {offset}")
+        length = ((data[offset + 3] & 0x03) << 11) | (data[offset + 4] << 3) | (data[offset + 5] >> 5)
+        if length < 7:
+            raise ValueError(f"Bad ADTS frame length at byte {offset}")
+        frames.append(data[offset:offset + length])
+        offset += length
+    return frames
+
+
+def write_playlist(directory: str, durations: List[float], target_duration: int, ended: bool):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT",
+             f"#EXT-X-TARGETDURATION:{target_duration}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for index, duration in enumerate(durations):
+        lines += [f"#EXTINF:{duration:.3f},", segment_name(index)]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, PLAYLIST_NAME)
+    with open(path + ".part", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(path + ".part", path)
+
+
+def publish_pending(directory: str, target_duration: int):
+    """Write an empty event playlist, so players opened at submit time wait instead of failing."""
+    write_playlist(directory, [], target_duration, ended=False)
+
+
+def end_playlist(directory: str):
+    """Close a playlist whose render stopped early (e.g. the job failed)."""
+    path = os.path.join(directory, PLAYLIST_NAME)
+    try:
+        with open(path) as f:
+            text = f.read()
+    except FileNotFoundError:
+        return
+    if "#EXT-X-ENDLIST" not in text:
+        with open(path + ".part", "w") as f:
+            f.write(text + "#EXT-X-ENDLIST\n")
+        os.replace(path + ".part", path)
+
+
+class HLSPublisher:
+    """Publishes rendered lip-sync segments as an HLS event playlist while the rest still render.
+
+    Segments must be published in order. The audio is AAC-encoded once, up
+    front, and each segment carries a contiguous run of those AAC frames, placed
+    at their true time, so there is no encoder priming gap at the seams. The
+    playlist is closed with ENDLIST by ``finish``.
+    """
+
+    def __init__(self, directory: str, ranges: List[Tuple[int, int]], fps: float, samples: np.ndarray,
+                 sample_rate: int = AUDIO_SAMPLE_RATE, target_duration: int = 0):
+        self.directory = directory
+        self.ranges = ranges
+        self.fps = fps
+        self.sample_rate = sample_rate
+        self.published: List[float] = []  # durations of the segments in the playlist
+        self.frames = adts_frames(self._encode_audio(samples))
+        # AAC frame where each segment's audio starts (the priming frame is dropped), and the end
+        samples_per_frame = sample_rate / fps
+        self.audio_starts = [min(len(self.frames), (round(start * samples_per_frame) + AAC_PRIMING_SAMPLES
+                                                    + AAC_FRAME_SAMPLES // 2) // AAC_FRAME_SAMPLES)
+                             for start, _ in ranges] + [len(self.frames)]
+        # Segment boundaries in seconds: video cuts, and the end of whichever stream ends last
+        audio_end = (len(self.frames) * AAC_FRAME_SAMPLES - AAC_PRIMING_SAMPLES) / sample_rate
+        self.boundaries = [start / fps for start, _ in ranges] + [max(ranges[-1][1] / fps, audio_end)]
+        durations = [b - a for a, b in zip(self.boundaries, self.boundaries[1:])]
+        # The target duration may not change during an event playlist, so it is fixed from the plan
+        self.target_duration = max(target_duration, math.ceil(max(durations)))
+        self._write_playlist(ended=False)
+
+    def _encode_audio(self, samples: np.ndarray) -> bytes:
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        return subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-f", "s16le", "-ar", str(self.sample_rate), "-ac", "1", "-i", "pipe:0",
+             "-c:a", "aac", "-b:a", "96k", "-f", "adts", "pipe:1"],
+            input=pcm, check=True, capture_output=True).stdout
+
+    def segment_audio(self, index: int) -> Tuple[bytes, float]:
+        """The AAC frames of segment ``index`` and their start time relative to the segment's video."""
+        first, last = self.audio_starts[index], self.audio_starts[index + 1]
+        start = (first * AAC_FRAME_SAMPLES - AAC_PRIMING_SAMPLES) / self.sample_rate
+        return b"".join(self.frames[first:last]), start - self.boundaries[index]
+
+    def publish(self, index: int, clip_path: str):
+        if index != len(self.published):
+            raise ValueError(f"HLS segment {index} published out of order")
+        audio, audio_offset = self.segment_audio(index)
+        path = os.path.join(self.directory, segment_name(index))
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", clip_path,
+             "-itsoffset", f"{audio_offset:.6f}", "-f", "aac", "-i", "pipe:0",
+             "-map", "0:v", "-map", "1:a", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+             "-c:a", "copy", "-output_ts_offset", f"{self.boundaries[index]:.6f}",
+             "-f", "mpegts", path + ".part"],
+            input=audio, check=True, capture_output=True)
+        os.replace(path + ".part", path)
+        self.published.append(self.boundaries[index + 1] - self.boundaries[index])
+        self._write_playlist(ended=False)
+
+    def finish(self):
+        self._write_playlist(ended=True)
+
+    def _write_playlist(self, ended: bool):
+        write_playlist(self.directory, self.published, self.target_duration, ended)
+
+
+def publish_complete(directory: str, video_path: str, duration: float):
+    """Expose an already finished MP4 (e.g. a cache hit) as a closed one-segment playlist."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, segment_name(0))
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-c", "copy",
+                    "-bsf:v", "h264_mp4toannexb", "-f", "mpegts", path + ".part"], check=True, capture_output=True)
+    os.replace(path + ".part", path)
+    # Still an event playlist: a player may have loaded the pending one written at submit time
+    write_playlist(directory, [duration], max(1, math.ceil(duration)), ended=True)
@@ -0,0 +1,83 @@
+import os
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from tts_cache import TTSCache
+from wav2lip_worker import WAV2LIP_CHECKPOINT, WAV2LIP_FACE_CACHE_ENTRIES, WAV2LIP_FPS, WAV2LIP_PADS, IMG_SIZE
+
+LIPSYNC_CACHE_DIR = os.getenv("LIPSYNC_CACHE_DIR", os.path.join("results", "lipsync_cache"))
+LIPSYNC_CACHE_MAX_BYTES = int(os.getenv("LIPSYNC_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# path -> (size, mtime_ns, sha256), least recently used first; uploads all have unique paths
+_file_hashes: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+_file_hashes_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """sha256 of a file's bytes, remembered per (path, size, mtime) so large checkpoints hash once."""
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    with _file_hashes_lock:
+        memo = _file_hashes.get(path)
+        if memo is not None and memo[:2] == (stat.st_size, stat.st_mtime_ns):
+            _file_hashes.move_to_end(path)
+            return memo[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    with _file_hashes_lock:
+        _file_hashes[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        _file_hashes.move_to_end(path)
+        while len(_file_hashes) > WAV2LIP_FACE_CACHE_ENTRIES:
+            _file_hashes.popitem(last=False)
+    return digest.hexdigest()
+
+
+def link_or_copy(source: str, destination: str):
+    """Expose a cached file under another name without duplicating it when the filesystem allows."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class LipSyncCache(TTSCache):
+    """Content-addressed store of rendered lip-sync videos.
+
+    Wav2Lip output depends only on the audio, the face image, the checkpoint and
+    the render settings, so the key hashes exactly those. Eviction and
+    single-flight creation are the TTS cache's.
+    """
+
+    partial_suffix = ".mp4"
+
+    def __init__(self, directory: str = LIPSYNC_CACHE_DIR, max_bytes: int = LIPSYNC_CACHE_MAX_BYTES):
+        super().__init__(directory, max_bytes=max_bytes, extension=".mp4")
+
+    def video_key(self, samples: np.ndarray, face_path: str, checkpoint: str = WAV2LIP_CHECKPOINT) -> str:
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(samples, dtype=np.float32).tobytes())
+        digest.update(file_sha256(face_path).encode())
+        digest.update(file_sha256(checkpoint).encode() if os.path.exists(checkpoint) else checkpoint.encode())
+        digest.update(f"{WAV2LIP_PADS}:{WAV2LIP_FPS}:{IMG_SIZE}".encode())
+        return digest.hexdigest()
+
+    def render(self, pool, face_path: str, samples: np.ndarray, outfile: str,
+               progress: Optional[Callable[[str, float], None]] = None, hls_dir: Optional[str] = None) -> Dict:
+        """Write the video for (samples, face) to ``outfile``, rendering it only on a cache miss."""
+        key = self.video_key(samples, face_path)
+        timings: Dict = {"cached": 1.0}
+
+        def create(partial: str):
+            timings.update(pool.render(face_path, samples, partial, progress, hls_dir=hls_dir), cached=0.0)
+
+        link_or_copy(self.get_or_create_key(key, create), outfile)
+        return timings
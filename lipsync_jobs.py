@@ -0,0 +1,150 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from wav2lip_worker import WAV2LIP_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Renders running at once. Each Wav2Lip worker already gets cpu_count / WAV2LIP_WORKERS torch
+# threads, so more concurrent jobs than workers would only oversubscribe the cores.
+LIPSYNC_MAX_CONCURRENT = int(os.getenv("LIPSYNC_MAX_CONCURRENT", str(WAV2LIP_WORKERS)))
+LIPSYNC_MAX_QUEUE = int(os.getenv("LIPSYNC_MAX_QUEUE", "50"))
+LIPSYNC_JOB_HISTORY = int(os.getenv("LIPSYNC_JOB_HISTORY", "500"))
+# Used for ETAs until real jobs have been timed
+LIPSYNC_DEFAULT_SECONDS = float(os.getenv("LIPSYNC_DEFAULT_SECONDS", "60"))
+
+ProgressCallback = Callable[[str, float], None]
+
+
+class LipSyncQueueFull(RuntimeError):
+    pass
+
+
+class LipSyncJobQueue:
+    """FIFO of lip-sync jobs run at most ``max_concurrent`` at a time.
+
+    A job is a callable taking a ``progress(stage, fraction)`` callback and
+    returning a result dict. Job records carry the current stage, overall
+    progress, queue position and an ETA derived from recent job durations.
+    """
+
+    def __init__(self, max_concurrent: int = LIPSYNC_MAX_CONCURRENT, max_queue: int = LIPSYNC_MAX_QUEUE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="lipsync-job")
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._queued: List[str] = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._avg_seconds: Optional[float] = None
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, work: Callable[[ProgressCallback], Dict], **info) -> Dict:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if len(self._queued) >= self.max_queue:
+                raise LipSyncQueueFull(f"Lip-sync queue is full ({self.max_queue} jobs waiting)")
+            self._jobs[job_id] = {"job_id": job_id, "status": "queued", "stage": "queued", "progress": 0.0,
+                                  "created": time.time(), "started": None, "finished": None,
+                                  "error": None, "result": None, "version": 0, **info}
+            self._queued.append(job_id)
+            self._trim()
+        self._executor.submit(self._run, job_id, work)
+        return self.get(job_id)
+
+    def _trim(self):
+        while len(self._jobs) > LIPSYNC_JOB_HISTORY:
+            oldest = next(iter(self._jobs))
+            if self._jobs[oldest]["status"] in ("queued", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+    def _update(self, job_id: str, **fields):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job["version"] += 1
+            self._changed.notify_all()
+
+    def _run(self, job_id: str, work: Callable[[ProgressCallback], Dict]):
+        started = time.time()
+        # One critical section: a view taken in between would see a "queued" job missing from _queued
+        with self._changed:
+            self._queued.remove(job_id)
+            job = self._jobs[job_id]
+            job.update(status="running", stage="starting", started=started)
+            job["version"] += 1
+            self._changed.notify_all()
+
+        def progress(stage: str, fraction: float):
+            self._update(job_id, stage=stage, progress=round(min(max(fraction, 0.0), 1.0), 3))
+
+        try:
+            result = work(progress)
+        except Exception as e:
+            logger.error(f"Lip-sync job {job_id[:12]} failed: {e}")
+            with self._lock:
+                self.failed += 1
+            self._update(job_id, status="failed", stage="failed", error=str(e), finished=time.time())
+            return
+        elapsed = time.time() - started
+        with self._lock:
+            self.completed += 1
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+        self._update(job_id, status="done", stage="done", progress=1.0, result=result, finished=time.time())
+
+    def _eta(self, job: Dict) -> Optional[float]:
+        avg = self._avg_seconds or LIPSYNC_DEFAULT_SECONDS
+        if job["status"] == "running":
+            return round(max(0.0, avg - (time.time() - job["started"])), 1)
+        if job["status"] != "queued":
+            return None
+        position = self._queued.index(job["job_id"])
+        running = [j for j in self._jobs.values() if j["status"] == "running"]
+        # Slots free up as running jobs finish; this job starts after `position` more jobs start
+        slot_free = sorted(max(0.0, avg - (time.time() - j["started"])) for j in running)
+        slot_free += [0.0] * (self.max_concurrent - len(slot_free))
+        waits = sorted(slot_free)
+        for _ in range(position):
+            waits[0] += avg
+            waits.sort()
+        return round(waits[0] + avg, 1)
+
+    def _view(self, job: Dict) -> Dict:
+        view = dict(job)
+        view["queue_position"] = self._queued.index(job["job_id"]) + 1 if job["status"] == "queued" else 0
+        view["eta_seconds"] = self._eta(job)
+        return view
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job else None
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float = 15.0) -> Optional[Dict]:
+        """Block until the job's version moves past ``version`` (or timeout) and return it."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._jobs.get(job_id, {}).get("version", version + 1) != version,
+                                   timeout=timeout)
+            job = self._jobs.get(job_id)
+            return self._view(job) if job else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j["status"] == "running")
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": running,
+                "queued": len(self._queued),
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_job_seconds": round(self._avg_seconds, 1) if self._avg_seconds else None,
+            }
@@ -2,47 +2,71 @@ import subprocess
 import uuid
 import os
 from pathlib import Path
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from typing import Optional
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException
 from fastapi.responses import FileResponse
+from audio_io import decode_audio
+from audio_catalog import AudioCatalog
+from wav2lip_worker import Wav2LipError, get_wav2lip_pool
+from lipsync_cache import LipSyncCache
+from starlette.concurrency import run_in_threadpool
 import shutil
 import tempfile
 
 app = FastAPI(title="LipSync API")
 
-def get_latest_mp3(folder="tts/tts_outputs"):
-    folder = Path(folder)
-    if not folder.exists():
-        raise FileNotFoundError(f"Folder {folder} does not exist")
-    mp3_files = list(folder.glob("*.mp3"))
-    if not mp3_files:
-        raise FileNotFoundError(f"No MP3 files found in {folder}")
-    return str(max(mp3_files, key=lambda x: x.stat().st_ctime))
+# Same audio + same image renders once; later requests get the cached MP4
+lipsync_cache = LipSyncCache()
 
-def convert_mp3_to_wav(mp3_path, wav_path):
+TTS_OUTPUT_DIR = "tts/tts_outputs"
+# Written by tts.py and avatar_engine.py as they generate speech, so lookups never scan the folder
+audio_catalog = AudioCatalog(TTS_OUTPUT_DIR)
+
+def resolve_audio(audio_id: Optional[str] = None) -> str:
+    if audio_id:
+        entry = audio_catalog.resolve(audio_id)
+        if entry is None:
+            raise FileNotFoundError(f"Unknown audio_id: {audio_id}")
+    else:
+        # Without an ID the most recently generated MP3 (cache hits included) is used; under
+        # concurrent requests that may be someone else's
+        entry = audio_catalog.latest(extension="mp3")
+        if entry is None:
+            # Files copied in by hand are only indexed by a sync
+            audio_catalog.sync()
+            entry = audio_catalog.latest(extension="mp3")
+        if entry is None:
+            raise FileNotFoundError(f"No MP3 files found in {TTS_OUTPUT_DIR}")
+    return os.path.join(TTS_OUTPUT_DIR, entry["filename"])
+
+def load_audio(mp3_path):
+    # Decoded through a pipe to 16 kHz PCM and handed to Wav2Lip in memory
     try:
-        subprocess.run(["ffmpeg", "-y", "-i", mp3_path, wav_path], check=True)
+        samples, _ = decode_audio(mp3_path)
     except subprocess.CalledProcessError as e:
         raise HTTPException(status_code=500, detail=f"FFmpeg conversion failed: {str(e)}")
+    return samples
 
-def run_wav2lip(image_path, audio_path, output_path):
-    wav2lip_dir = Path(__file__).parent / "Wav2Lip"
-    
-    if not wav2lip_dir.exists():
-        raise HTTPException(status_code=500, detail=f"Wav2Lip directory not found at {wav2lip_dir}")
-
+async def run_wav2lip(image_path, samples, output_path):
     try:
-        subprocess.run([
-            "python", "inference.py",
-            "--checkpoint_path", "checkpoints/wav2lip_gan.pth",
-            "--face", str(Path(image_path).resolve()),
-            "--audio", str(Path(audio_path).resolve()),
-            "--outfile", str(Path(output_path).resolve())
-        ], check=True, cwd=str(wav2lip_dir))
-    except subprocess.CalledProcessError as e:
+        # Long audio is split at pauses and rendered on several workers (WAV2LIP_SEGMENTED)
+        return await run_in_threadpool(lipsync_cache.render, get_wav2lip_pool(), str(image_path), samples,
+                                       str(output_path))
+    except (Wav2LipError, subprocess.CalledProcessError) as e:
+        # CalledProcessError: the concat / mux step of a segmented render
         raise HTTPException(status_code=500, detail=f"Wav2Lip processing failed: {str(e)}")
 
+@app.on_event("startup")
+def start_wav2lip_workers():
+    get_wav2lip_pool().start()
+
+@app.on_event("startup")
+async def sync_audio_catalog():
+    # Pick up audio written while this service was down
+    await run_in_threadpool(audio_catalog.sync)
+
 @app.post("/lipsync/", response_class=FileResponse)
-async def create_lipsync_video(image: UploadFile = File(...)):
+async def create_lipsync_video(image: UploadFile = File(...), audio_id: Optional[str] = Form(None)):
     try:
         # Create temporary directory for processing
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -54,20 +78,19 @@ async def create_lipsync_video(image: UploadFile = File(...)):
             with image_path.open("wb") as buffer:
                 shutil.copyfileobj(image.file, buffer)
 
-            # Get latest MP3
-            mp3_file = get_latest_mp3()
+            # audio_id is the filename returned by the TTS service's /api/generate
+            mp3_file = await run_in_threadpool(resolve_audio, audio_id)
 
             # Generate file paths
-            wav_file = temp_path / f"temp_audio_{session_id}.wav"
             output_dir = Path("results")
             output_dir.mkdir(exist_ok=True)
             output_video = output_dir / f"{session_id}.mp4"
 
-            # Convert MP3 to WAV
-            convert_mp3_to_wav(mp3_file, str(wav_file))
+            # Decode MP3 to PCM (an ffmpeg subprocess; off the event loop)
+            samples = await run_in_threadpool(load_audio, mp3_file)
 
             # Run lip-sync
-            run_wav2lip(str(image_path), str(wav_file), str(output_video))
+            await run_wav2lip(image_path, samples, output_video)
 
             # Return the output video
             return FileResponse(
@@ -0,0 +1,127 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+# Files named after a hash of their content (TTS cache, lip-sync cache) never change in place
+CONTENT_HASH_NAME = re.compile(r"^[0-9a-f]{32,64}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(path: str, stat: os.stat_result) -> str:
+    name = os.path.basename(path)
+    if CONTENT_HASH_NAME.match(name):
+        return f'"{os.path.splitext(name)[0]}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110 13.2.2)
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive (start, end) for a single byte range, or None if unsatisfiable.
+
+    Multi-range requests are not supported and raise ValueError so the caller
+    falls back to sending the whole file.
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        raise ValueError(header)
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(header)
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+class _WholeFileResponse(FileResponse):
+    """FileResponse that ignores Range: media_response has already served or declined it.
+
+    Starlette's FileResponse parses Range itself and answers a malformed header
+    with 400 and several ranges with multipart/byteranges; here both get the
+    whole file, as RFC 9110 allows for a Range the server does not support.
+    """
+
+    async def __call__(self, scope, receive, send):
+        headers = [(name, value) for name, value in scope["headers"] if name != b"range"]
+        await super().__call__({**scope, "headers": headers}, receive, send)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def media_response(request: Request, path: str, media_type: str, filename: Optional[str] = None,
+                   immutable: Optional[bool] = None) -> Response:
+    """Serve a media file with byte-range (206), ETag/Last-Modified and 304 support."""
+    stat = os.stat(path)
+    etag = _etag(path, stat)
+    if immutable is None:
+        immutable = bool(CONTENT_HASH_NAME.match(os.path.basename(path)))
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            byte_range = ()  # malformed or multi-range: send the whole file
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                "Content-Length": str(length),
+            })
+            if filename:
+                headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return StreamingResponse(_iter_file(path, start, length), status_code=206,
+                                     media_type=media_type, headers=headers)
+
+    return _WholeFileResponse(path=path, media_type=media_type, filename=filename, headers=headers, stat_result=stat)
@@ -0,0 +1,194 @@
+import os
+import time
+import shutil
+import fnmatch
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "600"))  # seconds between sweeps
+# Anything touched this recently is still being written or served and is never removed
+RETENTION_MIN_AGE = int(os.getenv("RETENTION_MIN_AGE", "120"))
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits for one directory: files older than ``ttl`` seconds go first, then the
+    least recently accessed ones until the directory fits in ``max_bytes``.
+    A value of 0 disables that limit. With ``directories`` each subdirectory
+    (e.g. one HLS stream) is treated as a single entry and removed as a whole."""
+
+    name: str
+    directory: str
+    ttl: float = 0
+    max_bytes: int = 0
+    patterns: List[str] = field(default_factory=lambda: ["*"])
+    directories: bool = False
+
+
+def policy_from_env(name: str, directory: str, ttl_hours: float = 0, max_mb: int = 0,
+                    patterns: Optional[List[str]] = None, directories: bool = False) -> RetentionPolicy:
+    """Build a policy whose limits can be overridden by RETENTION_<NAME>_TTL_HOURS / _MAX_MB."""
+    prefix = f"RETENTION_{name.upper()}"
+    ttl_hours = float(os.getenv(f"{prefix}_TTL_HOURS", ttl_hours))
+    max_mb = int(os.getenv(f"{prefix}_MAX_MB", max_mb))
+    return RetentionPolicy(name=name, directory=directory, ttl=ttl_hours * 3600,
+                           max_bytes=max_mb * 1024 * 1024, patterns=patterns or ["*"], directories=directories)
+
+
+class MediaRetention:
+    """Background sweeper that keeps generated media directories within their policies.
+
+    Files can be protected with ``pin(path)`` / ``unpin(path)`` or with pin checks
+    (callables taking a path) registered by caches that know which entries are in use.
+    """
+
+    def __init__(self, policies: Optional[List[RetentionPolicy]] = None,
+                 interval: float = RETENTION_INTERVAL, min_age: float = RETENTION_MIN_AGE):
+        self.policies: Dict[str, RetentionPolicy] = {}
+        self.interval = interval
+        self.min_age = min_age
+        self._pins: Dict[str, int] = {}
+        self._pin_checks: List[Callable[[str], bool]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_sweep: Dict[str, Dict] = {}
+        for policy in policies or []:
+            self.add_policy(policy)
+
+    def add_policy(self, policy: RetentionPolicy):
+        os.makedirs(policy.directory, exist_ok=True)
+        self.policies[policy.name] = policy
+
+    def add_pin_check(self, check: Callable[[str], bool]):
+        self._pin_checks.append(check)
+
+    def pin(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def is_pinned(self, path: str) -> bool:
+        with self._lock:
+            if os.path.abspath(path) in self._pins:
+                return True
+        for check in self._pin_checks:
+            try:
+                if check(path):
+                    return True
+            except Exception as e:
+                logger.warning(f"Retention pin check failed for {path}: {e}")
+                return True
+        return False
+
+    @staticmethod
+    def _scan(policy: RetentionPolicy) -> List[Tuple[float, str, int]]:
+        """Return (last access, path, size) for the policy's files, least recently used first."""
+        files = []
+        try:
+            entries = list(os.scandir(policy.directory))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            wanted = entry.is_dir() if policy.directories else entry.is_file()
+            if not wanted or not any(fnmatch.fnmatch(entry.name, p) for p in policy.patterns):
+                continue
+            try:
+                if policy.directories:
+                    stats = [os.stat(os.path.join(root, name)) for root, _, names in os.walk(entry.path)
+                             for name in names] or [entry.stat()]
+                    files.append((max(max(s.st_atime, s.st_mtime) for s in stats), entry.path,
+                                  sum(s.st_size for s in stats)))
+                else:
+                    stat = entry.stat()
+                    files.append((max(stat.st_atime, stat.st_mtime), entry.path, stat.st_size))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        return files
+
+    def sweep_policy(self, policy: RetentionPolicy) -> Dict:
+        now = time.time()
+        files = self._scan(policy)
+        total = sum(size for _, _, size in files)
+        removed, freed = 0, 0
+        for last_access, path, size in files:
+            age = now - last_access
+            expired = policy.ttl and age > policy.ttl
+            over_quota = policy.max_bytes and total > policy.max_bytes
+            if not expired and not over_quota:
+                # Sorted oldest first: nothing later is expired, and we are under quota
+                break
+            if age < self.min_age or self.is_pinned(path):
+                continue
+            try:
+                if policy.directories:
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Retention could not remove {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        result = {"removed": removed, "freed_bytes": freed, "finished": now}
+        if removed:
+            logger.info(f"Retention [{policy.name}]: removed {removed} file(s), freed {freed / 1e6:.1f} MB")
+        with self._lock:
+            self._last_sweep[policy.name] = result
+        return result
+
+    def sweep(self) -> Dict[str, Dict]:
+        return {name: self.sweep_policy(policy) for name, policy in list(self.policies.items())}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="media-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def usage(self) -> Dict:
+        now = time.time()
+        report = {}
+        for name, policy in list(self.policies.items()):
+            files = self._scan(policy)
+            used = sum(size for _, _, size in files)
+            report[name] = {
+                "directory": os.path.abspath(policy.directory),
+                "files": len(files),
+                "bytes": used,
+                "max_bytes": policy.max_bytes,
+                "ttl_seconds": policy.ttl,
+                "oldest_age_seconds": round(now - files[0][0], 1) if files else 0,
+                "last_sweep": self._last_sweep.get(name),
+            }
+            if policy.max_bytes:
+                report[name]["quota_used"] = round(used / policy.max_bytes, 3)
+        with self._lock:
+            pinned = len(self._pins)
+        return {"interval_seconds": self.interval, "pinned": pinned, "directories": report}
@@ -0,0 +1,116 @@
+"""Measure the cold-start import time of each service against a budget.
+
+Every service module is imported in a fresh interpreter started with
+``python -X importtime``, from the directory it is normally run in. The
+report lists the wall time of the import, the module's slowest direct imports and
+whether the service stays within its budget.
+
+    python startup_report.py
+    python startup_report.py avatar_engine tts --top 20
+    STARTUP_BUDGET_API=4 python startup_report.py api --json
+
+Budgets (seconds) can be overridden with STARTUP_BUDGET_<SERVICE>. The exit
+status is 1 when any service is over budget or fails to import, so the
+report can gate CI or a deploy.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# service -> (directory it runs from, module imported by uvicorn / python, default budget in seconds)
+SERVICES = {
+    "api": ("api_data", "api", 3.0),
+    "llmselect": ("api_data", "llmselect", 3.0),
+    "avatar_engine": (".", "avatar_engine", 2.0),
+    "lipsync": (".", "ls", 2.0),
+    "tts": ("tts", "tts", 2.0),
+    "agent_anomaly": ("agents", "agent_anomaly", 2.0),
+}
+
+# "import time: self [us] | cumulative | imported package", nested imports indented further
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def service_budget(name: str) -> float:
+    return float(os.getenv(f"STARTUP_BUDGET_{name.upper()}", SERVICES[name][2]))
+
+
+def parse_importtime(stderr: str, module: str) -> List[Tuple[str, float]]:
+    """Return (package, cumulative seconds) for each import made directly by ``module``."""
+    # A package's own imports are printed, one level deeper, right before the package itself
+    direct, pending = [], []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3))
+        if depth == 3:
+            pending.append((match.group(4), int(match.group(2)) / 1e6))
+        elif depth == 1:
+            if match.group(4) == module:
+                direct = pending
+            pending = []
+    return direct
+
+
+def measure(name: str) -> Dict:
+    directory, module, _ = SERVICES[name]
+    cwd = os.path.join(ROOT, directory)
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=cwd, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    imports = parse_importtime(process.stderr, module)
+    budget = service_budget(name)
+    report = {
+        "service": name,
+        "module": os.path.join(directory, module + ".py"),
+        "seconds": round(wall, 3),
+        "budget_seconds": budget,
+        "ok": process.returncode == 0 and wall <= budget,
+        "error": None,
+        "slowest": sorted(imports, key=lambda item: -item[1]),
+    }
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        report["error"] = errors[-1] if errors else f"exit status {process.returncode}"
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("services", nargs="*", help=f"any of {', '.join(SERVICES)} (default: all)")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list per service")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    unknown = [name for name in args.services if name not in SERVICES]
+    if unknown:
+        parser.error(f"unknown service(s): {', '.join(unknown)}")
+
+    reports = [measure(name) for name in args.services or SERVICES]
+    for report in reports:
+        report["slowest"] = [{"package": package, "seconds": round(seconds, 3)}
+                             for package, seconds in report["slowest"][:args.top]]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            status = "ok" if report["ok"] else ("FAILED" if report["error"] else "OVER BUDGET")
+            print(f"{report['service']:<16}{report['seconds']:>7.2f}s / {report['budget_seconds']:.1f}s  {status}")
+            if report["error"]:
+                print(f"    {report['error']}")
+            for entry in report["slowest"]:
+                print(f"    {entry['seconds']:>7.3f}s  {entry['package']}")
+    sys.exit(0 if all(report["ok"] for report in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The services run from the repo root and from api_data/ with their own directory on sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "api_data")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
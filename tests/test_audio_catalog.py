@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+
+from audio_catalog import AudioCatalog, mp3_duration, strip_mp3_headers
+
+FRAME_BYTES = 417  # MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding
+HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+
+
+def frame(payload: bytes = b"") -> bytes:
+    return (HEADER + payload).ljust(FRAME_BYTES, b"\x00")
+
+
+def xing_frame(frames: int) -> bytes:
+    # Stereo MPEG-1: 32 bytes of side info, then the tag, flags (frame count present) and count
+    return frame(bytes(32) + b"Xing" + (1).to_bytes(4, "big") + frames.to_bytes(4, "big"))
+
+
+def id3v2(size: int) -> bytes:
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+def write(path, data: bytes) -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_mp3_duration_cbr_from_size_and_bitrate(tmp_path):
+    path = write(tmp_path / "cbr.mp3", frame() * 100)
+    assert mp3_duration(path) == pytest.approx(100 * FRAME_BYTES * 8 / 128000)
+
+
+def test_mp3_duration_skips_id3v2_tag(tmp_path):
+    path = write(tmp_path / "tagged.mp3", id3v2(300) + frame() * 100)
+    assert mp3_duration(path) == pytest.approx(100 * FRAME_BYTES * 8 / 128000)
+
+
+def test_mp3_duration_uses_xing_frame_count(tmp_path):
+    # The file holds only 10 frames; the Xing count wins over the size estimate
+    path = write(tmp_path / "vbr.mp3", id3v2(20) + xing_frame(2000) + frame() * 10)
+    assert mp3_duration(path) == pytest.approx(2000 * 1152 / 44100)
+
+
+def test_mp3_duration_of_non_mp3_is_none(tmp_path):
+    assert mp3_duration(write(tmp_path / "junk.mp3", b"not audio" * 50)) is None
+
+
+def test_strip_mp3_headers_leaves_only_audio_frames():
+    audio = frame(b"\x01") * 5
+    tagged = id3v2(64) + xing_frame(5) + audio + b"TAG" + bytes(125)
+    assert strip_mp3_headers(tagged) == audio
+    assert strip_mp3_headers(audio) == audio
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    directory = tmp_path / "audio"
+    catalog = AudioCatalog(str(directory), db_path=str(tmp_path / "catalog.sqlite3"))
+    now = time.time()
+    for i in range(7):
+        name = f"clip{i}.mp3" if i % 2 == 0 else f"clip{i}.wav"
+        path = directory / name
+        path.write_bytes(frame() * 4 if name.endswith(".mp3") else b"")
+        os.utime(path, (now - 100 + i, now - 100 + i))
+        catalog.add(str(path), generated_at=now - 100 + i)
+    return catalog
+
+
+def names(page):
+    return [item["filename"] for item in page["items"]]
+
+
+def test_list_pages_newest_first_with_cursor(catalog):
+    seen, cursor = [], None
+    while True:
+        page = catalog.list(limit=3, cursor=cursor)
+        seen += names(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"clip{i}.{'mp3' if i % 2 == 0 else 'wav'}" for i in reversed(range(7))]
+
+
+def test_list_cursor_is_stable_when_newer_files_arrive(catalog, tmp_path):
+    first = catalog.list(limit=2)
+    newer = tmp_path / "audio" / "newer.mp3"
+    newer.write_bytes(frame())
+    catalog.add(str(newer))
+    assert names(catalog.list(limit=2, cursor=first["next_cursor"])) == ["clip4.mp3", "clip3.wav"]
+
+
+def test_list_rejects_invalid_cursor(catalog):
+    with pytest.raises(ValueError):
+        catalog.list(cursor="not-a-cursor")
+
+
+def test_list_filters_by_extension(catalog):
+    assert names(catalog.list(extension="wav")) == ["clip5.wav", "clip3.wav", "clip1.wav"]
+    assert names(catalog.list(extension=".mp3")) == ["clip6.mp3", "clip4.mp3", "clip2.mp3", "clip0.mp3"]
+
+
+def test_extension_wildcards_are_literal(catalog):
+    assert names(catalog.list(extension="_p_")) == []
+    assert names(catalog.list(extension="%")) == []
+    assert catalog.latest("m_3") is None
+
+
+def test_list_drops_entries_whose_file_is_gone(catalog, tmp_path):
+    os.remove(tmp_path / "audio" / "clip6.mp3")
+    assert names(catalog.list(limit=1)) == []
+    assert catalog.get("clip6.mp3") is None
+    assert names(catalog.list(limit=1)) == ["clip5.wav"]
+
+
+def test_latest_orders_by_generation_and_skips_missing_files(catalog, tmp_path):
+    assert catalog.latest()["filename"] == "clip6.mp3"
+    assert catalog.latest("wav")["filename"] == "clip5.wav"
+    # A cache hit re-adds an old file as the most recently generated
+    catalog.add(str(tmp_path / "audio" / "clip0.mp3"))
+    assert catalog.latest()["filename"] == "clip0.mp3"
+    os.remove(tmp_path / "audio" / "clip0.mp3")
+    assert catalog.latest()["filename"] == "clip6.mp3"
+    assert catalog.get("clip0.mp3") is None
+
+
+def test_resolve_with_and_without_extension(catalog, tmp_path):
+    assert catalog.resolve("clip2.mp3")["filename"] == "clip2.mp3"
+    assert catalog.resolve("clip3")["filename"] == "clip3.wav"
+    assert catalog.resolve("missing") is None
+    assert catalog.resolve("../clip2.mp3") is None
+    assert catalog.resolve("") is None
+    os.remove(tmp_path / "audio" / "clip2.mp3")
+    assert catalog.resolve("clip2") is None
+    assert catalog.get("clip2.mp3") is None
@@ -0,0 +1,116 @@
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from media_http import _parse_range, media_response
+
+BODY = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 1023)),
+    ("bytes=1000-2000", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1024-", None),
+    ("bytes=50-10", None),
+    ("bytes=-0", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, len(BODY)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "bytes=0-1,5-9", "items=0-10", "bytes=a-b"])
+def test_parse_range_rejects_malformed_and_multi_range(header):
+    with pytest.raises(ValueError):
+        _parse_range(header, len(BODY))
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "clip.mp3"
+    path.write_bytes(BODY)
+    app = FastAPI()
+
+    @app.get("/media")
+    def media(request: Request):
+        return media_response(request, str(path), "audio/mpeg")
+
+    return TestClient(app)
+
+
+def test_full_response_advertises_ranges_and_validators(client):
+    response = client.get("/media")
+    assert response.status_code == 200
+    assert response.content == BODY
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+    assert response.headers["last-modified"]
+
+
+def test_range_returns_206(client):
+    response = client.get("/media", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == BODY[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(BODY)}"
+    assert response.headers["content-length"] == "10"
+
+
+def test_unsatisfiable_range_returns_416(client):
+    response = client.get("/media", headers={"Range": f"bytes={len(BODY)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+def test_malformed_range_sends_whole_file(client):
+    response = client.get("/media", headers={"Range": "bytes=0-1,5-9"})
+    assert response.status_code == 200
+    assert response.content == BODY
+
+
+def test_if_none_match_returns_304(client):
+    etag = client.get("/media").headers["etag"]
+    response = client.get("/media", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/media", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_modified_since_returns_304(client):
+    last_modified = client.get("/media").headers["last-modified"]
+    assert client.get("/media", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/media", headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}).status_code == 200
+
+
+def test_if_range_applies_range_only_for_current_etag(client):
+    etag = client.get("/media").headers["etag"]
+    matching = client.get("/media", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matching.status_code == 206
+    assert matching.content == BODY[:10]
+    stale = client.get("/media", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == BODY
+
+
+def test_content_hash_names_are_immutable(tmp_path):
+    path = tmp_path / ("ab" * 32 + ".mp3")
+    path.write_bytes(BODY)
+    app = FastAPI()
+
+    @app.get("/media")
+    def media(request: Request):
+        return media_response(request, str(path), "audio/mpeg")
+
+    response = TestClient(app).get("/media")
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["etag"] == f'"{os.path.splitext(path.name)[0]}"'
+
+
+@pytest.mark.parametrize("header", ["bytes=a-b", "items=0-10", "bytes=-"])
+def test_unsupported_range_units_or_syntax_send_whole_file(client, header):
+    response = client.get("/media", headers={"Range": header})
+    assert response.status_code == 200
+    assert response.content == BODY
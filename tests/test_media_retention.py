@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+from media_retention import MediaRetention, RetentionPolicy, policy_from_env
+
+HOUR = 3600
+
+
+def make(directory, name: str, size: int, age: float):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+@pytest.fixture
+def retention():
+    return MediaRetention(min_age=60)
+
+
+def test_ttl_removes_only_expired_files(tmp_path, retention):
+    old = make(tmp_path, "old.mp3", 10, 3 * HOUR)
+    fresh = make(tmp_path, "fresh.mp3", 10, 0.5 * HOUR)
+    result = retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), ttl=HOUR))
+    assert result["removed"] == 1 and result["freed_bytes"] == 10
+    assert not old.exists() and fresh.exists()
+
+
+def test_quota_removes_least_recently_used_first(tmp_path, retention):
+    files = [make(tmp_path, f"f{i}.mp3", 100, (5 - i) * HOUR) for i in range(5)]
+    retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), max_bytes=250))
+    assert [f.exists() for f in files] == [False, False, False, True, True]
+
+
+def test_files_younger_than_min_age_are_kept(tmp_path, retention):
+    young = make(tmp_path, "young.mp3", 1000, 10)
+    retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), ttl=1, max_bytes=1))
+    assert young.exists()
+
+
+def test_pinned_files_are_skipped_and_others_removed_instead(tmp_path, retention):
+    oldest = make(tmp_path, "oldest.mp3", 100, 3 * HOUR)
+    middle = make(tmp_path, "middle.mp3", 100, 2 * HOUR)
+    newest = make(tmp_path, "newest.mp3", 100, 1 * HOUR)
+    retention.pin(str(oldest))
+    retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), max_bytes=200))
+    assert oldest.exists() and not middle.exists() and newest.exists()
+    retention.unpin(str(oldest))
+    retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), max_bytes=100))
+    assert not oldest.exists() and newest.exists()
+
+
+def test_pin_checks_protect_files_and_fail_closed(tmp_path, retention):
+    kept = make(tmp_path, "kept.mp3", 10, 3 * HOUR)
+    errored = make(tmp_path, "errored.mp3", 10, 3 * HOUR)
+
+    def check(path):
+        if path.endswith("errored.mp3"):
+            raise RuntimeError("cache unavailable")
+        return path.endswith("kept.mp3")
+
+    retention.add_pin_check(check)
+    assert retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), ttl=HOUR))["removed"] == 0
+    assert kept.exists() and errored.exists()
+
+
+def test_patterns_limit_what_is_swept(tmp_path, retention):
+    audio = make(tmp_path, "a.mp3", 10, 3 * HOUR)
+    db = make(tmp_path, "catalog.sqlite3", 10, 3 * HOUR)
+    retention.sweep_policy(RetentionPolicy("audio", str(tmp_path), ttl=HOUR, patterns=["*.mp3"]))
+    assert not audio.exists() and db.exists()
+
+
+def test_directory_entries_are_removed_whole(tmp_path, retention):
+    for name, age in (("old", 3 * HOUR), ("new", 0.5 * HOUR)):
+        (tmp_path / name).mkdir()
+        make(tmp_path / name, "seg0.ts", 10, age)
+        make(tmp_path / name, "index.m3u8", 1, age)
+    retention.sweep_policy(RetentionPolicy("hls", str(tmp_path), ttl=HOUR, directories=True))
+    assert not (tmp_path / "old").exists() and (tmp_path / "new").exists()
+
+
+def test_policy_from_env_overrides(monkeypatch, tmp_path):
+    monkeypatch.setenv("RETENTION_AUDIO_TTL_HOURS", "2")
+    monkeypatch.setenv("RETENTION_AUDIO_MAX_MB", "3")
+    policy = policy_from_env("audio", str(tmp_path), ttl_hours=24, max_mb=500)
+    assert policy.ttl == 2 * HOUR and policy.max_bytes == 3 * 1024 * 1024
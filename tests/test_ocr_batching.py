@@ -0,0 +1,50 @@
+import numpy as np
+
+from ocr import batch_groups, pad_to
+
+
+def blank(height: int, width: int, channels: int = 3) -> np.ndarray:
+    shape = (height, width, channels) if channels else (height, width)
+    return np.zeros(shape, np.uint8)
+
+
+def test_similar_sizes_share_a_group():
+    images = [blank(100, 200), blank(110, 190), blank(95, 205)]
+    assert [sorted(group) for group in batch_groups(images, max_padding=0.5)] == [[0, 1, 2]]
+
+
+def test_sizes_needing_too_much_padding_are_split():
+    images = [blank(100, 100), blank(1000, 1000), blank(105, 100)]
+    groups = [sorted(group) for group in batch_groups(images, max_padding=0.5)]
+    assert sorted(groups) == [[0, 2], [1]]
+
+
+def test_padding_limit_holds_for_every_member():
+    rng = np.random.default_rng(3)
+    images = [blank(int(h), int(w)) for h, w in rng.integers(50, 400, size=(30, 2))]
+    groups = batch_groups(images, max_padding=0.3)
+    assert sorted(i for group in groups for i in group) == list(range(len(images)))
+    for group in groups:
+        height = max(images[i].shape[0] for i in group)
+        width = max(images[i].shape[1] for i in group)
+        for i in group:
+            assert height * width <= 1.3 * images[i].shape[0] * images[i].shape[1]
+
+
+def test_grayscale_and_color_are_never_batched_together():
+    images = [blank(100, 100), blank(100, 100, channels=0)]
+    assert sorted(sorted(group) for group in batch_groups(images)) == [[0], [1]]
+
+
+def test_pad_to_adds_white_below_and_right():
+    image = np.full((2, 3, 3), 7, np.uint8)
+    padded = pad_to(image, 4, 5)
+    assert padded.shape == (4, 5, 3)
+    assert (padded[:2, :3] == 7).all()
+    assert (padded[2:] == 255).all() and (padded[:, 3:] == 255).all()
+
+
+def test_pad_to_grayscale_and_noop():
+    image = np.zeros((3, 3), np.uint8)
+    assert pad_to(image, 3, 3).shape == (3, 3)
+    assert pad_to(image, 4, 3)[3].tolist() == [255, 255, 255]
@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+
+from ocr_cache import BKTree, hamming, perceptual_hash
+
+
+def page(seed: int = 0, height: int = 240, width: int = 320) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 255, np.uint8)
+    for _ in range(40):
+        y, x = rng.integers(0, height - 12), rng.integers(0, width - 60)
+        image[y:y + 8, x:x + rng.integers(10, 60)] = 0
+    return image
+
+
+def test_bktree_search_matches_linear_scan():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for value in values:
+        tree.add(value)
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        for radius in (0, 4, 20):
+            expected = sorted((hamming(query, v), v) for v in set(values) if hamming(query, v) <= radius)
+            assert sorted(tree.search(query, radius)) == expected
+
+
+def test_bktree_ignores_duplicates_and_handles_empty_tree():
+    tree = BKTree()
+    assert tree.search(0, 64) == []
+    tree.add(0b1011)
+    tree.add(0b1011)
+    assert tree.search(0b1011, 0) == [(0, 0b1011)]
+
+
+def test_perceptual_hash_is_stable_under_rescale_and_noise():
+    import cv2
+    image = page()
+    original = perceptual_hash(image)
+    assert perceptual_hash(image.copy()) == original
+    resized = cv2.resize(image, (640, 480), interpolation=cv2.INTER_LINEAR)
+    noisy = np.clip(image.astype(np.int16) + np.random.default_rng(1).integers(-8, 9, image.shape), 0, 255)
+    assert hamming(perceptual_hash(resized), original) <= 4
+    assert hamming(perceptual_hash(noisy.astype(np.uint8)), original) <= 4
+
+
+def test_perceptual_hash_separates_different_pages():
+    assert hamming(perceptual_hash(page(0)), perceptual_hash(page(1))) > 4
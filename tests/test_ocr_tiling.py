@@ -0,0 +1,55 @@
+from ocr_tiling import deduplicate, reading_order, tile_grid
+
+
+def test_small_image_is_one_tile():
+    assert tile_grid(500, 800, tile_size=1600, overlap=200) == [(0, 0, 800, 500)]
+
+
+def test_tiles_cover_the_image_with_overlap():
+    height, width, size, overlap = 3000, 4100, 1600, 200
+    tiles = tile_grid(height, width, size, overlap)
+    xs = sorted({x0 for x0, _, _, _ in tiles})
+    ys = sorted({y0 for _, y0, _, _ in tiles})
+    assert xs[0] == 0 and ys[0] == 0
+    # The last row and column end flush with the image instead of running past it
+    assert max(x1 for _, _, x1, _ in tiles) == width
+    assert max(y1 for _, _, _, y1 in tiles) == height
+    assert all(x1 - x0 == size and y1 - y0 == size for x0, y0, x1, y1 in tiles)
+    for a, b in zip(xs, xs[1:]):
+        assert a + size - b >= overlap
+    for a, b in zip(ys, ys[1:]):
+        assert a + size - b >= overlap
+    assert len(tiles) == len(xs) * len(ys)
+
+
+def test_deduplicate_keeps_the_whole_box_over_a_cut_one():
+    whole = ((100, 100, 300, 130), "hello world", 0.8)
+    cut = ((100, 100, 180, 130), "hello", 0.99)
+    other = ((100, 200, 300, 230), "second line", 0.9)
+    assert sorted(deduplicate([cut, whole, other])) == sorted([whole, other])
+
+
+def test_deduplicate_prefers_confidence_for_equal_boxes():
+    low = ((0, 0, 100, 20), "he1lo", 0.4)
+    high = ((0, 0, 100, 20), "hello", 0.9)
+    assert deduplicate([low, high]) == [high]
+
+
+def test_deduplicate_keeps_boxes_below_the_overlap_threshold():
+    a = ((0, 0, 100, 20), "a", 0.9)
+    b = ((80, 0, 180, 20), "b", 0.9)
+    assert len(deduplicate([a, b], threshold=0.5)) == 2
+
+
+def test_reading_order_groups_lines_and_reads_left_to_right():
+    boxes = [
+        ((200, 52, 300, 72), "line", 0.9),
+        ((0, 0, 100, 20), "First", 0.9),
+        ((110, 3, 200, 23), "line", 0.9),
+        ((0, 50, 190, 70), "Second", 0.9),
+    ]
+    assert reading_order(boxes) == "First line\nSecond line"
+
+
+def test_reading_order_of_nothing_is_empty():
+    assert reading_order([]) == ""
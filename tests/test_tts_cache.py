@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+import pytest
+
+from tts_cache import TTSCache
+
+
+def writer(data: bytes = b"x" * 10, delay: float = 0.0, calls=None):
+    def create(path: str):
+        if calls is not None:
+            calls.append(path)
+        time.sleep(delay)
+        with open(path, "wb") as f:
+            f.write(data)
+    return create
+
+
+def test_key_covers_every_parameter():
+    base = TTSCache.key("hello")
+    assert TTSCache.key("hello") == base
+    for changed in (TTSCache.key("hello!"), TTSCache.key("hello", lang="hi"), TTSCache.key("hello", voice="v"),
+                    TTSCache.key("hello", speed=1.5), TTSCache.key("hello", backend="piper")):
+        assert changed != base
+
+
+def test_miss_then_hit(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    calls = []
+    first = cache.get_or_create("hello", writer(calls=calls))
+    second = cache.get_or_create("hello", writer(calls=calls))
+    assert first == second and os.path.exists(first)
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_get_can_skip_counting_a_miss(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    assert cache.get(TTSCache.key("x"), count_miss=False) is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_concurrent_misses_synthesize_once(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    calls, results = [], []
+    create = writer(delay=0.2, calls=calls)
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create("same", create)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 4
+
+
+def test_failed_or_empty_synthesis_leaves_nothing_behind(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        cache.get_or_create("empty", writer(b""))
+
+    def fail(path):
+        open(path, "wb").write(b"partial")
+        raise OSError("backend down")
+
+    with pytest.raises(OSError):
+        cache.get_or_create("broken", fail)
+    assert os.listdir(tmp_path) == []
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=25)
+    a = cache.get_or_create("a", writer())
+    b = cache.get_or_create("b", writer())
+    cache.get_or_create("a", writer())  # a is now more recent than b
+    c = cache.get_or_create("c", writer())
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
+    assert cache.stats()["bytes"] == 20
+
+
+def test_pinned_entries_survive_eviction_until_unpinned(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=15)
+    a_key = TTSCache.key("a")
+    a = cache.get_or_create("a", writer())
+    cache.pin(a_key)
+    b = cache.get_or_create("b", writer())
+    assert os.path.exists(a) and os.path.exists(b)
+    assert cache.in_use(a)
+    cache.unpin(a_key)
+    assert not cache.in_use(a)
+    assert not os.path.exists(a) and os.path.exists(b)
+
+
+def test_newest_entry_is_kept_even_over_budget(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=5)
+    path = cache.get_or_create("big", writer(b"x" * 50))
+    assert os.path.exists(path)
+
+
+def test_existing_files_are_indexed_oldest_first(tmp_path):
+    old, new = TTSCache.key("old"), TTSCache.key("new")
+    for key, mtime in ((old, 1000), (new, 2000)):
+        path = tmp_path / f"{key}.mp3"
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (mtime, mtime))
+    (tmp_path / "notes.txt").write_text("ignored")
+    cache = TTSCache(str(tmp_path), max_bytes=25)
+    assert cache.stats()["entries"] == 2
+    cache.get_or_create("third", writer())
+    assert not (tmp_path / f"{old}.mp3").exists()
+    assert (tmp_path / f"{new}.mp3").exists()
+    assert (tmp_path / "notes.txt").exists()
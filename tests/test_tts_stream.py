@@ -0,0 +1,28 @@
+from tts_stream import split_sentences
+
+
+def test_short_sentences_are_merged_until_min_chars():
+    text = "Hi. This is fine. Now a much longer sentence that stands on its own."
+    assert split_sentences(text, min_chars=20) == [
+        "Hi. This is fine. Now a much longer sentence that stands on its own."]
+    assert split_sentences(text, min_chars=10) == [
+        "Hi. This is fine.", "Now a much longer sentence that stands on its own."]
+
+
+def test_short_tail_joins_the_last_sentence():
+    assert split_sentences("A sentence that is long enough. Ok!", min_chars=20) == [
+        "A sentence that is long enough. Ok!"]
+
+
+def test_splits_on_question_exclamation_and_danda():
+    assert split_sentences("Kya haal hai? Theek hai! यह वाक्य है। और यह भी।", min_chars=1) == [
+        "Kya haal hai?", "Theek hai!", "यह वाक्य है।", "और यह भी।"]
+
+
+def test_no_split_without_whitespace_after_the_stop():
+    assert split_sentences("Version 3.5 is out.", min_chars=1) == ["Version 3.5 is out."]
+
+
+def test_empty_text_has_no_sentences():
+    assert split_sentences("") == []
+    assert split_sentences("   ") == []
@@ -0,0 +1,74 @@
+import pytest
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from upload_limit import BodySizeLimit
+
+LIMIT = 1024
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(BodySizeLimit, limits={"/raw": LIMIT, "/upload": LIMIT})
+
+    @app.post("/raw")
+    async def raw(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/unlimited")
+    async def unlimited(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def chunks(total: int, size: int = 256):
+    for start in range(0, total, size):
+        yield b"x" * min(size, total - start)
+
+
+def test_body_within_limit_passes(client):
+    assert client.post("/raw", content=b"x" * LIMIT).json() == {"size": LIMIT}
+
+
+def test_declared_length_over_limit_is_rejected(client):
+    response = client.post("/raw", content=b"x" * (LIMIT + 1))
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Request body is larger than")
+
+
+def test_chunked_body_over_limit_is_rejected_while_streaming(client):
+    response = client.post("/raw", content=chunks(LIMIT * 4))
+    assert response.status_code == 413
+
+
+def test_multipart_upload_over_limit_is_rejected(client):
+    response = client.post("/upload", files={"file": ("a.png", b"x" * (LIMIT * 4), "image/png")})
+    assert response.status_code == 413
+    small = client.post("/upload", files={"file": ("a.png", b"x" * 100, "image/png")})
+    assert small.status_code == 200 and small.json() == {"size": 100}
+
+
+def test_chunked_multipart_over_limit_is_rejected(client):
+    # No Content-Length: the limit is only reached while the form parser is reading
+    boundary = "limitboundary"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\n"
+            "Content-Type: image/png\r\n\r\n").encode()
+
+    def body():
+        yield head
+        yield from chunks(LIMIT * 4)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post("/upload", content=body(),
+                           headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+
+
+def test_paths_without_a_limit_are_untouched(client):
+    assert client.post("/unlimited", content=b"x" * (LIMIT * 4)).json() == {"size": LIMIT * 4}
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from wav2lip_worker import MEL_HOP_SIZE, count_frames, mel_chunks, split_at_silence
+
+SAMPLE_RATE = 16000
+FPS = 25.0
+
+
+@pytest.mark.parametrize("num_samples", [3000, 3199, 16000, 16001, 48000 + 123, 160000])
+@pytest.mark.parametrize("fps", [25.0, 30.0])
+def test_count_frames_matches_mel_chunks(num_samples, fps):
+    mel = np.zeros((80, 1 + num_samples // MEL_HOP_SIZE))
+    assert count_frames(num_samples, fps) == len(mel_chunks(mel, fps))
+
+
+def speech_with_pauses(seconds: float, pauses) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    for start, end in pauses:
+        samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0
+    return samples
+
+
+def test_split_covers_every_frame_once():
+    samples = speech_with_pauses(12, [])
+    total = count_frames(len(samples), FPS)
+    ranges = split_at_silence(samples, SAMPLE_RATE, FPS, 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == total
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_cuts_fall_in_pauses_near_the_even_split():
+    # Even split of 12 s into 3 is at 4 s and 8 s; pauses sit slightly off those points
+    samples = speech_with_pauses(12, [(4.4, 4.6), (7.3, 7.5)])
+    ranges = split_at_silence(samples, SAMPLE_RATE, FPS, 3)
+    cuts = [start / FPS for start, _ in ranges[1:]]
+    assert 4.4 <= cuts[0] <= 4.6
+    assert 7.3 <= cuts[1] <= 7.5
+
+
+def test_pauses_far_from_the_split_point_are_not_used():
+    samples = speech_with_pauses(12, [(1.0, 1.5)])
+    (_, first_end), _ = split_at_silence(samples, SAMPLE_RATE, FPS, 2)
+    assert abs(first_end / FPS - 6) <= 1.5
+
+
+def test_short_audio_or_one_segment_is_not_split():
+    samples = speech_with_pauses(1, [])
+    total = count_frames(len(samples), FPS)
+    assert split_at_silence(samples, SAMPLE_RATE, FPS, 1) == [(0, total)]
+    assert split_at_silence(samples, SAMPLE_RATE, FPS, total) == [(0, total)]
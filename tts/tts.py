@@ -1,87 +1,131 @@
-from fastapi import FastAPI, Form, HTTPException, UploadFile, File
+from fastapi import FastAPI, Form, HTTPException, UploadFile, File, Request, Query
 from fastapi.responses import FileResponse, JSONResponse,PlainTextResponse
-from gtts import gTTS
 import uuid
 import subprocess
 import os
 from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+import sys
+import tempfile
+from typing import Optional
 
 import traceback
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts_cache import TTSCache
+from tts_backends import TTS_BACKEND, TTS_BACKENDS, synthesize
+from media_http import media_response
+from media_retention import MediaRetention, policy_from_env
+from audio_catalog import AudioCatalog, CATALOG_PAGE_SIZE
+from wav2lip_worker import Wav2LipError, get_wav2lip_pool
+from audio_io import decode_audio
+from lipsync_cache import LipSyncCache
+from upload_limit import BodySizeLimit
+
 
 app = FastAPI()
-<<<<<<< HEAD
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "tts_outputs")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(os.path.join(os.path.dirname(__file__), "results"), exist_ok=True)
-=======
-OUTPUT_DIR = "tts_outputs"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs("results", exist_ok=True)
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
-
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+os.makedirs(RESULTS_DIR, exist_ok=True)
+# Lip-sync uploads, one uniquely named file per request, removed when the request ends
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+LIPSYNC_MAX_AUDIO_MB = int(os.getenv("LIPSYNC_MAX_AUDIO_MB", "50"))
+LIPSYNC_MAX_VIDEO_MB = int(os.getenv("LIPSYNC_MAX_VIDEO_MB", "200"))
+# Both files plus room for the multipart boundaries and part headers; enforced while the
+# body arrives, before Starlette spools it to disk, so an oversized upload never fills the disk
+app.add_middleware(BodySizeLimit, limits={
+    "/api/lip-sync": (LIPSYNC_MAX_AUDIO_MB + LIPSYNC_MAX_VIDEO_MB + 1) * 1024 * 1024,
+})
+
+# Generated speech is stored once per (text, lang, voice, speed) under a content-hash name
+tts_cache = TTSCache(OUTPUT_DIR)
+# Indexed listing of OUTPUT_DIR, updated on every write instead of listing the directory per request
+audio_catalog = AudioCatalog(OUTPUT_DIR)
+
+media_retention = MediaRetention([
+    policy_from_env("tts_outputs", OUTPUT_DIR, ttl_hours=24 * 7, max_mb=1024, patterns=["*.mp3", "*.wav", "*.part"]),
+    policy_from_env("results", RESULTS_DIR, ttl_hours=48, max_mb=4096),
+    # Uploads are deleted per request; this only catches ones left by a crash
+    policy_from_env("uploads", UPLOAD_DIR, ttl_hours=1),
+    # Leftovers from older runs, which saved results and uploads in the working directory
+    policy_from_env("stray", os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ttl_hours=24,
+                    patterns=["result_*.mp4", "temp_*"]),
+])
+media_retention.add_pin_check(tts_cache.in_use)
+lipsync_cache = LipSyncCache(os.path.join(RESULTS_DIR, "lipsync_cache"))
+@app.on_event("startup")
+def start_media_retention():
+    media_retention.start()
+
+
+@app.on_event("startup")
+def start_wav2lip_workers():
+    get_wav2lip_pool().start()
+
+@app.on_event("startup")
+async def sync_audio_catalog():
+    # Pick up files written while the service was down or by avatar_engine, drop deleted ones
+    await run_in_threadpool(audio_catalog.sync)
 
 @app.get("/")
 async def root():
     return {"message": "Edge TTS Service is running"}
 
 @app.get("/api/audio/{filename}")
-async def get_audio_file(filename: str):
-<<<<<<< HEAD
+async def get_audio_file(filename: str, request: Request):
     filepath = Path(OUTPUT_DIR) / filename
-=======
-    filepath = os.path.join(OUTPUT_DIR, filename)
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
     if not os.path.exists(filepath):
         raise HTTPException(status_code=404, detail="Audio file not found")
-    return FileResponse(path=filepath, filename=filename, media_type='audio/mpeg')
+    media_type = 'audio/wav' if filename.endswith('.wav') else 'audio/mpeg'
+    return media_response(request, str(filepath), media_type=media_type, filename=filename)
 
 @app.get("/api/list-audio-files")
-async def list_audio_files():
-<<<<<<< HEAD
-    files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith(('.mp3', '.wav'))]
-=======
-    files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.mp3')]
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
-    return {"audio_files": files, "count": len(files)}
-
-async def try_save_with_retries(tts, filepath, retries=3, delay=2):
-    for attempt in range(retries):
-        try:
-            tts.save(filepath)
-            return
-
-        except Exception as e:
-            print("Unexpected error:", traceback.format_exc())
-            raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
+async def list_audio_files(limit: int = Query(CATALOG_PAGE_SIZE, ge=1, le=1000), cursor: Optional[str] = None,
+                           extension: Optional[str] = None, backend: Optional[str] = None,
+                           lang: Optional[str] = None, text_hash: Optional[str] = None,
+                           created_after: Optional[float] = None, created_before: Optional[float] = None,
+                           min_duration: Optional[float] = None, max_duration: Optional[float] = None):
+    try:
+        page = await run_in_threadpool(
+            audio_catalog.list, limit=limit, cursor=cursor, extension=extension, backend=backend, lang=lang,
+            text_hash=text_hash, created_after=created_after, created_before=created_before,
+            min_duration=min_duration, max_duration=max_duration)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    files = [item["filename"] for item in page["items"]]
+    return {"audio_files": files, "count": len(files), "items": page["items"], "next_cursor": page["next_cursor"]}
 
 @app.post("/api/generate")
-async def text_to_speech(text: str = Form(...)):
+async def text_to_speech(text: str = Form(...), backend: str = Form(TTS_BACKEND)):
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
+    if backend not in TTS_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown TTS backend: {backend}")
     
     # Truncate text if it's longer than 500 characters
     if len(text) > 500:
         text = text[:500]
 
-    filename = f"{uuid.uuid4()}.mp3"
-<<<<<<< HEAD
-    filepath = Path(OUTPUT_DIR) / filename
-=======
-    filepath = os.path.join(OUTPUT_DIR, filename)
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
-
     try:
-        tts = gTTS(text=text, lang='en', slow=False) # 'en' for English, slow=False for faster speech
-        await try_save_with_retries(tts, filepath)
+        def synthesize_to(filepath):
+            try:
+                synthesize(text, filepath, backend=backend, lang='en')
+            except Exception as e:
+                print("Unexpected error:", traceback.format_exc())
+                raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
 
-        if not os.path.exists(filepath):
-            raise HTTPException(status_code=500, detail="Audio generation failed")
+        filepath = await run_in_threadpool(tts_cache.get_or_create, text, synthesize_to, lang='en', backend=backend)
+        filename = os.path.basename(filepath)
+        await run_in_threadpool(audio_catalog.add, filepath, text=text, backend=backend, lang='en')
 
         return JSONResponse({
             "status": "success",
             "audio_url": f"/api/audio/{filename}",
             "filename": filename,
+            "backend": backend,
 
         })
     except HTTPException as http_ex:
@@ -90,36 +134,61 @@ async def text_to_speech(text: str = Form(...)):
         print("Fatal error:\n", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Fatal error: {str(e)}")
 
+@app.get("/api/tts-cache-stats")
+async def tts_cache_stats():
+    return tts_cache.stats()
+
+@app.get("/api/storage-usage")
+async def storage_usage():
+    return media_retention.usage()
+
+@app.get("/api/wav2lip-stats")
+async def wav2lip_stats():
+    return get_wav2lip_pool().stats()
+
+def save_upload(upload: UploadFile, max_mb: int) -> str:
+    """Copy an upload to a unique file in UPLOAD_DIR in fixed-size chunks, stopping at ``max_mb``."""
+    max_bytes = max_mb * 1024 * 1024
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{upload.filename} is larger than {max_mb} MB")
+    # Keep the extension: Wav2Lip tells still images from videos by it, ffmpeg uses it as a hint
+    extension = os.path.splitext(os.path.basename(upload.filename or ""))[1].lower()[:10]
+    fd, path = tempfile.mkstemp(suffix=extension, dir=UPLOAD_DIR)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: upload.file.read(UPLOAD_CHUNK_SIZE), b""):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{upload.filename} is larger than {max_mb} MB")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
 @app.post("/api/lip-sync")
 async def lip_sync(audio_file: UploadFile = File(...), video_file: UploadFile = File(...)):
-    audio_path = f"temp_{audio_file.filename}"
-    video_path = f"temp_{video_file.filename}"
-<<<<<<< HEAD
-    output_path = Path(os.path.dirname(__file__)) / "results" / f"lip_sync_{uuid.uuid4()}.mp4"
-=======
-    output_path = f"results/lip_sync_{uuid.uuid4()}.mp4"
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
-
-    with open(audio_path, "wb") as f:
-        f.write(await audio_file.read())
-    with open(video_path, "wb") as f:
-        f.write(await video_file.read())
-
-    command = [
-        "python", "e:\\pythonProject\\Gurukul\\Wav2Lip\\inference.py",
-        "--checkpoint_path", "e:\\pythonProject\\Gurukul\\Wav2Lip\\checkpoints\\wav2lip_gan.pth", # You might need to download this checkpoint
-        "--face", video_path,
-        "--audio", audio_path,
-        "--outfile", output_path
-    ]
+    output_path = Path(RESULTS_DIR) / f"lip_sync_{uuid.uuid4()}.mp4"
+
+    # BodySizeLimit has capped the whole body; the per-file limits are checked here. Copying in
+    # chunks keeps memory flat however large the video is, and unique names keep requests apart
+    audio_path = await run_in_threadpool(save_upload, audio_file, LIPSYNC_MAX_AUDIO_MB)
+    try:
+        video_path = await run_in_threadpool(save_upload, video_file, LIPSYNC_MAX_VIDEO_MB)
+    except BaseException:
+        os.remove(audio_path)
+        raise
 
     try:
-        process = subprocess.run(command, capture_output=True, text=True, check=True)
-        print("Wav2Lip Output:", process.stdout)
-        print("Wav2Lip Error:", process.stderr)
-    except subprocess.CalledProcessError as e:
-        print("Wav2Lip Command Failed:", e.stderr)
-        raise HTTPException(status_code=500, detail=f"Lip-sync generation failed: {e.stderr}")
+        # The resident worker already has the checkpoint and face detector loaded
+        samples, _ = await run_in_threadpool(decode_audio, audio_path)
+        timings = await run_in_threadpool(lipsync_cache.render, get_wav2lip_pool(), video_path, samples,
+                                          str(output_path))
+        print("Wav2Lip timings:", timings)
+    except (Wav2LipError, subprocess.CalledProcessError) as e:
+        print("Wav2Lip Failed:", e)
+        raise HTTPException(status_code=500, detail=f"Lip-sync generation failed: {e}")
     finally:
         os.remove(audio_path)
         os.remove(video_path)
@@ -134,20 +203,12 @@ async def lip_sync(audio_file: UploadFile = File(...), video_file: UploadFile =
     })
 
 @app.get("/api/video/{filename}")
-async def get_video_file(filename: str):
-<<<<<<< HEAD
-    filepath = Path(os.path.dirname(__file__)) / "results" / filename
-=======
-    filepath = os.path.join("results", filename)
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
+async def get_video_file(filename: str, request: Request):
+    filepath = Path(RESULTS_DIR) / filename
     if not os.path.exists(filepath):
         raise HTTPException(status_code=404, detail="Video file not found")
-    return FileResponse(path=filepath, filename=filename, media_type='video/mp4')
+    return media_response(request, str(filepath), media_type='video/mp4', filename=filename)
 
 if __name__ == "__main__":
     import uvicorn
-<<<<<<< HEAD
-    uvicorn.run(app, host="192.168.1.105", port=8001)
-=======
     uvicorn.run(app, host="192.168.1.105", port=8001)
->>>>>>> 4c0d6e963859d98f970300809a2a5b6f5d1b7f7d
@@ -0,0 +1,108 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from typing import Dict, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+# Default engine when a request does not pick one: "gtts" (Google, online) or an offline engine
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+TTS_BASE_WPM = 175  # espeak-ng / pyttsx3 words per minute at speed 1.0
+
+
+class TTSBackend:
+    """Speech synthesizer that writes MP3 audio to a path."""
+
+    name = ""
+    offline = False
+
+    def synthesize(self, text: str, path: str, lang: str = "en", voice: str = "", speed: float = 1.0):
+        raise NotImplementedError
+
+
+TTS_BACKENDS: Dict[str, Type[TTSBackend]] = {}
+_instances: Dict[str, TTSBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(cls: Type[TTSBackend]) -> Type[TTSBackend]:
+    TTS_BACKENDS[cls.name] = cls
+    return cls
+
+
+def wav_to_mp3(wav_path: str, mp3_path: str):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", wav_path, "-f", "mp3", mp3_path], check=True)
+
+
+@register_backend
+class GTTSBackend(TTSBackend):
+    name = "gtts"
+
+    def synthesize(self, text: str, path: str, lang: str = "en", voice: str = "", speed: float = 1.0):
+        from gtts import gTTS
+        # gTTS has no voices; the tld picks the accent (com, co.uk, co.in, ...)
+        gTTS(text=text, lang=lang, tld=voice or "com", slow=speed < 1.0).save(path)
+
+
+@register_backend
+class EspeakBackend(TTSBackend):
+    name = "espeak"
+    offline = True
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.binary:
+            raise RuntimeError("espeak-ng is not installed")
+
+    def synthesize(self, text: str, path: str, lang: str = "en", voice: str = "", speed: float = 1.0):
+        espeak_voice = f"{lang}+{voice}" if voice else lang
+        speech = subprocess.run(
+            [self.binary, "-v", espeak_voice, "-s", str(int(TTS_BASE_WPM * speed)), "--stdout", text],
+            check=True, capture_output=True)
+        # Encode straight from the WAV on stdout; nothing touches disk but the final MP3
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "wav", "-i", "pipe:0", "-f", "mp3", path],
+                       input=speech.stdout, check=True)
+
+
+@register_backend
+class Pyttsx3Backend(TTSBackend):
+    name = "pyttsx3"
+    offline = True
+
+    def __init__(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        # The engine runs its own event loop and is not safe to drive from two threads at once
+        self.lock = threading.Lock()
+
+    def synthesize(self, text: str, path: str, lang: str = "en", voice: str = "", speed: float = 1.0):
+        fd, wav_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self.lock:
+                if voice:
+                    self.engine.setProperty("voice", voice)
+                self.engine.setProperty("rate", int(TTS_BASE_WPM * speed))
+                self.engine.save_to_file(text, wav_path)
+                self.engine.runAndWait()
+            wav_to_mp3(wav_path, path)
+        finally:
+            os.remove(wav_path)
+
+
+def get_backend(name: Optional[str] = None) -> TTSBackend:
+    name = name or TTS_BACKEND
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}'. Available: {', '.join(TTS_BACKENDS)}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = TTS_BACKENDS[name]()
+        return _instances[name]
+
+
+def synthesize(text: str, path: str, backend: Optional[str] = None, lang: str = "en",
+               voice: str = "", speed: float = 1.0):
+    get_backend(backend).synthesize(text, path, lang=lang, voice=voice, speed=speed)
@@ -0,0 +1,77 @@
+"""Compare TTS backends on latency and throughput.
+
+    python tts_bench.py --backends gtts espeak pyttsx3 --concurrency 4 --repeat 3
+
+Each backend synthesizes the same sample texts (no cache) once sequentially,
+for per-request latency, and once through a thread pool of --concurrency
+workers, for throughput.
+"""
+import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from tts_backends import TTS_BACKENDS, get_backend
+
+SAMPLE_TEXTS = [
+    "Welcome to Gurukul.",
+    "Photosynthesis is the process by which green plants use sunlight to make food from carbon dioxide and water.",
+    "Today we will revise fractions. A fraction has a numerator and a denominator. "
+    "When the denominators are equal, add the numerators and keep the denominator. "
+    "When they differ, first find a common denominator, then rewrite each fraction before adding.",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_backend(name: str, texts, repeat: int, concurrency: int, workdir: str):
+    backend = get_backend(name)
+    backend.synthesize(texts[0], os.path.join(workdir, f"{name}_warmup.mp3"))  # not measured
+
+    latencies, chars = [], 0
+    for r in range(repeat):
+        for i, text in enumerate(texts):
+            started = time.perf_counter()
+            backend.synthesize(text, os.path.join(workdir, f"{name}_seq_{r}_{i}.mp3"))
+            latencies.append(time.perf_counter() - started)
+            chars += len(text)
+
+    jobs = [(text, os.path.join(workdir, f"{name}_par_{r}_{i}.mp3"))
+            for r in range(repeat) for i, text in enumerate(texts)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda job: backend.synthesize(*job), jobs))
+    wall = time.perf_counter() - started
+
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "chars_per_s": chars / sum(latencies),
+        "requests_per_s": len(jobs) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="*", default=list(TTS_BACKENDS), choices=list(TTS_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'p50 ms':>9}{'p95 ms':>9}{'chars/s':>10}{'req/s @' + str(args.concurrency):>11}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends:
+            try:
+                r = bench_backend(name, SAMPLE_TEXTS, args.repeat, args.concurrency, workdir)
+            except Exception as e:
+                print(f"{name:<10}unavailable ({e})")
+                continue
+            print(f"{name:<10}{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['chars_per_s']:>10.0f}{r['requests_per_s']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
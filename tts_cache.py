@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class TTSCache:
+    """Content-addressed store for synthesized speech.
+
+    Audio is saved once as ``<sha256>.<ext>`` where the hash covers everything
+    that changes the output (backend, text, language, voice, speed), so a repeated
+    request returns the existing file. The directory is kept under
+    ``max_bytes`` by evicting the least recently used entries.
+    """
+
+    # Appended to partial file names for writers that pick the format from the extension (ffmpeg)
+    partial_suffix = ""
+
+    def __init__(self, directory: str, max_bytes: int = TTS_CACHE_MAX_BYTES, extension: str = ".mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._pins: Dict[str, int] = {}  # key -> holders; pinned entries are never evicted
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        pattern = re.compile(r"^([0-9a-f]{64})" + re.escape(self.extension) + "$")
+        found = []
+        for entry in os.scandir(self.directory):
+            match = pattern.match(entry.name)
+            if match and entry.is_file():
+                stat = entry.stat()
+                found.append((max(stat.st_atime, stat.st_mtime), match.group(1), stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+
+    @staticmethod
+    def key(text: str, lang: str = "en", voice: str = "", speed: float = 1.0, backend: str = "gtts") -> str:
+        payload = json.dumps([backend, text, lang, voice, speed], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.extension)
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[str]:
+        """Return the cached path for ``key`` or None; a pre-check before
+        ``get_or_create`` passes ``count_miss=False`` so a miss is counted once."""
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._entries and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return path
+            if key in self._entries:
+                # Removed behind our back (manual cleanup, retention job)
+                self._bytes -= self._entries.pop(key)
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def put(self, key: str, source_path: str) -> str:
+        path = self.path_for(key)
+        os.replace(source_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+        return path
+
+    def pin(self, key: str):
+        """Keep ``key`` from LRU eviction (and, through ``in_use``, retention) until ``unpin``."""
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key: str):
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+            self._evict()
+
+    def _evict(self):
+        # The most recent entry (just written or read) always stays
+        for key in list(self._entries)[:-1]:
+            if self._bytes <= self.max_bytes:
+                break
+            if key in self._pins:
+                continue
+            self._bytes -= self._entries.pop(key)
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def get_or_create(self, text: str, synthesize: Callable[[str], None], lang: str = "en",
+                      voice: str = "", speed: float = 1.0, backend: str = "gtts") -> str:
+        """Return the cached audio path for these parameters, calling ``synthesize(path)`` on a miss."""
+        return self.get_or_create_key(self.key(text, lang, voice, speed, backend), synthesize)
+
+    def get_or_create_key(self, key: str, create: Callable[[str], None]) -> str:
+        """Return the cached path for ``key``, calling ``create(partial_path)`` on a miss."""
+        path = self.get(key)
+        if path:
+            return path
+        # Concurrent misses for the same key wait for one creation instead of repeating it
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                path = self.path_for(key)
+                if os.path.exists(path):
+                    # Another request finished synthesizing it while we waited
+                    with self._lock:
+                        self.misses -= 1
+                        self.hits += 1
+                        if key not in self._entries:
+                            self._entries[key] = os.path.getsize(path)
+                            self._bytes += self._entries[key]
+                    return path
+                partial = f"{path}.{uuid.uuid4().hex}.part{self.partial_suffix}"
+                try:
+                    create(partial)
+                    if not os.path.exists(partial) or os.path.getsize(partial) == 0:
+                        raise RuntimeError(f"No output was produced for key {key[:12]}")
+                    return self.put(key, partial)
+                finally:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def in_use(self, path: str) -> bool:
+        """True while ``path`` (or its partial file) belongs to a synthesis still in progress or is pinned."""
+        key = os.path.basename(path).split(".", 1)[0]
+        with self._lock:
+            return key in self._inflight or key in self._pins
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,58 @@
+from typing import Dict
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import JSONResponse
+
+
+class BodySizeLimit:
+    """ASGI middleware that caps request bodies per path while they arrive.
+
+    Starlette spools a multipart body to disk before the endpoint runs, so a
+    limit checked in the endpoint comes after the whole upload has been
+    received. This rejects a declared Content-Length over the limit before
+    reading anything, and stops reading a body (chunked or lying about its
+    length) as soon as the bytes received pass it. Both answer 413.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        too_large = JSONResponse({"detail": f"Request body is larger than {limit // (1024 * 1024)} MB"},
+                                 status_code=413)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request" and not rejected:
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await too_large(scope, receive, send)
+                    # The form parser sees a disconnect and abandons (and removes) its spooled parts
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # Whatever the app answers after the 413 (e.g. a parse error) is dropped
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except ClientDisconnect:
+            # The disconnect is the one limited_receive made up after answering 413; not an error
+            if not rejected:
+                raise
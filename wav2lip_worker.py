@@ -0,0 +1,731 @@
+"""Resident Wav2Lip inference.
+
+Replaces ``python inference.py`` per video: worker processes import torch and
+load the checkpoint and face detector once, then render jobs taken from a
+local queue. The rendering steps follow Wav2Lip/inference.py (static image or
+video face, 16-frame mel windows, 96x96 face crops, cv2 writer + ffmpeg mux).
+"""
+import os
+import sys
+import math
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+import traceback
+import subprocess
+import multiprocessing as mp
+from collections import OrderedDict, deque
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from audio_io import AUDIO_SAMPLE_RATE, decode_audio
+from hls_output import HLSPublisher, target_duration_for
+
+logger = logging.getLogger(__name__)
+
+WAV2LIP_DIR = os.getenv("WAV2LIP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Wav2Lip"))
+WAV2LIP_CHECKPOINT = os.getenv("WAV2LIP_CHECKPOINT", os.path.join(WAV2LIP_DIR, "checkpoints", "wav2lip_gan.pth"))
+WAV2LIP_WORKERS = int(os.getenv("WAV2LIP_WORKERS", "1"))
+WAV2LIP_DEVICE = os.getenv("WAV2LIP_DEVICE", "cpu")
+# Torch intra-op threads per worker; by default the cores are split between workers
+WAV2LIP_TORCH_THREADS = int(os.getenv("WAV2LIP_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // WAV2LIP_WORKERS)
+WAV2LIP_BATCH_SIZE = int(os.getenv("WAV2LIP_BATCH_SIZE", "128"))
+WAV2LIP_FACE_DET_BATCH_SIZE = int(os.getenv("WAV2LIP_FACE_DET_BATCH_SIZE", "16"))
+WAV2LIP_FPS = float(os.getenv("WAV2LIP_FPS", "25"))
+WAV2LIP_PADS = [int(p) for p in os.getenv("WAV2LIP_PADS", "0,10,0,0").split(",")]  # top, bottom, left, right
+# Face boxes and 96x96 crops per face input, shared by all workers and kept across restarts
+WAV2LIP_FACE_CACHE_DIR = os.getenv("WAV2LIP_FACE_CACHE_DIR",
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp", "face_cache"))
+WAV2LIP_FACE_CACHE_ENTRIES = int(os.getenv("WAV2LIP_FACE_CACHE_ENTRIES", "32"))  # in memory, per worker
+WAV2LIP_FACE_CACHE_MEMORY_MB = int(os.getenv("WAV2LIP_FACE_CACHE_MEMORY_MB", "512"))  # in memory, per worker
+# Entries for uploaded faces are evicted on disk past these limits; registered avatars are kept
+WAV2LIP_FACE_CACHE_MAX_MB = int(os.getenv("WAV2LIP_FACE_CACHE_MAX_MB", "1024"))
+WAV2LIP_FACE_CACHE_TTL_HOURS = float(os.getenv("WAV2LIP_FACE_CACHE_TTL_HOURS", "24"))
+# Split long audio at pauses and render the pieces on several workers at once ("auto": when
+# more than one worker is running, "off": always one job per video)
+WAV2LIP_SEGMENTED = os.getenv("WAV2LIP_SEGMENTED", "auto").lower()
+WAV2LIP_SEGMENT_MIN_SECONDS = float(os.getenv("WAV2LIP_SEGMENT_MIN_SECONDS", "4"))
+# Segment length for HLS output; shorter means earlier playback but more per-segment overhead
+WAV2LIP_HLS_SEGMENT_SECONDS = float(os.getenv("WAV2LIP_HLS_SEGMENT_SECONDS", "4"))
+
+IMG_SIZE = 96
+MEL_STEP_SIZE = 16
+MEL_HOP_SIZE = 200  # Wav2Lip/hparams.py hop_size: 80 mel frames per second at 16 kHz
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+AudioInput = Union[str, np.ndarray]
+# progress(stage, fraction of the render done)
+ProgressCallback = Callable[[str, float], None]
+
+
+class Wav2LipError(RuntimeError):
+    pass
+
+
+def read_face(face_path: str) -> Tuple[List[np.ndarray], float]:
+    """Frames and fps of the face input; a still image is a single frame at WAV2LIP_FPS."""
+    import cv2
+    if face_path.lower().endswith(IMAGE_EXTENSIONS):
+        frame = cv2.imread(face_path)
+        if frame is None:
+            raise Wav2LipError(f"Could not read face image {face_path}")
+        return [frame], WAV2LIP_FPS
+    capture = cv2.VideoCapture(face_path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or WAV2LIP_FPS
+    frames = []
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    if not frames:
+        raise Wav2LipError(f"Could not read frames from {face_path}")
+    return frames, fps
+
+
+def read_face_fps(face_path: str) -> float:
+    import cv2
+    if face_path.lower().endswith(IMAGE_EXTENSIONS):
+        return WAV2LIP_FPS
+    capture = cv2.VideoCapture(face_path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or WAV2LIP_FPS
+    capture.release()
+    return fps
+
+
+def smooth_boxes(boxes: np.ndarray, window: int = 5) -> np.ndarray:
+    for i in range(len(boxes)):
+        boxes[i] = np.mean(boxes[len(boxes) - window:] if i + window > len(boxes) else boxes[i:i + window], axis=0)
+    return boxes
+
+
+class FaceCache:
+    """Face detection results keyed by a hash of the face file's bytes.
+
+    Entries hold the smoothed boxes, the 96x96 crops fed to the model and the
+    fps. Editing or replacing an avatar changes its hash, so stale entries are
+    never used. Registered avatars are stored as ``<key>.avatar.npz`` with their
+    source path, kept, and replaced when the avatar at that path is registered
+    again with new content; other faces (uploads) are evicted least recently
+    used first once the directory passes its size or age limit.
+    """
+
+    def __init__(self, directory: str = WAV2LIP_FACE_CACHE_DIR, max_entries: int = WAV2LIP_FACE_CACHE_ENTRIES,
+                 max_memory_bytes: int = WAV2LIP_FACE_CACHE_MEMORY_MB * 1024 * 1024,
+                 max_disk_bytes: int = WAV2LIP_FACE_CACHE_MAX_MB * 1024 * 1024,
+                 ttl: float = WAV2LIP_FACE_CACHE_TTL_HOURS * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._memory_bytes = 0
+        # path -> (size, mtime_ns, key); bounded like the crops, uploads all have unique paths
+        self._hashes: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, face_path: str) -> str:
+        stat = os.stat(face_path)
+        path = os.path.abspath(face_path)
+        memo = self._hashes.get(path)
+        if memo is None or memo[:2] != (stat.st_size, stat.st_mtime_ns):
+            digest = hashlib.sha256()
+            # Padding and crop size change the stored boxes and crops
+            digest.update(f"{WAV2LIP_PADS}:{IMG_SIZE}:".encode())
+            with open(face_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            memo = self._hashes[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        self._hashes.move_to_end(path)
+        while len(self._hashes) > self.max_entries:
+            self._hashes.popitem(last=False)
+        return memo[2]
+
+    def _path(self, key: str, avatar: bool = False) -> str:
+        return os.path.join(self.directory, f"{key}.avatar.npz" if avatar else f"{key}.npz")
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._memory.get(key)
+        if entry is None:
+            for path in (self._path(key, avatar=True), self._path(key)):
+                if not os.path.exists(path):
+                    continue
+                try:
+                    with np.load(path) as data:
+                        entry = {"boxes": [tuple(int(v) for v in box) for box in data["boxes"]],
+                                 "faces": list(data["faces"]), "fps": float(data["fps"])}
+                    os.utime(path)  # recently used entries are evicted last
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring unreadable face cache entry {key[:12]}: {e}")
+                    entry = None
+                if entry is not None:
+                    break
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, boxes: List[Tuple[int, int, int, int]], faces: List[np.ndarray], fps: float,
+            avatar: bool = False, source: Optional[str] = None) -> Dict:
+        entry = {"boxes": boxes, "faces": faces, "fps": fps}
+        path = self._path(key, avatar)
+        partial = f"{path}.{uuid.uuid4().hex}.part.npz"
+        extra = {"source": os.path.abspath(source)} if avatar and source else {}
+        np.savez(partial, boxes=np.array(boxes), faces=np.array(faces), fps=fps, **extra)
+        os.replace(partial, path)
+        self._remember(key, entry)
+        if not avatar:
+            self.prune()
+        elif source:
+            self.drop_stale_avatars(key, source)
+        return entry
+
+    def drop_stale_avatars(self, key: str, source: str):
+        """Remove the entries stored for earlier contents of the avatar at ``source``."""
+        source = os.path.abspath(source)
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".avatar.npz") or entry.name == f"{key}.avatar.npz":
+                continue
+            try:
+                with np.load(entry.path) as data:
+                    stale = "source" in data.files and str(data["source"]) == source
+                if stale:
+                    os.remove(entry.path)
+                    self._memory.pop(entry.name[:-len(".avatar.npz")], None)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not check face cache entry {entry.name}: {e}")
+
+    def prune(self):
+        """Drop upload entries past the TTL, then the least recently used until under the size limit."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz") and not entry.name.endswith((".avatar.npz", ".part.npz")):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        now = time.time()
+        for mtime, path, size in entries:
+            if now - mtime <= self.ttl and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another worker pruned it first
+            total -= size
+
+    @staticmethod
+    def _size(entry: Dict) -> int:
+        return sum(face.nbytes for face in entry["faces"])
+
+    def _remember(self, key: str, entry: Dict):
+        if key in self._memory:
+            self._memory_bytes -= self._size(self._memory.pop(key))
+        self._memory[key] = entry
+        self._memory_bytes += self._size(entry)
+        # A long uploaded video's crops can take hundreds of MB; bound the bytes as well as the count
+        while len(self._memory) > 1 and (len(self._memory) > self.max_entries
+                                         or self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self._size(evicted)
+
+
+def mel_chunks(mel: np.ndarray, fps: float) -> List[np.ndarray]:
+    """Split the mel spectrogram into one MEL_STEP_SIZE window per video frame."""
+    chunks = []
+    mel_idx_multiplier = 80.0 / fps
+    i = 0
+    while True:
+        start = int(i * mel_idx_multiplier)
+        if start + MEL_STEP_SIZE > mel.shape[1]:
+            chunks.append(mel[:, mel.shape[1] - MEL_STEP_SIZE:])
+            return chunks
+        chunks.append(mel[:, start:start + MEL_STEP_SIZE])
+        i += 1
+
+
+def count_frames(num_samples: int, fps: float) -> int:
+    """Number of video frames mel_chunks() yields for audio of this length."""
+    mel_frames = 1 + num_samples // MEL_HOP_SIZE  # librosa stft with center=True
+    mel_idx_multiplier = 80.0 / fps
+    i = 0
+    while int(i * mel_idx_multiplier) + MEL_STEP_SIZE <= mel_frames:
+        i += 1
+    return i + 1
+
+
+def split_at_silence(samples: np.ndarray, sample_rate: int, fps: float, segments: int) -> List[Tuple[int, int]]:
+    """Split the video's frames into ``segments`` [start, end) ranges cut at the quietest frames.
+
+    Each cut is searched for within a quarter segment of the even split point,
+    so the pieces stay close in length while seams fall in pauses between words.
+    """
+    total = count_frames(len(samples), fps)
+    if segments <= 1 or total < 2 * segments:
+        return [(0, total)]
+    samples_per_frame = sample_rate / fps
+    energy = np.array([
+        np.sqrt(np.mean(np.square(samples[int(i * samples_per_frame):int((i + 1) * samples_per_frame)]) + 1e-12))
+        for i in range(total)])
+    span = total / segments
+    cuts = [0]
+    for j in range(1, segments):
+        lo = max(cuts[-1] + 1, int(j * span - span / 4))
+        hi = min(total - 1, int(j * span + span / 4))
+        cuts.append(lo + int(np.argmin(energy[lo:hi + 1])) if hi >= lo else int(j * span))
+    cuts.append(total)
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+def concat_videos(paths: List[str], outfile: str):
+    """Join clips with the same codec and size without re-encoding."""
+    list_path = f"{outfile}.txt"
+    with open(list_path, "w") as f:
+        f.writelines(f"file '{path}'\n" for path in paths)
+    try:
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+                        "-c", "copy", outfile], check=True, capture_output=True)
+    finally:
+        os.remove(list_path)
+
+
+def mux(video_path: str, samples: np.ndarray, sample_rate: int, outfile: str):
+    """Combine the silent video with PCM audio piped on stdin."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+         "-i", video_path, "-strict", "-2", "-q:v", "1", outfile],
+        input=pcm, check=True, capture_output=True)
+
+
+class Wav2LipEngine:
+    """Wav2Lip model and face detector loaded once, rendering any number of videos."""
+
+    def __init__(self, checkpoint: str = WAV2LIP_CHECKPOINT, device: str = WAV2LIP_DEVICE,
+                 threads: int = WAV2LIP_TORCH_THREADS):
+        started = time.perf_counter()
+        if WAV2LIP_DIR not in sys.path:
+            sys.path.insert(0, WAV2LIP_DIR)
+        import torch
+        import face_detection
+        from models import Wav2Lip
+
+        torch.set_num_threads(threads)
+        self.torch = torch
+        self.device = device
+        model = Wav2Lip()
+        state = torch.load(checkpoint, map_location=lambda storage, loc: storage)["state_dict"]
+        model.load_state_dict({k.replace("module.", ""): v for k, v in state.items()})
+        self.model = model.to(device).eval()
+        self.detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, flip_input=False,
+                                                     device=device)
+        self.face_cache = FaceCache()
+        self.load_seconds = time.perf_counter() - started
+
+    def detect_faces(self, frames: List[np.ndarray]) -> List[Tuple[int, int, int, int]]:
+        """(y1, y2, x1, x2) face box per frame, padded and temporally smoothed."""
+        predictions = []
+        batch_size = WAV2LIP_FACE_DET_BATCH_SIZE
+        i = 0
+        while i < len(frames):
+            try:
+                predictions.extend(self.detector.get_detections_for_batch(np.array(frames[i:i + batch_size])))
+                i += batch_size
+            except RuntimeError:
+                if batch_size == 1:
+                    raise
+                batch_size //= 2
+        pady1, pady2, padx1, padx2 = WAV2LIP_PADS
+        boxes = []
+        for rect, frame in zip(predictions, frames):
+            if rect is None:
+                raise Wav2LipError("Face not detected! Ensure the video contains a face in all the frames.")
+            boxes.append([max(0, rect[0] - padx1), max(0, rect[1] - pady1),
+                          min(frame.shape[1], rect[2] + padx2), min(frame.shape[0], rect[3] + pady2)])
+        boxes = smooth_boxes(np.array(boxes))
+        return [(y1, y2, x1, x2) for x1, y1, x2, y2 in boxes]
+
+    def prepare_face(self, face_path: str, frames: Optional[List[np.ndarray]] = None,
+                     avatar: bool = False) -> Tuple[Dict, bool]:
+        """Boxes and model-sized crops for every frame of ``face_path``, from the cache when possible."""
+        import cv2
+        key = self.face_cache.key(face_path)
+        entry = self.face_cache.get(key)
+        if entry is not None:
+            return entry, True
+        if frames is None:
+            frames, fps = read_face(face_path)
+        else:
+            fps = read_face_fps(face_path)
+        boxes = self.detect_faces(frames)
+        faces = [cv2.resize(frame[y1:y2, x1:x2], (IMG_SIZE, IMG_SIZE)) for frame, (y1, y2, x1, x2) in zip(frames, boxes)]
+        return self.face_cache.put(key, boxes, faces, fps, avatar=avatar, source=face_path), False
+
+    def register(self, face_path: str) -> Dict[str, float]:
+        """Run face detection for an avatar ahead of its first request."""
+        started = time.perf_counter()
+        _, hit = self.prepare_face(face_path, avatar=True)
+        return {"face_detect": round(time.perf_counter() - started, 3), "face_cache_hit": float(hit)}
+
+    def mel(self, samples: np.ndarray) -> np.ndarray:
+        import audio
+        mel = audio.melspectrogram(samples)
+        if np.isnan(mel.reshape(-1)).sum() > 0:
+            raise Wav2LipError("Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file")
+        return mel
+
+    def generate(self, frames: List[np.ndarray], boxes: List[Tuple[int, int, int, int]],
+                 faces: List[np.ndarray], chunks: List[np.ndarray], first: int = 0):
+        """Yield output frames with the generated mouth pasted in, one per mel chunk.
+
+        ``first`` is the video frame index of ``chunks[0]`` when rendering one segment.
+        """
+        import cv2
+        for start in range(0, len(chunks), WAV2LIP_BATCH_SIZE):
+            indices = [(first + i) % len(frames) for i in range(start, min(start + WAV2LIP_BATCH_SIZE, len(chunks)))]
+            img_batch = np.asarray([faces[i] for i in indices])
+            img_masked = img_batch.copy()
+            img_masked[:, IMG_SIZE // 2:] = 0
+            img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.0
+            mel_batch = np.asarray(chunks[start:start + len(indices)])
+            mel_batch = mel_batch.reshape(len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1)
+
+            img_tensor = self.torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(self.device)
+            mel_tensor = self.torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(self.device)
+            with self.torch.no_grad():
+                pred = self.model(mel_tensor, img_tensor)
+            pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.0
+
+            for p, i in zip(pred, indices):
+                frame = frames[i].copy()
+                y1, y2, x1, x2 = boxes[i]
+                frame[y1:y2, x1:x2] = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
+                yield frame
+
+    def render(self, face_path: str, audio: AudioInput, outfile: str,
+               progress: Optional[ProgressCallback] = None,
+               frame_range: Optional[Tuple[int, int]] = None) -> Dict[str, float]:
+        """Render ``outfile`` and return per-stage timings in seconds.
+
+        With ``frame_range`` only those frames are rendered, to a silent .avi clip
+        that the caller concatenates with the other segments and muxes once.
+        """
+        import cv2
+        timings = {}
+        started = last = time.perf_counter()
+        progress = progress or (lambda stage, fraction: None)
+
+        def mark(stage):
+            nonlocal last
+            now = time.perf_counter()
+            timings[stage] = round(now - last, 3)
+            last = now
+
+        if isinstance(audio, str):
+            samples, sample_rate = decode_audio(audio)
+        else:
+            samples, sample_rate = audio, AUDIO_SAMPLE_RATE
+        mark("decode")
+        frames, fps = read_face(face_path)
+        chunks = mel_chunks(self.mel(samples), fps)
+        mark("mel")
+        face, hit = self.prepare_face(face_path, frames)
+        frames = frames[:len(chunks)]
+        boxes, faces = face["boxes"][:len(frames)], face["faces"][:len(frames)]
+        mark("face_detect")
+        timings["face_cache_hit"] = float(hit)
+        progress("inference", 0.1)
+        first = 0
+        if frame_range is not None:
+            first, end = frame_range
+            chunks = chunks[first:end]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            video_path = outfile if frame_range is not None else os.path.join(temp_dir, "result.avi")
+            height, width = frames[0].shape[:2]
+            writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"DIVX"), fps, (width, height))
+            for n, frame in enumerate(self.generate(frames, boxes, faces, chunks, first), 1):
+                writer.write(frame)
+                if n % WAV2LIP_BATCH_SIZE == 0:
+                    progress("inference", 0.1 + 0.8 * n / len(chunks))
+            writer.release()
+            mark("inference")
+            if frame_range is None:
+                progress("mux", 0.9)
+                mux(video_path, samples, sample_rate, outfile)
+                mark("mux")
+        timings["total"] = round(time.perf_counter() - started, 3)
+        return timings
+
+
+def _worker_main(index: int, jobs, results, checkpoint: str, device: str, threads: int):
+    try:
+        engine = Wav2LipEngine(checkpoint, device, threads)
+    except Exception:
+        results.put(("failed", None, index, traceback.format_exc()))
+        return
+    results.put(("ready", None, index, engine.load_seconds))
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, method, args, kwargs = job
+        results.put(("start", job_id, index, None))
+        if method == "render":
+            kwargs["progress"] = lambda stage, fraction: results.put(("progress", job_id, index, (stage, fraction)))
+        try:
+            results.put(("done", job_id, index, getattr(engine, method)(*args, **kwargs)))
+        except Exception as e:
+            detail = e.stderr.decode(errors="replace") if isinstance(e, subprocess.CalledProcessError) and e.stderr else str(e)
+            results.put(("error", job_id, index, f"{type(e).__name__}: {detail}"))
+
+
+class Wav2LipWorkerPool:
+    """Worker processes each holding a loaded Wav2LipEngine, fed from one job queue."""
+
+    def __init__(self, size: int = WAV2LIP_WORKERS, checkpoint: str = WAV2LIP_CHECKPOINT,
+                 device: str = WAV2LIP_DEVICE, threads: int = WAV2LIP_TORCH_THREADS):
+        self.size = size
+        self.checkpoint = checkpoint
+        self.device = device
+        self.threads = threads
+        # spawn: CUDA and torch thread pools do not survive fork
+        self._ctx = mp.get_context("spawn")
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._processes: Dict[int, mp.Process] = {}
+        self._futures: Dict[str, Future] = {}
+        self._running: Dict[int, str] = {}  # worker index -> job id
+        self._progress: Dict[str, ProgressCallback] = {}
+        self._lock = threading.Lock()
+        self._collector: Optional[threading.Thread] = None
+        self.load_seconds: Dict[int, float] = {}
+        self._timings = deque(maxlen=200)
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._collector is not None:
+                return
+            for index in range(self.size):
+                self._spawn(index)
+            self._collector = threading.Thread(target=self._collect, name="wav2lip-results", daemon=True)
+            self._collector.start()
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(target=_worker_main, name=f"wav2lip-{index}", daemon=True,
+                                    args=(index, self._jobs, self._results, self.checkpoint, self.device, self.threads))
+        process.start()
+        self._processes[index] = process
+
+    def _collect(self):
+        while True:
+            try:
+                kind, job_id, index, payload = self._results.get(timeout=1.0)
+            except Exception:
+                self._check_workers()
+                continue
+            if kind == "ready":
+                self.load_seconds[index] = round(payload, 2)
+                logger.info(f"Wav2Lip worker {index} loaded in {payload:.1f}s")
+            elif kind == "failed":
+                logger.error(f"Wav2Lip worker {index} failed to load:\n{payload}")
+                with self._lock:
+                    self._processes.pop(index, None)
+                    if not self._processes:
+                        self._fail_all(f"Wav2Lip workers could not load: {payload.strip().splitlines()[-1]}")
+            elif kind == "start":
+                with self._lock:
+                    self._running[index] = job_id
+            elif kind == "progress":
+                callback = self._progress.get(job_id)
+                if callback is not None:
+                    try:
+                        callback(*payload)
+                    except Exception as e:
+                        logger.warning(f"Wav2Lip progress callback failed: {e}")
+            else:
+                with self._lock:
+                    self._running.pop(index, None)
+                    future = self._futures.pop(job_id, None)
+                    self._progress.pop(job_id, None)
+                    if kind == "done":
+                        self.completed += 1
+                        if "total" in payload:
+                            self._timings.append(payload)
+                    else:
+                        self.failed += 1
+                if future is not None:
+                    if kind == "done":
+                        future.set_result(payload)
+                    else:
+                        future.set_exception(Wav2LipError(payload))
+
+    def _check_workers(self):
+        # A crashed worker (OOM, segfault in torch) fails its job and is replaced
+        with self._lock:
+            for index, process in list(self._processes.items()):
+                if process.is_alive():
+                    continue
+                job_id = self._running.pop(index, None)
+                future = self._futures.pop(job_id, None) if job_id else None
+                self._progress.pop(job_id, None)
+                if future is not None:
+                    self.failed += 1
+                    future.set_exception(Wav2LipError(f"Wav2Lip worker exited with code {process.exitcode}"))
+                logger.warning(f"Wav2Lip worker {index} exited ({process.exitcode}); restarting")
+                self._spawn(index)
+
+    def _fail_all(self, message: str):
+        for future in self._futures.values():
+            future.set_exception(Wav2LipError(message))
+        self._futures.clear()
+        self._progress.clear()
+
+    def submit(self, face_path: str, audio: AudioInput, outfile: str,
+               progress: Optional[ProgressCallback] = None, frame_range: Optional[Tuple[int, int]] = None) -> Future:
+        """Queue a render; the future resolves to the job's stage timings."""
+        return self._submit("render", os.path.abspath(face_path), audio, os.path.abspath(outfile),
+                            progress=progress, frame_range=frame_range)
+
+    def register_avatar(self, face_path: str) -> Future:
+        """Precompute and cache face detection for an avatar image."""
+        return self._submit("register", os.path.abspath(face_path))
+
+    def _submit(self, method: str, *args, progress: Optional[ProgressCallback] = None, **kwargs) -> Future:
+        self.start()
+        job_id = uuid.uuid4().hex
+        future: Future = Future()
+        with self._lock:
+            if not self._processes:
+                future.set_exception(Wav2LipError("No Wav2Lip workers are running"))
+                return future
+            self._futures[job_id] = future
+            if progress is not None:
+                self._progress[job_id] = progress
+        self._jobs.put((job_id, method, args, kwargs))
+        return future
+
+    def render(self, face_path: str, audio: AudioInput, outfile: str,
+               progress: Optional[ProgressCallback] = None, hls_dir: Optional[str] = None) -> Dict[str, float]:
+        """Render and wait; long audio is split across workers when segmented mode applies.
+
+        With ``hls_dir`` the video is always rendered in short segments, each
+        published to an HLS playlist there as soon as it and its predecessors are done.
+        """
+        if hls_dir is not None:
+            if isinstance(audio, str):
+                audio, _ = decode_audio(audio)
+            fps = read_face_fps(face_path)
+            segments = max(1, math.ceil(len(audio) / AUDIO_SAMPLE_RATE / WAV2LIP_HLS_SEGMENT_SECONDS))
+            ranges = split_at_silence(audio, AUDIO_SAMPLE_RATE, fps, segments)
+            publisher = HLSPublisher(hls_dir, ranges, fps, audio,
+                                     target_duration=target_duration_for(WAV2LIP_HLS_SEGMENT_SECONDS))
+            timings = self.render_segmented(face_path, audio, outfile, ranges, progress, publisher.publish)
+            publisher.finish()
+            return timings
+        segments = self.segment_count(audio)
+        if segments > 1:
+            ranges = split_at_silence(audio, AUDIO_SAMPLE_RATE, read_face_fps(face_path), segments)
+            return self.render_segmented(face_path, audio, outfile, ranges, progress)
+        return self.submit(face_path, audio, outfile, progress).result()
+
+    def segment_count(self, audio: AudioInput) -> int:
+        if WAV2LIP_SEGMENTED == "off" or self.size < 2 or isinstance(audio, str):
+            return 1
+        return max(1, min(self.size, int(len(audio) / AUDIO_SAMPLE_RATE // WAV2LIP_SEGMENT_MIN_SECONDS)))
+
+    def render_segmented(self, face_path: str, samples: np.ndarray, outfile: str, ranges: List[Tuple[int, int]],
+                         progress: Optional[ProgressCallback] = None,
+                         on_segment: Optional[Callable[[int, str], None]] = None) -> Dict[str, float]:
+        """Render frame ranges on separate workers, then concat and mux once.
+
+        ``on_segment(index, clip_path)`` is called in order as each leading segment finishes.
+        """
+        started = time.perf_counter()
+        total_frames = ranges[-1][1]
+        done = [0.0] * len(ranges)
+        lock = threading.Lock()
+
+        def segment_progress(i):
+            def report(stage, fraction):
+                with lock:
+                    done[i] = fraction * (ranges[i][1] - ranges[i][0]) / total_frames
+                    overall = sum(done)
+                if progress:
+                    progress(stage, 0.9 * overall)
+            return report
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            clips = [os.path.join(temp_dir, f"segment_{i:03d}.avi") for i in range(len(ranges))]
+            futures = [self.submit(face_path, samples, clip, segment_progress(i), frame_range)
+                       for i, (clip, frame_range) in enumerate(zip(clips, ranges))]
+            segment_timings = []
+            try:
+                for i, future in enumerate(futures):
+                    segment_timings.append(future.result())
+                    if on_segment is not None:
+                        on_segment(i, clips[i])
+            finally:
+                # Wait for every segment before the temp dir goes away, even if one failed
+                wait(futures)
+            render_seconds = time.perf_counter() - started
+            if progress:
+                progress("mux", 0.9)
+            video_path = os.path.join(temp_dir, "joined.avi")
+            concat_videos(clips, video_path)
+            mux(video_path, samples, AUDIO_SAMPLE_RATE, os.path.abspath(outfile))
+        return {
+            "segments": len(ranges),
+            "render": round(render_seconds, 3),
+            "segment_max": max(t["total"] for t in segment_timings),
+            "mux": round(time.perf_counter() - started - render_seconds, 3),
+            "total": round(time.perf_counter() - started, 3),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            timings = list(self._timings)
+            stats = {
+                "workers": self.size,
+                "alive": sum(p.is_alive() for p in self._processes.values()),
+                "busy": len(self._running),
+                "queued": len(self._futures) - len(self._running),
+                "completed": self.completed,
+                "failed": self.failed,
+                "device": self.device,
+                "torch_threads": self.threads,
+                "model_load_seconds": self.load_seconds,
+            }
+        if timings:
+            stages = timings[-1].keys()
+            stats["avg_stage_seconds"] = {s: round(sum(t.get(s, 0) for t in timings) / len(timings), 3) for s in stages}
+            stats["last_stage_seconds"] = timings[-1]
+        return stats
+
+
+_pool: Optional[Wav2LipWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_wav2lip_pool() -> Wav2LipWorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Wav2LipWorkerPool()
+        return _pool